@@ -0,0 +1,9 @@
+"""
+Reproducible performance benchmarks for the photo processing pipeline.
+
+Run from the backend directory:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json
+
+See `benchmarks/run.py` for all options.
+"""
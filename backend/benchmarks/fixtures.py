@@ -0,0 +1,67 @@
+# backend/benchmarks/fixtures.py
+#
+# Synthetic, seeded fixtures so every benchmark run measures the same inputs,
+# independent of whatever happens to be in the dev database.
+
+import os
+
+import numpy as np
+from PIL import Image
+
+# Resolutions we see in practice: phone thumbnails up to full-size camera shots.
+RESOLUTIONS = [(640, 480), (1280, 960), (2048, 1536), (4032, 3024)]
+FACE_COUNTS = [1, 5, 20]
+GALLERY_SIZES = [1000, 10000, 100000]
+
+
+def random_encodings(count, seed=0):
+    """
+    Random 128-d encodings with roughly the scale of real dlib descriptors
+    (components around +-0.1, pairwise distances around 1.0).
+    """
+    rng = np.random.default_rng(seed)
+    return (rng.normal(size=(count, 128)) * 0.09).astype(np.float64)
+
+
+def synthetic_image(resolution, seed=0):
+    """A noisy RGB image of the given (width, height)."""
+    width, height = resolution
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return pixels
+
+
+def face_boxes(resolution, count, seed=0):
+    """
+    `count` non-degenerate face boxes spread over the image, returned as
+    face_recognition (top, right, bottom, left) tuples.
+    """
+    width, height = resolution
+    rng = np.random.default_rng(seed)
+    size = max(24, min(width, height) // 8)
+    boxes = []
+    for _ in range(count):
+        left = int(rng.integers(0, width - size))
+        top = int(rng.integers(0, height - size))
+        boxes.append((top, left + size, top + size, left))
+    return boxes
+
+
+def bounding_box_strings(boxes):
+    """Convert (top, right, bottom, left) tuples to the 'left,top,right,bottom' DB format."""
+    return [f"{left},{top},{right},{bottom}" for top, right, bottom, left in boxes]
+
+
+def stock_images(directory, resolutions=RESOLUTIONS):
+    """
+    Yield (name, resolution, RGB array) for every image in `directory`,
+    resized to each resolution. Use real photos with faces here to measure
+    detection on realistic inputs.
+    """
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            continue
+        with Image.open(os.path.join(directory, filename)) as image:
+            image = image.convert('RGB')
+            for resolution in resolutions:
+                yield filename, resolution, np.array(image.resize(resolution))
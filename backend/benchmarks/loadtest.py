@@ -0,0 +1,238 @@
+# backend/benchmarks/loadtest.py
+#
+# HTTP load test for comparing the WSGI and ASGI deployments locally.
+#
+# Drives GET requests at a fixed concurrency for a fixed time while, if asked,
+# holding open a number of consent event streams (the long-lived connections
+# that tie up one thread each under WSGI). Uses only the standard library.
+# Under WSGI the stream endpoint answers 501 (Django cannot stream the async
+# event generator there), so streams are reported as failed: that difference
+# is part of what is measured.
+#
+#   # Start a server yourself and point the test at it
+#   python -m benchmarks.loadtest --user alice --paths /api/photos/feed/
+#
+#   # Or let the harness start it: same test against both servers
+#   python -m benchmarks.loadtest --user alice --server wsgi asgi --streams 200
+#
+# --server needs gunicorn (wsgi) and uvicorn (asgi) installed. Use a database
+# with some data in it; nothing is written.
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+# Setup Django (only to mint an access token and stream tickets for --user)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+from photos.services import issue_stream_ticket  # noqa: E402
+from users.models import CustomUser  # noqa: E402
+
+SERVER_COMMANDS = {
+    'wsgi': 'gunicorn core.wsgi:application --bind {host}:{port} --workers {workers} --threads {threads}',
+    'asgi': 'uvicorn core.asgi:application --host {host} --port {port} --workers {workers}',
+}
+STREAM_PATH = '/api/consent-requests/stream/'
+
+
+async def _get(host, port, path, token, timeout):
+    """One GET over a fresh connection. Returns the status code."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n"
+            f"Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _hold_stream(host, port, ticket, stats, stop):
+    """Open one event stream with a stream ticket and keep reading it until `stop` is set."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET {STREAM_PATH}?ticket={ticket} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), 30)
+    except (OSError, asyncio.TimeoutError):
+        stats['streams_failed'] += 1
+        return
+    if b' 200 ' not in status_line:
+        stats['streams_failed'] += 1
+        writer.close()
+        return
+    stats['streams_open'] += 1
+    try:
+        while not stop.is_set():
+            try:
+                if not await asyncio.wait_for(reader.read(4096), 1):
+                    break  # Server closed the stream.
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        stats['streams_open'] -= 1
+        writer.close()
+
+
+async def _worker(host, port, paths, token, deadline, timeout, latencies, stats):
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            status = await _get(host, port, path, token, timeout)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            stats['errors'] += 1
+            continue
+        if status >= 400:
+            stats['errors'] += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+
+
+async def run_load(base_url, paths, token, concurrency, duration, stream_tickets, timeout):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    stats = {'errors': 0, 'streams_open': 0, 'streams_failed': 0}
+    latencies = []
+
+    stop = asyncio.Event()
+    streams = len(stream_tickets)
+    stream_tasks = [asyncio.create_task(_hold_stream(host, port, ticket, stats, stop)) for ticket in stream_tickets]
+    if streams:
+        await asyncio.sleep(2)  # Let the streams connect before measuring.
+    streams_held = stats['streams_open']
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[
+        _worker(host, port, paths, token, deadline, timeout, latencies, stats) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for task in stream_tasks:
+        task.cancel()  # Streams still waiting for a response are given up on.
+    await asyncio.gather(*stream_tasks, return_exceptions=True)
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+
+    return {
+        'requests': len(latencies),
+        'errors': stats['errors'],
+        'rps': len(latencies) / elapsed,
+        'median': statistics.median(latencies) if latencies else None,
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'streams_requested': streams,
+        'streams_held': streams_held,
+        'streams_failed': stats['streams_failed'],
+    }
+
+
+def _wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_with_server(kind, args, user, token):
+    parts = urlsplit(args.base_url)
+    command = SERVER_COMMANDS[kind].format(
+        host=parts.hostname, port=parts.port or 80, workers=args.workers, threads=args.threads
+    )
+    print(f"▶ {kind}: {command}")
+    server = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_for_port(parts.hostname, parts.port or 80):
+            raise RuntimeError(f"{kind} server did not start")
+        # Tickets are single-use and short-lived: mint them once the server is up.
+        tickets = [issue_stream_ticket(user) for _ in range(args.streams)]
+        return asyncio.run(run_load(
+            args.base_url, args.paths, token, args.concurrency, args.duration, tickets, args.timeout
+        ))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def print_result(label, result):
+    def ms(value):
+        return f"{value * 1000:8.1f} ms" if value is not None else '       -'
+
+    print(
+        f"  {label:<8} {result['rps']:9.1f} req/s   median {ms(result['median'])}   p95 {ms(result['p95'])}"
+        f"   p99 {ms(result['p99'])}   errors {result['errors']}"
+        f"   streams {result['streams_held']}/{result['streams_requested']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the API, optionally comparing WSGI and ASGI servers.')
+    parser.add_argument('--user', required=True, help='Username whose access token the requests use')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--paths', nargs='+', default=['/api/photos/feed/', '/api/consent-requests/summary/'],
+                        help='Paths requested round-robin by each client')
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent request loops')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    parser.add_argument('--streams', type=int, default=0, help='Consent event streams held open during the run')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--server', nargs='+', choices=list(SERVER_COMMANDS),
+                        help='Start these servers in turn and test each; omit to test an already running server')
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes (with --server)')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per WSGI worker (with --server)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    user = CustomUser.objects.get(username=args.user)
+    token = str(AccessToken.for_user(user))
+
+    results = {}
+    if args.server:
+        for kind in args.server:
+            results[kind] = run_with_server(kind, args, user, token)
+    else:
+        print(f"▶ {args.base_url}")
+        tickets = [issue_stream_ticket(user) for _ in range(args.streams)]
+        results['server'] = asyncio.run(run_load(
+            args.base_url, args.paths, token, args.concurrency, args.duration, tickets, args.timeout
+        ))
+
+    print(f"\n{'Results':─<90}")
+    for label, result in results.items():
+        print_result(label, result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k != 'output'}, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
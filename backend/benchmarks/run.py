@@ -0,0 +1,356 @@
+# backend/benchmarks/run.py
+#
+# Standalone benchmark runner. Each pipeline stage is timed separately on
+# seeded synthetic fixtures; results are written as JSON and can be compared
+# against a stored baseline.
+#
+#   python -m benchmarks.run                              # run everything
+#   python -m benchmarks.run --stages matching render     # run a subset
+#   python -m benchmarks.run --output bench.json          # save results
+#   python -m benchmarks.run --baseline bench.json        # compare with a baseline
+#
+# Stages that touch the database run inside a transaction that is always
+# rolled back, so the dev database is left untouched.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+django.setup()
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+from django.core.exceptions import ImproperlyConfigured  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from benchmarks import fixtures  # noqa: E402
+
+STAGES = {}
+
+
+def stage(name):
+    """Register a benchmark stage function under `name`."""
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def measure(func, repeat, warmup=1):
+    """Time `func` `repeat` times (after `warmup` untimed calls) with perf_counter."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'min': samples[0],
+        'median': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        'mean': statistics.fmean(samples),
+    }
+
+
+def result_id(stage_name, params):
+    return stage_name + '[' + ','.join(f"{k}={v}" for k, v in params.items()) + ']'
+
+
+def _create_gallery_users(count, seed):
+    from users.models import CustomUser
+    encodings = fixtures.random_encodings(count, seed=seed)
+    CustomUser.objects.bulk_create(
+        [
+            CustomUser(
+                username=f"bench_user_{i}",
+                password='!',
+                encoding_status='SUCCESS',
+                face_encoding=encodings[i].tolist(),
+            )
+            for i in range(count)
+        ],
+        batch_size=2000,
+    )
+
+
+# --- Stages ---
+
+@stage('gallery_load')
+def bench_gallery_load(args):
+    from users.services import get_face_encodings_dict
+    for size in args.gallery_sizes:
+        with rolled_back():
+            _create_gallery_users(size, args.seed)
+            yield {'gallery': size}, measure(get_face_encodings_dict, args.repeat)
+
+
+@stage('detection')
+def bench_detection(args):
+    from photos.detectors import get_detector
+    if args.images:
+        inputs = [
+            ({'image': name, 'resolution': f"{w}x{h}"}, pixels)
+            for name, (w, h), pixels in fixtures.stock_images(args.images, args.resolutions)
+        ]
+    else:
+        inputs = [
+            ({'resolution': f"{w}x{h}"}, fixtures.synthetic_image((w, h), args.seed))
+            for w, h in args.resolutions
+        ]
+    for name in args.detectors:
+        try:
+            detector = get_detector(name)
+        except ImproperlyConfigured as e:
+            print(f"    skipped {name}: {e}")
+            continue
+        for params, pixels in inputs:
+            yield {'detector': name, **params}, measure(lambda: detector.detect(pixels), args.repeat)
+
+
+@stage('encoding')
+def bench_encoding(args):
+    from photos.services import _encode_faces
+    resolution = args.resolutions[0]
+    pixels = fixtures.synthetic_image(resolution, args.seed)
+    for count in args.face_counts:
+        boxes = fixtures.face_boxes(resolution, count, args.seed)
+        yield {'faces': count}, measure(lambda: _encode_faces(pixels, boxes), args.repeat)
+
+
+@stage('encoding_batch')
+def bench_encoding_batch(args):
+    from photos.services import _encode_faces, _encode_faces_batch
+    resolution = args.resolutions[0]
+    count = args.face_counts[-1]
+    for photos in args.batch_sizes:
+        images = [fixtures.synthetic_image(resolution, args.seed + i) for i in range(photos)]
+        boxes = [fixtures.face_boxes(resolution, count, args.seed + i) for i in range(photos)]
+
+        def one_call_per_photo():
+            for image, image_boxes in zip(images, boxes):
+                _encode_faces(image, image_boxes)
+
+        yield {'photos': photos, 'faces': count, 'mode': 'per_photo'}, measure(one_call_per_photo, args.repeat)
+        yield {'photos': photos, 'faces': count, 'mode': 'batched'}, measure(lambda: _encode_faces_batch(images, boxes), args.repeat)
+
+
+@stage('matching')
+def bench_matching(args):
+    from photos.services import match_encodings
+    for size in args.gallery_sizes:
+        gallery = fixtures.random_encodings(size, seed=args.seed)
+        for count in args.face_counts:
+            faces = fixtures.random_encodings(count, seed=args.seed + 1)
+            yield {'gallery': size, 'faces': count}, measure(lambda: match_encodings(faces, gallery), args.repeat)
+
+
+@stage('db_write')
+def bench_db_write(args):
+    from photos.models import Photo, DetectedFace
+    from photos.services import encoding_to_bytes, pipeline_version
+    from users.models import CustomUser
+
+    resolution = args.resolutions[0]
+    for count in args.face_counts:
+        boxes = fixtures.bounding_box_strings(fixtures.face_boxes(resolution, count, args.seed))
+        encodings = fixtures.random_encodings(count, seed=args.seed)
+        with rolled_back():
+            uploader = CustomUser.objects.create(username='bench_uploader', password='!')
+            photo = Photo.objects.create(uploader=uploader, original_image='bench.jpg')
+
+            def write_faces():
+                for box, encoding in zip(boxes, encodings):
+                    DetectedFace.objects.create(
+                        photo=photo,
+                        bounding_box=box,
+                        encoding=encoding_to_bytes(encoding),
+                        detector_version=pipeline_version('hog-1'),
+                    )
+
+            yield {'faces': count}, measure(write_faces, args.repeat)
+
+
+@stage('render')
+def bench_render(args):
+    from photos.services import _draw_masks
+    for w, h in args.resolutions:
+        original = Image.fromarray(fixtures.synthetic_image((w, h), args.seed))
+        for count in args.face_counts:
+            boxes = fixtures.bounding_box_strings(fixtures.face_boxes((w, h), count, args.seed))
+            yield {'resolution': f"{w}x{h}", 'faces': count}, measure(lambda: _draw_masks(original, boxes), args.repeat)
+
+
+@stage('jpeg_encode')
+def bench_jpeg_encode(args):
+    from photos.services import _encode_jpeg
+    for w, h in args.resolutions:
+        image = Image.fromarray(fixtures.synthetic_image((w, h), args.seed))
+        yield {'resolution': f"{w}x{h}"}, measure(lambda: _encode_jpeg(image), args.repeat)
+
+
+@stage('feed_serialization')
+def bench_feed_serialization(args):
+    from asgiref.sync import async_to_sync
+    from django.test import RequestFactory
+    from rest_framework_simplejwt.tokens import AccessToken
+    from interactions.models import Like, Comment
+    from photos import async_views
+    from photos.models import Photo
+    from photos.services import rebuild_feed_items
+    from users.models import CustomUser
+
+    for photo_count in args.feed_sizes:
+        with rolled_back():
+            users = CustomUser.objects.bulk_create(
+                [CustomUser(username=f"bench_feed_{i}", password='!') for i in range(10)]
+            )
+            photos = Photo.objects.bulk_create(
+                [Photo(uploader=users[i % len(users)], original_image='bench.jpg', status=Photo.StatusChoices.READY)
+                 for i in range(photo_count)]
+            )
+            Like.objects.bulk_create([Like(user=user, photo=photo) for photo in photos for user in users[:3]])
+            Comment.objects.bulk_create([Comment(user=user, photo=photo, text='nice') for photo in photos for user in users[:2]])
+            # The feed is served from FeedItem rows by the async view.
+            rebuild_feed_items(photo_ids=[photo.id for photo in photos])
+
+            request = RequestFactory().get(
+                '/api/photos/feed/',
+                {'page_size': photo_count},
+                HTTP_HOST='localhost',
+                HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(users[0])}',
+            )
+
+            def serialize_feed():
+                response = async_to_sync(async_views.feed)(request)
+                assert response.status_code == 200, response.content
+                return response
+
+            with CaptureQueriesContext(connection) as queries:
+                serialize_feed()
+            timing = measure(serialize_feed, args.repeat)
+            timing['queries'] = len(queries.captured_queries)
+            yield {'photos': photo_count}, timing
+
+
+# --- Runner ---
+
+def run(args):
+    results = {}
+    for name in args.stages:
+        print(f"▶ {name}")
+        try:
+            for params, timing in STAGES[name](args):
+                key = result_id(name, params)
+                results[key] = {'stage': name, 'params': params, **timing}
+                print(f"    {key:<55} median {timing['median'] * 1000:9.3f} ms   p95 {timing['p95'] * 1000:9.3f} ms")
+        except ImportError as e:
+            print(f"    skipped: {e}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison against `baseline` and return the list of regressed ids."""
+    regressions = []
+    print(f"\n{'Comparison with baseline':─<90}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"  {key:<55} (new)")
+            continue
+        ratio = result['median'] / base['median'] if base['median'] > 0 else float('inf')
+        marker = ''
+        if ratio > 1 + threshold:
+            marker = '  ✗ REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            marker = '  ✓ faster'
+        print(f"  {key:<55} {base['median'] * 1000:9.3f} → {result['median'] * 1000:9.3f} ms  ({ratio:5.2f}x){marker}")
+    return regressions
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the photo processing pipeline stage by stage.')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions per measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=fixtures.GALLERY_SIZES)
+    parser.add_argument('--face-counts', type=int, nargs='+', default=fixtures.FACE_COUNTS)
+    parser.add_argument('--resolutions', type=parse_resolution, nargs='+', default=fixtures.RESOLUTIONS,
+                        help='Image sizes as WIDTHxHEIGHT')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8],
+                        help='Photos per call in the encoding_batch stage')
+    parser.add_argument('--feed-sizes', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--detectors', nargs='+', default=['hog'],
+                        help='Detector backends to compare in the detection stage (see photos/detectors.py)')
+    parser.add_argument('--images', help='Directory of stock face photos to use for the detection stage')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown of the median that counts as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'numpy': np.__version__,
+                    'seed': args.seed,
+                    'repeat': args.repeat,
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+        print("\n✓ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# core/db.py
+#
+# Database connections outside the request cycle.
+#
+# Django keeps one connection per thread. Around every request it drops that
+# connection once it is older than CONN_MAX_AGE or has failed, and with
+# CONN_HEALTH_CHECKS it pings a reused connection before the first query.
+# Management commands and background threads see no requests, so a
+# long-running worker would hold one connection forever, through database
+# restarts and PgBouncer's server_lifetime, and fail on the first query after
+# one of them. `worker_task` gives each unit of work the same treatment.
+
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+def release_stale_connections():
+    """
+    Close this thread's connections that are past CONN_MAX_AGE or unusable,
+    and schedule a health check for the others.
+
+    Unlike `django.db.close_old_connections`, leaves alone a connection that is
+    inside an atomic block (which would otherwise look unusable and be closed).
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close_if_unusable_or_obsolete()
+
+
+@contextmanager
+def worker_task():
+    """Run the block like a request: on a healthy connection, released afterwards if stale."""
+    release_stale_connections()
+    try:
+        yield
+    finally:
+        release_stale_connections()
@@ -0,0 +1,64 @@
+# core/events.py
+#
+# Minimal publish/subscribe for pushing server-sent events to clients.
+#
+# The broker lives in process memory, so a publish reaches the streams
+# connected to the same process (and is all tests need). Streams also re-read
+# their state every CONSENT_STREAM_RESYNC_SECONDS, so with several processes
+# an event published elsewhere still arrives within that delay. A
+# cross-process broker (Redis pub/sub, Postgres LISTEN/NOTIFY) can replace
+# `broker` without touching publishers or streams.
+
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class InMemoryBroker:
+    """Channel name -> set of asyncio queues, one per connected stream."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        """Deliver `message` to every subscriber of `channel`. Safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The subscriber's event loop is closed; it is unsubscribing.
+                pass
+
+    @contextmanager
+    def subscribe(self, channel):
+        """
+        Subscribe for the duration of the block; yields an asyncio.Queue.
+        Must be entered from a running event loop.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = InMemoryBroker()
+
+
+def publish(channel, message):
+    broker.publish(channel, message)
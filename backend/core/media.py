@@ -0,0 +1,57 @@
+# core/media.py
+#
+# Serving of uploaded media (MEDIA_ROOT) according to MEDIA_SERVE_MODE.
+#
+# Only files under MEDIA_PUBLIC_PREFIXES (masked public images, profile
+# pictures) are served; the unmasked originals and content blobs never are.
+# Streaming files through Python ties up a worker for the whole download.
+# In production Django only checks the path and answers with a header
+# telling the web server which file to send; nginx (X-Accel-Redirect) or
+# Apache/lighttpd (X-Sendfile) then send it with sendfile(2), from an
+# internal location that is not reachable directly.
+
+import mimetypes
+import posixpath
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.views.static import serve
+
+
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    if not path.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES)):
+        raise Http404("File not found")
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'django':
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+    # Raises SuspiciousFileOperation (a 400) for paths outside MEDIA_ROOT.
+    full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    if not full_path.is_file():
+        raise Http404("File not found")
+
+    content_type, encoding = mimetypes.guess_type(str(full_path))
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if mode == 'x-accel':
+        response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+    else:
+        response.headers['X-Sendfile'] = str(full_path)
+    return response
+
+
+def media_urlpatterns():
+    """
+    URL patterns for MEDIA_URL, none if MEDIA_SERVE_MODE is 'off' (the web
+    server must then apply MEDIA_PUBLIC_PREFIXES itself).
+    """
+    if settings.MEDIA_SERVE_MODE == 'off':
+        return []
+    prefix = settings.MEDIA_URL.lstrip('/')
+    return [re_path(rf'^{prefix}(?P<path>.*)$', serve_media, name='media')]
@@ -0,0 +1,152 @@
+# core/metrics.py
+#
+# A small, dependency-free instrumentation layer.
+#
+# Timed sections are recorded with `span` (a context manager that also works
+# as a decorator) into Prometheus-style histograms, and exposed in the
+# Prometheus text format by `metrics_view` at /metrics.
+#
+# Metrics live in process memory, so each worker process exposes its own
+# series; scrape every worker (or aggregate them) in production.
+#
+# The endpoint is not public: scrapers authenticate with METRICS_TOKEN as a
+# bearer token or come from METRICS_ALLOWED_IPS; staff users may also read it.
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Seconds. Covers sub-millisecond DB writes up to a minute of CNN detection.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    """A cumulative histogram with one set of buckets per label combination."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(snapshot.items()):
+            labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                bucket_labels = ','.join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_str = '{' + ','.join(labels) + '}' if labels else ''
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Return the registered histogram `name`, creating it on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, documentation, labelnames, buckets)
+        return _registry[name]
+
+
+PHOTO_STAGE_SECONDS = histogram(
+    'photo_stage_duration_seconds',
+    'Time spent in each stage of photo processing.',
+    labelnames=['stage'],
+)
+
+
+class span(ContextDecorator):
+    """
+    Time a block with perf_counter and record it in a stage histogram.
+
+        with span('detection', timings) as s:
+            ...
+        logger.info(f"took {s.elapsed:.3f}s")
+
+    If `timings` (a dict) is given, the elapsed seconds are also added to
+    `timings[stage]`, which is how per-photo timing records are built.
+    """
+
+    def __init__(self, stage, timings=None, metric=PHOTO_STAGE_SECONDS):
+        self.stage = stage
+        self.timings = timings
+        self.metric = metric
+        self.elapsed = 0.0
+
+    def _recreate_cm(self):
+        # Used as a decorator, each call gets its own timer (thread safety).
+        return type(self)(self.stage, self.timings, self.metric)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self._start
+        self.metric.observe(self.elapsed, stage=self.stage)
+        if self.timings is not None:
+            self.timings[self.stage] = round(self.timings.get(self.stage, 0.0) + self.elapsed, 6)
+        return False
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _may_scrape(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.headers.get('Authorization', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden("Metrics need METRICS_TOKEN or an allowed address.\n")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,177 @@
+# core/middleware.py
+
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core.metrics import histogram
+
+logger = logging.getLogger('core.profiling')
+
+REQUEST_SECONDS = histogram(
+    'http_request_duration_seconds',
+    'Wall time per request, by view.',
+    labelnames=['view'],
+)
+REQUEST_DB_SECONDS = histogram(
+    'http_request_db_seconds',
+    'Time spent in SQL per request, by view.',
+    labelnames=['view'],
+)
+REQUEST_QUERIES = histogram(
+    'http_request_db_queries',
+    'SQL queries per request, by view. Catches N+1 regressions.',
+    labelnames=['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+# Per-request accumulator for serializer time; None outside a profiled request.
+_serializer_seconds = ContextVar('serializer_seconds', default=None)
+
+
+def _patch_serializer_timing():
+    """
+    Time top-level `serializer.data` calls. Nested serializers go through
+    to_representation, so each response's serialization is counted once.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    if getattr(BaseSerializer, '_profiling_patched', False):
+        return
+    original_data = BaseSerializer.data
+
+    def timed_data(self):
+        accumulated = _serializer_seconds.get()
+        if accumulated is None:
+            return original_data.fget(self)
+        start = time.perf_counter()
+        try:
+            return original_data.fget(self)
+        finally:
+            accumulated[0] += time.perf_counter() - start
+
+    BaseSerializer.data = property(timed_data)
+    BaseSerializer._profiling_patched = True
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in per-request profiling (REQUEST_PROFILING_ENABLED = True).
+
+    For every request it records query count, total DB time, serializer time
+    and response size, and:
+      - adds a `Server-Timing` header (visible in browser dev tools),
+      - feeds the http_request_* histograms on /metrics,
+      - logs one line per request on the 'core.profiling' logger.
+
+    A fraction of requests (REQUEST_PROFILING_SAMPLE_RATE) is also run under
+    cProfile, or pyinstrument if installed and selected, and the profile is
+    written to REQUEST_PROFILING_DIR for offline analysis.
+
+    When disabled, Django drops the middleware at startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.0)
+        self.dump_dir = str(getattr(settings, 'REQUEST_PROFILING_DIR', 'profiles'))
+        self.profiler = getattr(settings, 'REQUEST_PROFILING_PROFILER', 'cprofile')
+        _patch_serializer_timing()
+
+    def __call__(self, request):
+        db_stats = {'queries': 0, 'seconds': 0.0}
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db_stats['queries'] += 1
+                db_stats['seconds'] += time.perf_counter() - start
+
+        serializer_seconds = [0.0]
+        token = _serializer_seconds.set(serializer_seconds)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                if sampled:
+                    response, profile = self._profiled(request)
+                else:
+                    response, profile = self.get_response(request), None
+        finally:
+            _serializer_seconds.reset(token)
+        total_seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        size = len(response.content) if not response.streaming else -1
+
+        REQUEST_SECONDS.observe(total_seconds, view=view)
+        REQUEST_DB_SECONDS.observe(db_stats['seconds'], view=view)
+        REQUEST_QUERIES.observe(db_stats['queries'], view=view)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_stats["seconds"] * 1000:.1f};desc="{db_stats["queries"]} queries"',
+            f'ser;dur={serializer_seconds[0] * 1000:.1f};desc="serializer"',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ])
+
+        logger.info(
+            '%s %s view=%s status=%s total=%.1fms db=%.1fms queries=%d ser=%.1fms bytes=%d',
+            request.method, request.path, view, response.status_code,
+            total_seconds * 1000, db_stats['seconds'] * 1000, db_stats['queries'],
+            serializer_seconds[0] * 1000, size,
+        )
+
+        if profile is not None:
+            self._dump(profile, request, view, total_seconds)
+        return response
+
+    def _profiled(self, request):
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning('pyinstrument is not installed; falling back to cProfile.')
+            else:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.stop()
+                return response, profiler
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return response, profiler
+
+    def _dump(self, profile, request, view, total_seconds):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{view}-{total_seconds * 1000:.0f}ms"
+        if isinstance(profile, cProfile.Profile):
+            path = os.path.join(self.dump_dir, stem + '.prof')
+            profile.dump_stats(path)
+        else:
+            path = os.path.join(self.dump_dir, stem + '.html')
+            with open(path, 'w') as f:
+                f.write(profile.output_html())
+        logger.info('Profile for %s %s written to %s', request.method, request.path, path)
+
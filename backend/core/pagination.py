@@ -0,0 +1,13 @@
+# core/pagination.py
+
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class DefaultPagination(LimitOffsetPagination):
+    """
+    ?limit=&offset= pages for plain list endpoints that would otherwise return
+    a whole table: default_limit items unless ?limit= asks for more, up to
+    max_limit. Set per view; feeds and inboxes use cursor pagination instead.
+    """
+    default_limit = 50
+    max_limit = 200
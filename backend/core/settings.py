@@ -1,17 +1,30 @@
 # core/settings.py
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Settings profile: DJANGO_ENV=production switches the defaults below to
+# production ones (no DEBUG, INFO logging, JSON-only API, shared cache,
+# media handed off to the web server). Anything can still be overridden
+# through its own environment variable.
+PRODUCTION = os.environ.get('DJANGO_ENV') == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-^v=%8#(nml1s8!x5cwi_tz%r%+d4tb%9s*w$m=pn5(!*(1q+mu"
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise ImproperlyConfigured("SECRET_KEY must be set when DJANGO_ENV=production.")
+    SECRET_KEY = "django-insecure-^v=%8#(nml1s8!x5cwi_tz%r%+d4tb%9s*w$m=pn5(!*(1q+mu"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', '0' if PRODUCTION else '1') == '1'
 
-ALLOWED_HOSTS = ['192.168.1.42', 'localhost', '127.0.0.1']
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '192.168.1.42,localhost,127.0.0.1').split(',')
 
 
 # Application definition
@@ -36,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestProfilingMiddleware",  # No-op unless REQUEST_PROFILING_ENABLED
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # <-- Add this here
@@ -73,14 +87,47 @@ WSGI_APPLICATION = "core.wsgi.application"
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'sec_ur_privacy',
-        'USER': 'secuser',
-        'PASSWORD': 'mainproject',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'sec_ur_privacy'),
+        'USER': os.environ.get('DB_USER', 'secuser'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'mainproject'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Seconds to keep each thread's connection open between requests,
+        # pinged before reuse. Set it (e.g. 60) for WSGI workers only: under
+        # ASGI the async ORM runs on short-lived threads whose persistent
+        # connections would leak, so the default closes after each request.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
+        # Set to 1 behind PgBouncer in transaction mode, which cannot keep the
+        # server-side cursors that .iterator() opens across statements.
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+        },
     }
 }
 
+# DB_POOL=1: a psycopg 3 connection pool per process (Django 5.1+ with
+# psycopg[pool] installed). Pooled connections replace persistent ones.
+# Size it per process: web workers need about one connection per thread,
+# processing workers (process_photos) one.
+# Django before 5.1 has no pool: DB_POOL=1 then keeps persistent, health-checked
+# connections instead (DB_CONN_MAX_AGE, 60s unless set), which again suits
+# WSGI workers only. To pool across processes there, run PgBouncer in
+# transaction mode and set DB_DISABLE_SERVER_SIDE_CURSORS=1.
+if os.environ.get('DB_POOL') == '1':
+    import django
+
+    if django.VERSION >= (5, 1):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -102,6 +149,7 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = "static/"
+STATIC_ROOT = BASE_DIR / 'staticfiles'  # collectstatic target, served by the web server
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -121,6 +169,45 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# How /media/ is served (see core/media.py):
+#   django    - streamed by Django itself (development)
+#   x-accel   - nginx: an X-Accel-Redirect to MEDIA_ACCEL_REDIRECT_PREFIX,
+#               an `internal` location aliased to MEDIA_ROOT
+#   sendfile  - Apache mod_xsendfile / lighttpd: an X-Sendfile header
+#   off       - not routed; the web server serves MEDIA_ROOT directly
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'x-accel' if PRODUCTION else 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# The only parts of MEDIA_ROOT served, in every mode. Originals and content
+# blobs hold the unmasked faces and are never served.
+MEDIA_PUBLIC_PREFIXES = ('photos/public/', 'profile_pics/')
+
+# Media files are written to a temp file and renamed into place, so a
+# partially written image is never served.
+STORAGES = {
+    'default': {
+        'BACKEND': 'photos.storage.AtomicFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# --- UPLOAD LIMITS ---
+# Uploads are hashed and size-checked as they stream in (see photos.uploads),
+# and images are rejected before decoding if they have too many pixels.
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024  # 20 MB
+MAX_IMAGE_PIXELS = 40_000_000  # ~40 megapixels, e.g. 8000x5000
+FILE_UPLOAD_HANDLERS = [
+    'photos.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# --- FACE EMBEDDING STORE ---
+# Memory-mapped copy of every DetectedFace encoding, used for corpus-wide scans.
+# Must NOT live under MEDIA_ROOT, since media is publicly served.
+FACE_EMBEDDING_STORE_DIR = BASE_DIR / 'var' / 'embeddings'
+
 # --- CORS (FOR REACT FRONTEND) ---
 # For development, we can allow all origins. In production, we'd lock this down.
 # --- CORS (FOR REACT FRONTEND) ---
@@ -130,15 +217,125 @@ CORS_ALLOWED_ORIGINS = [
     "http://192.168.1.42:3000",
 ]
 
+# --- CACHES ---
+# One cache shared by every process when REDIS_URL is set (needs the redis
+# package); otherwise a per-process memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+if PRODUCTION:
+    # Admin sessions are read from the cache, not the database, on each request.
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # --- DJANGO REST FRAMEWORK ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Multipart uploads over MAX_UPLOAD_BYTES fail with 413 (see photos.uploads)
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'photos.uploads.LimitedMultiPartParser',
+    ),
+    # The browsable API renders an HTML page (forms included) per response.
+    'DEFAULT_RENDERER_CLASSES': (
+        ('rest_framework.renderers.JSONRenderer',)
+        if PRODUCTION else
+        ('rest_framework.renderers.JSONRenderer', 'rest_framework.renderers.BrowsableAPIRenderer')
+    ),
 }
 
+if PRODUCTION:
+    # Counted in CACHES, so per process unless REDIS_URL is set.
+    REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = (
+        'rest_framework.throttling.AnonRateThrottle',
+        'rest_framework.throttling.UserRateThrottle',
+    )
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '60/min'),
+        'user': os.environ.get('THROTTLE_USER_RATE', '600/min'),
+    }
+
+# --- FACE MODELS ---
+# Set FACE_MODELS_PRELOAD=1 in processing workers to load and warm up the
+# face models at startup. Leave unset for API-only workers, which then never
+# load them (see photos/recognition.py).
+FACE_MODELS_PRELOAD = os.environ.get('FACE_MODELS_PRELOAD') == '1'
+
+# Detector backend (see photos/detectors.py): hog | cnn | haar | yunet | cascade
+FACE_DETECTOR = 'hog'
+FACE_DETECTOR_UPSAMPLE = 1
+FACE_DETECTOR_UPSAMPLE_MAX_PIXELS = 2_000_000  # Larger images are not upsampled
+FACE_DETECTOR_MAX_SIDE = None  # e.g. 1600: detect on a downscaled copy of bigger images
+FACE_DETECTOR_CASCADE = ['hog', 'cnn']  # Cheapest first
+FACE_DETECTOR_CASCADE_MIN_SCORE = 0.5
+FACE_DETECTOR_CASCADE_ESCALATE_ON_EMPTY = False
+FACE_DETECTOR_YUNET_MODEL = None  # Path to face_detection_yunet_*.onnx
+
+# Faces are matched against the uploader's circle first (see
+# photos.services.get_candidate_user_ids); unmatched faces fall back to
+# all users unless this is False.
+FACE_MATCH_GLOBAL_FALLBACK = True
+
+# --- CONSENT NOTIFICATIONS ---
+# Server-sent event stream at /api/consent-requests/stream/, ASGI only (see photos/async_views.py)
+CONSENT_STREAM_HEARTBEAT_SECONDS = 25
+CONSENT_STREAM_RESYNC_SECONDS = 60  # Re-read counts to catch changes made in other processes
+CONSENT_STREAM_MAX_SECONDS = 600  # Clients reconnect after this, with a new ticket
+CONSENT_STREAM_TICKET_SECONDS = 30  # Lifetime of the single-use ticket a stream is opened with
+# Photos a bulk approve/deny re-renders within the request; the rest are
+# left to render_pending_photos (see photos.services.bulk_set_consent_status)
+CONSENT_BULK_INLINE_RENDERS = 20
+
+# --- HOME TIMELINES ---
+# New photos are copied into every follower's timeline, unless the uploader
+# has more followers than this; their photos are merged in at read time.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+TIMELINE_BACKFILL_PHOTOS = 50  # Recent photos copied into a timeline on follow
+
+# --- FEED COUNTERS ---
+# Buffer like/comment counter updates in memory and write them in batches
+# (see photos/counters.py). Pair with a periodic reconcile_feed_counters.
+FEED_COUNTER_WRITE_BEHIND = os.environ.get('FEED_COUNTER_WRITE_BEHIND') == '1'
+FEED_COUNTER_FLUSH_MS = 500
+# Buffered like changes mark their photo in the cache this long, so that
+# reconcile_feed_counters leaves it alone (needs a shared cache: REDIS_URL)
+FEED_COUNTER_TOUCH_SECONDS = 120
+
+# --- METRICS ---
+# /metrics answers an `Authorization: Bearer <METRICS_TOKEN>` request, one from
+# METRICS_ALLOWED_IPS (comma-separated; behind a reverse proxy REMOTE_ADDR is
+# the proxy's, so don't list it there) or a staff session. Nobody else.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# --- REQUEST PROFILING ---
+# Opt-in: per-request query count, DB/serializer time and Server-Timing
+# headers, plus sampled cProfile (or pyinstrument) dumps for offline analysis.
+REQUEST_PROFILING_ENABLED = False
+REQUEST_PROFILING_SAMPLE_RATE = 0.0  # Fraction of requests to profile, e.g. 0.01
+REQUEST_PROFILING_DIR = BASE_DIR / 'var' / 'profiles'
+REQUEST_PROFILING_PROFILER = 'cprofile'  # or 'pyinstrument'
+
 # --- LOGGING CONFIGURATION ---
+# Level of the app loggers (users, photos, interactions). DEBUG emits
+# per-face lines during image processing.
+APP_LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO' if PRODUCTION else 'DEBUG')
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -166,19 +363,24 @@ LOGGING = {
             # --- END OF CHANGE ---
             "propagate": False,
         },
+        "core": { # Request profiling middleware
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
         "users": { # Logger for your 'users' app
             "handlers": ["console"],
-            "level": "DEBUG", # Show everything from DEBUG level up
+            "level": APP_LOG_LEVEL,
             "propagate": False,
         },
         "photos": { # Logger for your 'photos' app
             "handlers": ["console"],
-            "level": "DEBUG",
+            "level": APP_LOG_LEVEL,
             "propagate": False,
         },
         "interactions": { # Logger for your 'interactions' app
             "handlers": ["console"],
-            "level": "DEBUG",
+            "level": APP_LOG_LEVEL,
             "propagate": False,
         },
     },
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['photo', 'created_at', 'id'], name='comment_photo_idx'),
+        ),
+    ]
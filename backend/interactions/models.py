@@ -21,5 +21,11 @@ class Comment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A photo's comments in order, read with keyset cursors.
+            models.Index(fields=['photo', 'created_at', 'id'], name='comment_photo_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user.username} on {self.photo.id}'
\ No newline at end of file
@@ -1,10 +1,10 @@
 from rest_framework import serializers
 from .models import Like, Comment
-from users.serializers import CustomUserSerializer
+from users.serializers import UserSummarySerializer
 
 
 class LikeSerializer(serializers.ModelSerializer):
-    user = CustomUserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = Like
@@ -13,7 +13,7 @@ class LikeSerializer(serializers.ModelSerializer):
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    user = CustomUserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = Comment
@@ -0,0 +1,61 @@
+# backend/interactions/services.py
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from photos.services import adjust_feed_like_count
+from .models import Like
+
+
+def like_photo(user, photo_id):
+    """
+    Like a photo. Idempotent: a repeated like (double-tap, retried request)
+    is a no-op instead of an IntegrityError.
+
+    The insert is `INSERT ... ON CONFLICT DO NOTHING RETURNING id`, so of any
+    number of concurrent likes by the same user exactly one inserts a row,
+    and only that one bumps the counter. Nothing is locked before the insert.
+
+    Returns:
+        bool: True if a new like was created
+    """
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, photo_id, created_at) VALUES (%s, %s, %s) "
+                f"ON CONFLICT DO NOTHING RETURNING id",
+                [user.id, photo_id, timezone.now()],
+            )
+            created = cursor.fetchone() is not None
+        if created:
+            adjust_feed_like_count(photo_id, 1)
+    return created
+
+
+def unlike_photo(user, photo_id):
+    """
+    Remove a like. Idempotent; only the request that actually deleted the
+    row decrements the counter.
+
+    Returns:
+        bool: True if a like was removed
+    """
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, photo_id=photo_id).delete()
+        if deleted:
+            adjust_feed_like_count(photo_id, -1)
+    return bool(deleted)
+
+
+def liked_photo_ids(user, photo_ids):
+    """Which of `photo_ids` the user has liked, in one query."""
+    return set(Like.objects.filter(user=user, photo_id__in=photo_ids).values_list('photo_id', flat=True))
+
+
+async def aliked_photo_ids(user, photo_ids):
+    """Async-ORM variant of `liked_photo_ids`."""
+    return {
+        photo_id async for photo_id in
+        Like.objects.filter(user=user, photo_id__in=photo_ids).values_list('photo_id', flat=True)
+    }
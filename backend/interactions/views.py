@@ -1,21 +1,79 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, serializers
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from core.pagination import DefaultPagination
 from .models import Like, Comment
 from .serializers import LikeSerializer, CommentSerializer
+from . import services
+from photos import services as photo_services
+
+
+class CommentPagination(CursorPagination):
+    """Oldest first within a photo; served by the (photo, created_at, id) index."""
+    ordering = ('created_at', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 class LikeViewSet(viewsets.ModelViewSet):
     queryset = Like.objects.all()
     serializer_class = LikeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # The list is every like on the site; /mine/ answers the per-photo question.
+    pagination_class = DefaultPagination
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # Liking twice returns the existing like instead of failing.
+        photo = serializer.validated_data['photo']
+        services.like_photo(self.request.user, photo.id)
+        serializer.instance = Like.objects.get(user=self.request.user, photo=photo)
+
+    def perform_destroy(self, instance):
+        services.unlike_photo(instance.user, instance.photo_id)
+
+    @action(detail=False, methods=['get'])
+    def mine(self, request):
+        """
+        GET /api/likes/mine/?photos=1,2,3
+        Which of the given photos the current user has liked, in one query.
+        """
+        try:
+            photo_ids = [int(photo_id) for photo_id in request.query_params.get('photos', '').split(',') if photo_id]
+        except ValueError:
+            return Response({'detail': 'photos must be a comma-separated list of ids.'}, status=400)
+        return Response({'liked': sorted(services.liked_photo_ids(request.user, photo_ids[:200]))})
 
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CommentPagination
+
+    def get_queryset(self):
+        # ?photo=<id> lists one photo's comments; prefer /api/photos/{id}/comments/.
+        queryset = Comment.objects.select_related('user')
+        photo_id = self.request.query_params.get('photo')
+        if photo_id:
+            try:
+                photo_id = int(photo_id)
+            except ValueError:
+                photo_id = 0
+            if photo_id < 1:
+                raise serializers.ValidationError({'photo': 'Must be a photo id.'})
+            queryset = queryset.filter(photo_id=photo_id)
+        return queryset
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        comment = serializer.save(user=self.request.user)
+        photo_services.refresh_feed_comments(comment.photo_id)
+
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        photo_services.refresh_feed_comments(comment.photo_id)
+
+    def perform_destroy(self, instance):
+        photo_id = instance.photo_id
+        instance.delete()
+        photo_services.refresh_feed_comments(photo_id)
\ No newline at end of file
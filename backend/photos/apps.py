@@ -1,6 +1,20 @@
+import gc
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PhotosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "photos"
+
+    def ready(self):
+        # Processing workers load and warm up the face models at startup
+        # instead of on the first photo. Under `gunicorn --preload` this runs
+        # once in the master before forking, so workers share the model
+        # memory copy-on-write; gc.freeze() keeps the collector from touching
+        # (and so copying) those pages in each child.
+        if getattr(settings, 'FACE_MODELS_PRELOAD', False):
+            from . import recognition
+            recognition.warm_up()
+            gc.freeze()
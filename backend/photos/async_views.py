@@ -0,0 +1,281 @@
+# backend/photos/async_views.py
+#
+# Read-heavy, I/O-bound endpoints as native async Django views.
+#
+# DRF's views are synchronous, so these are plain Django views that speak
+# the same JSON and authenticate with the same JWTs. Under ASGI (uvicorn /
+# daphne, see README) they run on the event loop and query through the async
+# ORM, so a process can hold thousands of slow clients and open event
+# streams without a thread per connection. Under WSGI the request/response
+# views still work, Django running each one in its own short-lived event
+# loop, but the event stream does not (see consent_stream).
+#
+# Every middleware in MIDDLEWARE must stay async-capable, otherwise Django
+# moves these views back onto a thread. RequestProfilingMiddleware is the
+# exception, but it removes itself unless profiling is enabled.
+
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.utils.urls import replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from core.events import broker
+from interactions import services as interaction_services
+from users.models import Follow
+from .models import Photo, FeedItem
+from . import services
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+
+async def aauthenticate(request):
+    """The user of the request's JWT access token (Authorization header), or None."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        user_id = authentication.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None
+    return await _active_user(**{jwt_settings.USER_ID_FIELD: user_id})
+
+
+async def _active_user(**lookup):
+    user = await get_user_model().objects.filter(**lookup).afirst()
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+def _unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+
+def _only_get(request):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    return None
+
+
+def _page_params(request):
+    """(before, page_size) from the query string; ValueError if malformed."""
+    before = int(request.GET['before']) if 'before' in request.GET else None
+    page_size = int(request.GET.get('page_size', FEED_PAGE_SIZE))
+    return before, max(1, min(page_size, FEED_MAX_PAGE_SIZE))
+
+
+async def _feed_response(request, user, rows, has_more, **extra):
+    """
+    Finish FeedItem rows: absolute URLs, the viewer's likes and the next-page
+    link. `extra` keys are added to the response body.
+    """
+    liked = await interaction_services.aliked_photo_ids(user, [row['photo_id'] for row in rows])
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if url else None
+
+    items = []
+    for row in rows:
+        item = row['payload']
+        item['uploader']['profile_pic'] = absolute(item['uploader']['profile_pic'])
+        item['public_image'] = absolute(item['public_image'])
+        item['like_count'] = row['like_count']
+        item['comment_count'] = row['comment_count']
+        item['latest_comments'] = row['latest_comments']
+        item['liked_by_me'] = row['photo_id'] in liked
+        items.append(item)
+
+    next_url = None
+    if has_more:
+        next_url = replace_query_param(request.build_absolute_uri(), 'before', rows[-1]['photo_id'])
+    return JsonResponse({'next': next_url, 'results': items, **extra})
+
+
+async def feed(request):
+    """
+    GET /api/photos/feed/?before=<photo id>&page_size=N
+    Everyone's photos, newest first, from the FeedItem read model: one range
+    scan over pre-shaped rows plus one lookup of the viewer's likes.
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return _unauthorized()
+    error = _only_get(request)
+    if error:
+        return error
+    try:
+        before, page_size = _page_params(request)
+    except ValueError:
+        return JsonResponse({'detail': 'before and page_size must be integers.'}, status=400)
+
+    items = FeedItem.objects.order_by('-photo_id')
+    if before is not None:
+        items = items.filter(photo_id__lt=before)
+    rows = [row async for row in items.values(*services.FEED_ROW_FIELDS)[:page_size + 1]]
+    return await _feed_response(request, user, rows[:page_size], len(rows) > page_size)
+
+
+async def timeline(request):
+    """
+    GET /api/photos/timeline/?before=<photo id>&page_size=N
+    The home timeline: the user's own photos and those of accounts they
+    follow, newest first. `follows_anyone` tells clients when it can only
+    hold the user's own photos, so they show the global feed instead.
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return _unauthorized()
+    error = _only_get(request)
+    if error:
+        return error
+    try:
+        before, page_size = _page_params(request)
+    except ValueError:
+        return JsonResponse({'detail': 'before and page_size must be integers.'}, status=400)
+
+    rows, has_more = await services.aget_timeline_page(user, before=before, limit=page_size)
+    follows_anyone = await Follow.objects.filter(follower=user).aexists()
+    return await _feed_response(request, user, rows, has_more, follows_anyone=follows_anyone)
+
+
+async def photo_status(request):
+    """
+    GET /api/photos/status/?ids=1,2,3
+    Processing status of up to 100 photos, for clients waiting for a
+    placeholder to become READY: [{"id", "status", "public_image"}].
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return _unauthorized()
+    error = _only_get(request)
+    if error:
+        return error
+    try:
+        ids = [int(photo_id) for photo_id in request.GET.get('ids', '').split(',') if photo_id][:100]
+    except ValueError:
+        return JsonResponse({'detail': 'ids must be a comma-separated list of integers.'}, status=400)
+
+    storage = Photo._meta.get_field('public_image').storage
+    results = []
+    async for row in Photo.objects.filter(id__in=ids).values('id', 'status', 'public_image'):
+        ready = row['status'] == Photo.StatusChoices.READY and row['public_image']
+        row['public_image'] = request.build_absolute_uri(storage.url(row['public_image'])) if ready else None
+        results.append(row)
+    return JsonResponse({'results': results})
+
+
+async def consent_summary(request):
+    """
+    GET /api/consent-requests/summary/ -> {"PENDING": 3, "APPROVED": 10, "DENIED": 1}
+
+    One primary-key read of the user's counter. Clients that want to be
+    told about changes should open /api/consent-requests/stream/ instead
+    of polling this.
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return _unauthorized()
+    error = _only_get(request)
+    if error:
+        return error
+    return JsonResponse(await services.aget_consent_counts(user))
+
+
+async def _consent_events(user):
+    """
+    Server-sent events for one user's consent inbox: a `summary` event with
+    the counts on connect and whenever they change, plus keep-alive comments.
+    """
+    heartbeat = getattr(settings, 'CONSENT_STREAM_HEARTBEAT_SECONDS', 25)
+    resync = getattr(settings, 'CONSENT_STREAM_RESYNC_SECONDS', 60)
+    max_seconds = getattr(settings, 'CONSENT_STREAM_MAX_SECONDS', 600)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    # Ask the browser to reconnect 5s after we close the stream.
+    yield 'retry: 5000\n\n'
+
+    with broker.subscribe(services.consent_channel(user.id)) as queue:
+        last_counts = None
+        next_resync = 0.0
+        changed = True
+        while loop.time() < deadline:
+            if changed or loop.time() >= next_resync:
+                counts = await services.aget_consent_counts(user)
+                next_resync = loop.time() + resync
+                if counts != last_counts:
+                    last_counts = counts
+                    yield f"event: summary\ndata: {json.dumps(counts)}\n\n"
+            try:
+                await asyncio.wait_for(queue.get(), timeout=min(heartbeat, max(0.0, deadline - loop.time())))
+                # Coalesce a burst of changes (e.g. a bulk action) into one read.
+                while not queue.empty():
+                    queue.get_nowait()
+                changed = True
+            except asyncio.TimeoutError:
+                changed = False
+                yield ': keep-alive\n\n'
+
+
+async def consent_stream_ticket(request):
+    """
+    POST /api/consent-requests/stream/ticket/ -> {"ticket": "...", "expires_in": 30}
+
+    A single-use, short-lived ticket for opening the consent stream, so the
+    access token itself never appears in a URL (and so in access logs or
+    browser history).
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return _unauthorized()
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    return JsonResponse({
+        'ticket': services.issue_stream_ticket(user),
+        'expires_in': getattr(settings, 'CONSENT_STREAM_TICKET_SECONDS', 30),
+    })
+
+
+# Authenticated by the Authorization header only, never by cookies, so CSRF
+# does not apply. (Django 4.2's csrf_exempt decorator would make the view sync.)
+consent_stream_ticket.csrf_exempt = True
+
+
+async def consent_stream(request):
+    """
+    GET /api/consent-requests/stream/?ticket=<ticket from stream/ticket/>
+
+    Push channel replacing badge polling: one long-lived text/event-stream
+    per client, closed after CONSENT_STREAM_MAX_SECONDS. A ticket opens one
+    stream, so clients reconnect with a new ticket rather than letting
+    EventSource retry the same URL.
+
+    ASGI only. Under WSGI, Django 4.2 collects an async iterator in full
+    before sending it, so the client would get nothing until the deadline
+    while the stream holds a sync worker; it answers 501 there and clients
+    poll /api/consent-requests/summary/ instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'Event streams need an ASGI server; poll /api/consent-requests/summary/.'},
+            status=501,
+        )
+    user_id = await services.aredeem_stream_ticket(request.GET.get('ticket', ''))
+    user = await _active_user(id=user_id) if user_id is not None else None
+    if user is None:
+        return _unauthorized()
+
+    response = StreamingHttpResponse(_consent_events(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
@@ -0,0 +1,151 @@
+# backend/photos/counters.py
+#
+# Optional write-behind buffering of feed counters (FEED_COUNTER_WRITE_BEHIND).
+#
+# Without it every like is an UPDATE of the photo's FeedItem row, and during
+# a burst on one viral photo those updates queue up on that row's lock. With
+# it, a like only adds to an in-process delta for the photo, and a background
+# thread writes all pending deltas every FEED_COUNTER_FLUSH_MS in a single
+# UPDATE ... SET like_count = like_count + CASE ... statement. Comment
+# previews are coalesced the same way: a photo that got fifty comments within
+# one interval is refreshed once.
+#
+# Deltas live in process memory, so a crash loses at most one interval's
+# worth. `services.reconcile_feed_counters` (manage.py reconcile_feed_counters)
+# recounts from the Like and Comment tables; run it periodically and after
+# restarts. A recount must skip photos whose like delta may still be in some
+# process's buffer, or the flush would apply it a second time; an unlike
+# leaves no row behind to show that, so every buffered like change also marks
+# the photo in the cache for FEED_COUNTER_TOUCH_SECONDS (`recently_touched`).
+# The cache must be shared by all processes (REDIS_URL) for that to work.
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
+
+from core.db import worker_task
+
+logger = logging.getLogger('photos')
+
+TOUCHED_KEY = 'feed-counters:touched:{}'
+# A photo liked non-stop is re-marked in the cache at most this often per process.
+TOUCH_REFRESH_SECONDS = 10
+
+
+def enabled():
+    return getattr(settings, 'FEED_COUNTER_WRITE_BEHIND', False)
+
+
+def recently_touched(photo_ids):
+    """The ids among `photo_ids` whose like count was changed, by any process, lately."""
+    keys = {TOUCHED_KEY.format(photo_id): photo_id for photo_id in photo_ids}
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+
+class WriteBehindCounters:
+    """Pending like deltas and comment refreshes, flushed by a daemon thread."""
+
+    def __init__(self):
+        self._likes = defaultdict(int)
+        self._comments = set()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_likes(self, photo_id, delta):
+        with self._lock:
+            self._likes[photo_id] += delta
+        self._touch(photo_id)
+        self._ensure_started()
+
+    def mark_comments(self, photo_id):
+        with self._lock:
+            self._comments.add(photo_id)
+        self._ensure_started()
+
+    def pending_likes(self, photo_id):
+        with self._lock:
+            return self._likes.get(photo_id, 0)
+
+    def flush(self):
+        """
+        Write everything pending. On a database error the deltas are put
+        back and retried on the next flush.
+
+        Returns:
+            (int, int): like counters and comment previews written
+        """
+        from .models import FeedItem
+        from .services import write_feed_comments
+
+        with self._lock:
+            likes, self._likes = self._likes, defaultdict(int)
+            comments, self._comments = self._comments, set()
+            cutoff = time.monotonic() - TOUCH_REFRESH_SECONDS
+            self._touched = {photo_id: at for photo_id, at in self._touched.items() if at > cutoff}
+        likes = {photo_id: delta for photo_id, delta in likes.items() if delta}
+
+        try:
+            if likes:
+                FeedItem.objects.filter(photo_id__in=likes).update(
+                    like_count=F('like_count') + Case(
+                        *[When(photo_id=photo_id, then=Value(delta)) for photo_id, delta in likes.items()],
+                        default=Value(0),
+                    )
+                )
+        except Exception as e:
+            logger.error(f"[Counters] Flushing {len(likes)} like counters failed, will retry: {e}")
+            with self._lock:
+                for photo_id, delta in likes.items():
+                    self._likes[photo_id] += delta
+                self._comments |= comments
+            return 0, 0
+
+        written = 0
+        for photo_id in comments:
+            try:
+                write_feed_comments(photo_id)
+                written += 1
+            except Exception as e:
+                logger.error(f"[Counters] Refreshing comments of photo {photo_id} failed, will retry: {e}")
+                with self._lock:
+                    self._comments.add(photo_id)
+        return len(likes), written
+
+    def _touch(self, photo_id):
+        """Mark the photo in the shared cache, see `recently_touched`."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(photo_id, float('-inf')) < TOUCH_REFRESH_SECONDS:
+                return
+            self._touched[photo_id] = now
+        try:
+            cache.set(TOUCHED_KEY.format(photo_id), 1, getattr(settings, 'FEED_COUNTER_TOUCH_SECONDS', 120))
+        except Exception as e:
+            logger.error(f"[Counters] Could not mark photo {photo_id} as touched: {e}")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='feed-counters', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        interval = getattr(settings, 'FEED_COUNTER_FLUSH_MS', 500) / 1000
+        stop = threading.Event()
+        while not stop.wait(interval):
+            # This thread's connection would otherwise live forever.
+            with worker_task():
+                self.flush()
+
+
+buffer = WriteBehindCounters()
@@ -0,0 +1,217 @@
+# backend/photos/detectors.py
+#
+# Face detector backends behind one interface, so the speed/accuracy
+# tradeoff is a setting rather than code:
+#
+#   hog     dlib HOG + SVM. Fast on CPU, misses small and turned faces.
+#   cnn     dlib MMOD CNN. Much better recall, several times slower on CPU.
+#   haar    OpenCV Haar cascade. Fastest, least accurate. Needs opencv-python.
+#   yunet   OpenCV YuNet DNN. Fast and accurate. Needs opencv-python >= 4.8
+#           and FACE_DETECTOR_YUNET_MODEL pointing at the .onnx model.
+#   cascade Runs a cheap detector first and only re-runs a better one when
+#           the cheap one is unsure (see CascadeDetector).
+#
+# Every backend returns locations as face_recognition (top, right, bottom,
+# left) tuples in the coordinates of the image it was given.
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import recognition
+
+# `detector` is the id of the backend that produced the result, which is
+# what ends up in DetectedFace.detector_version.
+Detections = namedtuple('Detections', ['locations', 'scores', 'detector'])
+
+DETECTORS = {}
+
+
+def register(name):
+    """Register a FaceDetector subclass under `name`."""
+    def decorator(cls):
+        cls.name = name
+        DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+class FaceDetector:
+    """
+    Base class. Subclasses implement `_detect(image, upsample)`.
+
+    Two size-dependent dials apply to every backend:
+      - images larger than FACE_DETECTOR_MAX_SIDE are detected on a
+        downscaled copy and the boxes are scaled back up;
+      - images with more than FACE_DETECTOR_UPSAMPLE_MAX_PIXELS pixels are
+        not upsampled (faces in them are already big enough to find).
+    """
+
+    name = None
+    # Bump when a backend's behaviour changes; stored as '<name>-<version>'.
+    version = 1
+
+    def __init__(self):
+        self.upsample = getattr(settings, 'FACE_DETECTOR_UPSAMPLE', 1)
+        self.upsample_max_pixels = getattr(settings, 'FACE_DETECTOR_UPSAMPLE_MAX_PIXELS', None)
+        self.max_side = getattr(settings, 'FACE_DETECTOR_MAX_SIDE', None)
+
+    @property
+    def id(self):
+        return f"{self.name}-{self.version}"
+
+    @property
+    def ids(self):
+        """Every id this detector can report; used to decide if a stored result is reusable."""
+        return {self.id}
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        scale = 1.0
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            resized = Image.fromarray(image).resize(
+                (max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR
+            )
+            image = np.asarray(resized)
+
+        upsample = self.upsample
+        if self.upsample_max_pixels and image.shape[0] * image.shape[1] > self.upsample_max_pixels:
+            upsample = 0
+
+        locations, scores = self._detect(image, upsample)
+        if scale != 1.0:
+            locations = [
+                (
+                    int(top / scale),
+                    min(width, int(right / scale)),
+                    min(height, int(bottom / scale)),
+                    int(left / scale),
+                )
+                for top, right, bottom, left in locations
+            ]
+        return Detections(locations, scores, self.id)
+
+    def _detect(self, image, upsample):
+        raise NotImplementedError
+
+
+@register('hog')
+class HogDetector(FaceDetector):
+    def _detect(self, image, upsample):
+        return recognition.detect_hog(image, upsample)
+
+
+@register('cnn')
+class CnnDetector(FaceDetector):
+    def _detect(self, image, upsample):
+        return recognition.detect_cnn(image, upsample)
+
+
+def _import_cv2():
+    try:
+        import cv2
+    except ImportError:
+        raise ImproperlyConfigured("The OpenCV face detectors need opencv-python (pip install opencv-python).")
+    return cv2
+
+
+def _xywh_to_css(x, y, w, h, shape):
+    height, width = shape[:2]
+    return (max(0, int(y)), min(width, int(x + w)), min(height, int(y + h)), max(0, int(x)))
+
+
+@register('haar')
+class HaarDetector(FaceDetector):
+    def __init__(self):
+        super().__init__()
+        cv2 = _import_cv2()
+        self._cv2 = cv2
+        self._classifier = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def _detect(self, image, upsample):
+        gray = self._cv2.cvtColor(image, self._cv2.COLOR_RGB2GRAY)
+        # Haar has no upsampling; a smaller minimum window plays the same role.
+        min_size = 20 if upsample else 40
+        rects, _, weights = self._classifier.detectMultiScale3(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size), outputRejectLevels=True
+        )
+        locations = [_xywh_to_css(x, y, w, h, image.shape) for x, y, w, h in rects]
+        return locations, [float(weight) for weight in np.ravel(weights)]
+
+
+@register('yunet')
+class YuNetDetector(FaceDetector):
+    def __init__(self):
+        super().__init__()
+        cv2 = _import_cv2()
+        model_path = getattr(settings, 'FACE_DETECTOR_YUNET_MODEL', None)
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            raise ImproperlyConfigured("The yunet detector needs opencv-python >= 4.8.")
+        if not model_path:
+            raise ImproperlyConfigured("Set FACE_DETECTOR_YUNET_MODEL to the path of face_detection_yunet_*.onnx.")
+        self._cv2 = cv2
+        self._model = cv2.FaceDetectorYN.create(str(model_path), '', (320, 320), score_threshold=0.6)
+
+    def _detect(self, image, upsample):
+        height, width = image.shape[:2]
+        self._model.setInputSize((width, height))
+        _, faces = self._model.detect(self._cv2.cvtColor(image, self._cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return [], []
+        # Each row: x, y, w, h, five landmark points, score.
+        locations = [_xywh_to_css(*face[:4], image.shape) for face in faces]
+        return locations, [float(face[-1]) for face in faces]
+
+
+@register('cascade')
+class CascadeDetector(FaceDetector):
+    """
+    Run the detectors in FACE_DETECTOR_CASCADE in order (cheapest first) and
+    stop at the first whose result is confident: every face scores at least
+    FACE_DETECTOR_CASCADE_MIN_SCORE. With FACE_DETECTOR_CASCADE_ESCALATE_ON_EMPTY,
+    finding no face at all also escalates. The last stage's result is used as is.
+
+    Scores are on each backend's own scale (HOG: SVM margin, CNN: MMOD
+    confidence), so the threshold is tuned for the first stage.
+    """
+
+    def __init__(self):
+        super().__init__()
+        names = getattr(settings, 'FACE_DETECTOR_CASCADE', ['hog', 'cnn'])
+        if 'cascade' in names:
+            raise ImproperlyConfigured("FACE_DETECTOR_CASCADE cannot contain 'cascade'.")
+        self.stages = [get_detector(name) for name in names]
+        self.min_score = getattr(settings, 'FACE_DETECTOR_CASCADE_MIN_SCORE', 0.5)
+        self.escalate_on_empty = getattr(settings, 'FACE_DETECTOR_CASCADE_ESCALATE_ON_EMPTY', False)
+
+    @property
+    def ids(self):
+        return set().union(*(stage.ids for stage in self.stages))
+
+    def detect(self, image):
+        for stage in self.stages[:-1]:
+            result = stage.detect(image)
+            if result.scores and min(result.scores) >= self.min_score:
+                return result
+            if not result.scores and not self.escalate_on_empty:
+                return result
+        return self.stages[-1].detect(image)
+
+
+@lru_cache(maxsize=None)
+def get_detector(name=None):
+    """
+    Return the (cached) detector called `name`, or the deployment default
+    from FACE_DETECTOR.
+    """
+    name = name or getattr(settings, 'FACE_DETECTOR', 'hog')
+    try:
+        detector_class = DETECTORS[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown face detector '{name}'. Choose from: {', '.join(DETECTORS)}.")
+    return detector_class()
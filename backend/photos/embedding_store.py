@@ -0,0 +1,169 @@
+# backend/photos/embedding_store.py
+
+import logging
+import os
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger('photos')
+
+ENCODING_DIM = 128
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped store of DetectedFace encodings.
+
+    Two flat files live side by side in one directory:
+      - `faces.f32`: float32 rows of 128 values (512 bytes per face)
+      - `faces.ids`: int64 DetectedFace ids, one per row
+
+    Readers get zero-copy numpy views over the files, so a single worker can
+    scan millions of faces without building a Python object per face. The
+    database stays the source of truth: rows whose DetectedFace was deleted
+    are simply ignored by callers, and `rebuild()` compacts the store.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = str(directory or settings.FACE_EMBEDDING_STORE_DIR)
+        self.vectors_path = os.path.join(self.directory, 'faces.f32')
+        self.ids_path = os.path.join(self.directory, 'faces.ids')
+        self.lock_path = os.path.join(self.directory, 'faces.lock')
+
+    def __len__(self):
+        # A crash between the two writes can leave one file a row ahead;
+        # only rows present in both files count.
+        try:
+            vectors_rows = os.path.getsize(self.vectors_path) // (ENCODING_DIM * 4)
+            ids_rows = os.path.getsize(self.ids_path) // 8
+        except FileNotFoundError:
+            return 0
+        return min(vectors_rows, ids_rows)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, face_ids, encodings):
+        """Append encodings for the given DetectedFace ids."""
+        ids = np.asarray(face_ids, dtype='<i8').reshape(-1)
+        vectors = np.asarray(encodings, dtype='<f4').reshape(-1, ENCODING_DIM)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids but {len(vectors)} encodings")
+        if len(ids) == 0:
+            return
+
+        with self._locked():
+            rows = len(self)
+            # Drop any torn tail from a previous crash before appending.
+            with open(self.vectors_path, 'ab') as vectors_file, open(self.ids_path, 'ab') as ids_file:
+                vectors_file.truncate(rows * ENCODING_DIM * 4)
+                ids_file.truncate(rows * 8)
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+                ids_file.write(ids.tobytes())
+                ids_file.flush()
+                os.fsync(ids_file.fileno())
+
+    def ids(self):
+        """Zero-copy (N,) int64 view of the face ids."""
+        rows = len(self)
+        if rows == 0:
+            return np.empty(0, dtype='<i8')
+        return np.memmap(self.ids_path, dtype='<i8', mode='r', shape=(rows,))
+
+    def vectors(self):
+        """Zero-copy (N, 128) float32 view of the encodings."""
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0, ENCODING_DIM), dtype='<f4')
+        return np.memmap(self.vectors_path, dtype='<f4', mode='r', shape=(rows, ENCODING_DIM))
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        Yield (ids, vectors) views of at most `chunk_size` rows at a time.
+        Only the pages actually touched are read from disk.
+        """
+        ids = self.ids()
+        vectors = self.vectors()
+        for start in range(0, len(ids), chunk_size):
+            yield ids[start:start + chunk_size], vectors[start:start + chunk_size]
+
+    def rebuild(self, batch_size=10000):
+        """
+        Rewrite the store from the DetectedFace table, dropping deleted faces.
+        The new files are built next to the old ones and swapped in once complete.
+
+        Returns:
+            int: Number of faces written
+        """
+        from .models import DetectedFace
+
+        with self._locked():
+            tmp_vectors_path = self.vectors_path + '.tmp'
+            tmp_ids_path = self.ids_path + '.tmp'
+            count = 0
+            faces = (
+                DetectedFace.objects.filter(encoding__isnull=False)
+                .order_by('id')
+                .values_list('id', 'encoding')
+            )
+            with open(tmp_vectors_path, 'wb') as vectors_file, open(tmp_ids_path, 'wb') as ids_file:
+                last_id = 0
+                while True:
+                    batch = list(faces.filter(id__gt=last_id)[:batch_size])
+                    if not batch:
+                        break
+                    last_id = batch[-1][0]
+                    ids_file.write(np.array([face_id for face_id, _ in batch], dtype='<i8').tobytes())
+                    vectors_file.write(b''.join(bytes(encoding) for _, encoding in batch))
+                    count += len(batch)
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+                ids_file.flush()
+                os.fsync(ids_file.fileno())
+            os.replace(tmp_vectors_path, self.vectors_path)
+            os.replace(tmp_ids_path, self.ids_path)
+
+        logger.info(f"[EmbeddingStore] Rebuilt store with {count} faces in {self.directory}.")
+        return count
+
+    def count_missing(self, batch_size=50000):
+        """
+        Number of DetectedFace rows with an encoding that this store lacks:
+        appended on another host, or lost to a failed append. Scans their ids
+        in batches against the store's ids.
+        """
+        from .models import DetectedFace
+
+        stored = np.sort(self.ids())
+        faces = DetectedFace.objects.filter(encoding__isnull=False).order_by('id').values_list('id', flat=True)
+        missing = 0
+        last_id = 0
+        while True:
+            batch = np.array(list(faces.filter(id__gt=last_id)[:batch_size]), dtype='<i8')
+            if len(batch) == 0:
+                return missing
+            last_id = int(batch[-1])
+            missing += int((~np.isin(batch, stored, assume_unique=True)).sum())
+
+
+def get_embedding_store():
+    """Return the EmbeddingStore configured in settings."""
+    return EmbeddingStore()
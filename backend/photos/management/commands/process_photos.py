@@ -0,0 +1,69 @@
+# backend/photos/management/commands/process_photos.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.db import worker_task
+from photos.models import Photo
+from photos.services import process_photos_for_faces, reset_photo_detection
+
+class Command(BaseCommand):
+    help = 'Backfill: (re)process photos that never became READY, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            nargs='+',
+            choices=[Photo.StatusChoices.PROCESSING, Photo.StatusChoices.FAILED],
+            default=[Photo.StatusChoices.PROCESSING, Photo.StatusChoices.FAILED],
+            help='Which photos to process (default: PROCESSING and FAILED)',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=10,
+            help='Skip photos uploaded less than this many minutes ago (they may still be processing)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=8,
+            help='Photos per batched encoding call; each holds a decoded image in memory',
+        )
+        parser.add_argument(
+            '--detector',
+            default=getattr(settings, 'FACE_DETECTOR', 'hog'),
+            help='Detector backend from photos.detectors, e.g. cnn for better recall offline',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['min_age'])
+        photo_ids = list(
+            Photo.objects.filter(status__in=options['status'], created_at__lt=cutoff)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        if not photo_ids:
+            self.stdout.write(self.style.SUCCESS("✓ Nothing to process"))
+            return
+
+        self.stdout.write(f"Processing {len(photo_ids)} photos with detector '{options['detector']}'...")
+
+        ready = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(photo_ids), batch_size):
+            batch = photo_ids[start:start + batch_size]
+            # A backfill can outlive its connection (DB restart, pooler
+            # recycling); each batch starts on a checked one.
+            with worker_task():
+                reset_photo_detection(batch)
+                Photo.objects.filter(id__in=batch).update(status=Photo.StatusChoices.PROCESSING)
+                ready += process_photos_for_faces(batch, detector=options['detector'])
+            self.stdout.write(f"  {min(start + batch_size, len(photo_ids))}/{len(photo_ids)}")
+
+        failed = len(photo_ids) - ready
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Ready: {ready}"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"✗ Failed: {failed}"))
@@ -0,0 +1,21 @@
+# backend/photos/management/commands/rebuild_feed.py
+
+from django.core.management.base import BaseCommand
+from photos.services import rebuild_feed_items
+
+class Command(BaseCommand):
+    help = 'Rebuild the FeedItem read model from photos, likes and comments (run once after migrating)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--photo',
+            type=int,
+            nargs='+',
+            dest='photo_ids',
+            help='Only rebuild the feed items of these photo ids',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding feed items...")
+        count = rebuild_feed_items(photo_ids=options['photo_ids'])
+        self.stdout.write(self.style.SUCCESS(f"✓ Wrote {count} feed items"))
@@ -0,0 +1,23 @@
+# backend/photos/management/commands/reconcile_feed_counters.py
+
+from django.core.management.base import BaseCommand
+from photos.services import reconcile_feed_counters
+
+class Command(BaseCommand):
+    help = 'Recount feed like/comment counters from the Like and Comment tables (run periodically with write-behind counters)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=60,
+            help='Skip photos liked or commented on more recently than this (their deltas may still be buffered)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling feed counters...")
+        corrected = reconcile_feed_counters(settle_seconds=options['settle_seconds'])
+        if corrected:
+            self.stdout.write(self.style.WARNING(f"⚠ Corrected {corrected} feed items"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✓ All counters match"))
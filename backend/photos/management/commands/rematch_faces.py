@@ -0,0 +1,75 @@
+# backend/photos/management/commands/rematch_faces.py
+
+from django.core.management.base import BaseCommand
+from photos.models import DetectedFace
+from photos.services import rematch_faces, FACE_MATCH_TOLERANCE
+from photos.embedding_store import get_embedding_store
+
+class Command(BaseCommand):
+    help = 'Re-run face matching for all photos from stored encodings (no re-detection)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=FACE_MATCH_TOLERANCE,
+            help=f'Maximum face distance that counts as a match (default {FACE_MATCH_TOLERANCE})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20000,
+            help='Number of faces to match per vectorized batch',
+        )
+        parser.add_argument(
+            '--rebuild-store',
+            action='store_true',
+            help='Rebuild the memory-mapped embedding store from the database first',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many faces would change',
+        )
+        parser.add_argument(
+            '--no-regenerate',
+            action='store_true',
+            help='Do not regenerate public images for affected photos',
+        )
+
+    def handle(self, *args, **options):
+        missing = DetectedFace.objects.filter(encoding__isnull=True).count()
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(f"⚠ {missing} faces have no stored encoding and will be skipped")
+            )
+
+        store = get_embedding_store()
+        if options['rebuild_store']:
+            self.stdout.write("Rebuilding embedding store from the database...")
+            count = store.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"✓ Wrote {count} encodings to {store.directory}"))
+
+        self.stdout.write(f"Rematching stored faces (tolerance={options['tolerance']})...")
+
+        stats = rematch_faces(
+            tolerance=options['tolerance'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            regenerate=not options['no_regenerate'],
+        )
+
+        if stats['store_rebuilt']:
+            self.stdout.write(
+                self.style.WARNING("⚠ The embedding store was missing faces from the database and was rebuilt")
+            )
+
+        prefix = "[DRY RUN] " if options['dry_run'] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n{prefix}Completed rematching {stats['scanned']} faces:\n"
+                f"  ✓ Changed matches: {stats['changed']}\n"
+                f"  ✓ New consent requests: {stats['consent_requests']}\n"
+                f"  ✓ Photos regenerated: {stats['photos_regenerated']}"
+            )
+        )
@@ -0,0 +1,35 @@
+# backend/photos/management/commands/render_pending_photos.py
+
+from django.core.management.base import BaseCommand
+from core.db import worker_task
+from photos.models import Photo
+from photos.services import render_pending_photos
+
+class Command(BaseCommand):
+    help = 'Re-render public images left pending by bulk consent changes (run periodically, e.g. every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Photos rendered per batch',
+        )
+
+    def handle(self, *args, **options):
+        photo_ids = list(Photo.objects.filter(render_pending=True).order_by('id').values_list('id', flat=True))
+        if not photo_ids:
+            self.stdout.write(self.style.SUCCESS("✓ Nothing to render"))
+            return
+
+        self.stdout.write(f"Rendering {len(photo_ids)} photos...")
+        rendered = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(photo_ids), batch_size):
+            with worker_task():
+                rendered += render_pending_photos(photo_ids=photo_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Rendered: {rendered}"))
+        failed = len(photo_ids) - rendered
+        if failed:
+            self.stdout.write(self.style.WARNING(f"✗ Failed (still pending): {failed}"))
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0003_detectedface'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectedface',
+            name='detector_version',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='detectedface',
+            name='encoding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectedface',
+            name='landmarks_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import photos.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0004_detectedface_encoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to=photos.models.content_blob_upload_to)),
+                ('size', models.PositiveBigIntegerField()),
+                ('detector_version', models.CharField(blank=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('detection_source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='photos.photo')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='content_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='photos', to='photos.contentblob'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+def mark_existing_photos_ready(apps, schema_editor):
+    # Photos processed before this field existed already have a public image.
+    Photo = apps.get_model('photos', 'Photo')
+    Photo.objects.exclude(public_image__in=['', None]).update(status='READY')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0006_contentblob_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('PROCESSING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PROCESSING', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_photos_ready, migrations.RunPython.noop),
+    ]
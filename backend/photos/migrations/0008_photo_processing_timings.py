@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0007_photo_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='processing_timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+def fill_consent_counters(apps, schema_editor):
+    ConsentRequest = apps.get_model('photos', 'ConsentRequest')
+    ConsentCounter = apps.get_model('photos', 'ConsentCounter')
+    rows = ConsentRequest.objects.values('requested_user_id').annotate(
+        pending=Count('id', filter=Q(status='PENDING')),
+        approved=Count('id', filter=Q(status='APPROVED')),
+        denied=Count('id', filter=Q(status='DENIED')),
+    )
+    ConsentCounter.objects.bulk_create(
+        [
+            ConsentCounter(
+                user_id=row['requested_user_id'],
+                pending=row['pending'],
+                approved=row['approved'],
+                denied=row['denied'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_face_enrolment'),
+        ('photos', '0008_photo_processing_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsentCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='consent_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('denied', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='consentrequest',
+            index=models.Index(fields=['requested_user', 'status', '-id'], name='consent_inbox_idx'),
+        ),
+        migrations.RunPython(fill_consent_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_own_timelines(apps, schema_editor):
+    # Nobody follows anyone yet, so each timeline is just the user's own photos.
+    Photo = apps.get_model('photos', 'Photo')
+    TimelineEntry = apps.get_model('photos', 'TimelineEntry')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=uploader_id, photo_id=photo_id, uploader_id=uploader_id)
+            for photo_id, uploader_id in Photo.objects.values_list('id', 'uploader_id').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('photos', '0010_feed_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['uploader', '-photo'], name='feed_uploader_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='photo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='photos.photo'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='uploader',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'uploader'], name='timeline_user_uploader_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'photo'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_own_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-19 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='render_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(condition=models.Q(('render_pending', True)), fields=['id'], name='photo_render_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.13 on 2026-10-19 13:10
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+LATEST_COMMENTS = 2
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+def fill_feed_items(apps, schema_editor):
+    # Feeds and timelines only read FeedItem: create the missing items, the
+    # same way photos.services.rebuild_feed_items does.
+    Photo = apps.get_model('photos', 'Photo')
+    FeedItem = apps.get_model('photos', 'FeedItem')
+    Like = apps.get_model('interactions', 'Like')
+    Comment = apps.get_model('interactions', 'Comment')
+
+    photos = (
+        Photo.objects.exclude(status='FAILED').filter(feed_item__isnull=True)
+        .select_related('uploader').order_by('id')
+    )
+    last_id = 0
+    while True:
+        batch = list(photos.filter(id__gt=last_id)[:500])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        ids = [photo.id for photo in batch]
+        like_counts = dict(
+            Like.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        comment_counts = dict(
+            Comment.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        latest = defaultdict(list)
+        rows = (
+            Comment.objects.filter(photo_id__in=ids)
+            .annotate(rank=Window(RowNumber(), partition_by=[F('photo_id')], order_by=F('id').desc()))
+            .filter(rank__lte=LATEST_COMMENTS)
+            .values('id', 'photo_id', 'user_id', 'user__username', 'text', 'created_at')
+            .order_by('photo_id', 'id')
+        )
+        for row in rows:
+            latest[row['photo_id']].append({
+                'id': row['id'],
+                'user': {'id': row['user_id'], 'username': row['user__username']},
+                'text': row['text'],
+                'created_at': row['created_at'].isoformat(),
+            })
+        FeedItem.objects.bulk_create([
+            FeedItem(
+                photo_id=photo.id,
+                uploader_id=photo.uploader_id,
+                payload={
+                    'id': photo.id,
+                    'uploader': {
+                        'id': photo.uploader.id,
+                        'username': photo.uploader.username,
+                        'profile_pic': _file_url(photo.uploader.profile_pic),
+                    },
+                    'public_image': _file_url(photo.public_image) if photo.status == 'READY' else None,
+                    'caption': photo.caption,
+                    'status': photo.status,
+                    'created_at': photo.created_at.isoformat(),
+                },
+                like_count=like_counts.get(photo.id, 0),
+                comment_count=comment_counts.get(photo.id, 0),
+                latest_comments=latest[photo.id],
+            )
+            for photo in batch
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0012_photo_render_pending'),
+        ('interactions', '0004_comment_photo_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_items, migrations.RunPython.noop),
+    ]
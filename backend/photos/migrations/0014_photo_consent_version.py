@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0013_fill_feed_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='consent_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
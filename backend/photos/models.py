@@ -2,11 +2,51 @@
 from django.conf import settings
 from django.db import models
 
+def content_blob_upload_to(instance, filename):
+    """Store blobs by hash, fanned out over two directory levels."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'
+    digest = instance.sha256
+    return f"photos/blobs/{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+class ContentBlob(models.Model):
+    """
+    The bytes of an uploaded original, stored once per unique content hash.
+    Reposts of the same image share one file and one detection result.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=content_blob_upload_to)
+    size = models.PositiveBigIntegerField()
+    # Pixel dimensions, read from the header when the upload was validated.
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    # The photo whose DetectedFace rows hold the detection result for these
+    # bytes. If that photo is deleted, the next upload simply re-detects.
+    detection_source = models.ForeignKey(
+        'Photo',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    detector_version = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.size} bytes)"
+
+
 class Photo(models.Model):
     """
     Replaces the old 'post' model.
     This model now supports a non-destructive image workflow.
     """
+    class StatusChoices(models.TextChoices):
+        PROCESSING = 'PROCESSING', 'Processing'
+        READY = 'READY', 'Ready'
+        FAILED = 'FAILED', 'Failed'
+
     uploader = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE,
@@ -14,9 +54,39 @@ class Photo(models.Model):
     )
     original_image = models.ImageField(upload_to='photos/originals/%Y/%m/%d/')
     public_image = models.ImageField(upload_to='photos/public/%Y/%m/%d/', null=True, blank=True)
+    # The deduplicated bytes behind original_image. Null for photos uploaded
+    # before deduplication existed.
+    content_blob = models.ForeignKey(
+        ContentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='photos'
+    )
     caption = models.CharField(max_length=255, blank=True)
+    # public_image is only written by the renderer, once faces are masked.
+    # Until then the photo is PROCESSING and the API serves no image for it.
+    status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PROCESSING)
+    # Seconds spent in each processing stage for this photo, e.g.
+    # {"gallery_load": 0.012, "detection": 0.84, ..., "total": 1.2}
+    processing_timings = models.JSONField(null=True, blank=True)
+    # Set when consent changes mean public_image must be re-rendered, in the
+    # same transaction as the change; cleared by the renderer. Renders that
+    # did not happen inline are done by `manage.py render_pending_photos`.
+    render_pending = models.BooleanField(default=False)
+    # Bumped with every render_pending mark. A render only clears the flag if
+    # this is unchanged since it started, so a change committed mid-render
+    # leaves the photo marked.
+    consent_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'], condition=models.Q(render_pending=True), name='photo_render_pending_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"Photo by {self.uploader.username} on {self.created_at.strftime('%Y-%m-%d')}"
 
@@ -40,10 +110,88 @@ class ConsentRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The consent inbox: one user's requests, optionally by status, newest first.
+            models.Index(fields=['requested_user', 'status', '-id'], name='consent_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"Request for {self.requested_user.username} on photo {self.photo.id} is {self.status}"
 
 
+class ConsentCounter(models.Model):
+    """
+    Denormalized count of a user's consent requests per status, so inbox
+    badges are one primary-key read instead of counting rows. Kept in step
+    by `services.adjust_consent_counters`; `services.recount_consent_counters`
+    rebuilds it from the requests.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='consent_counter'
+    )
+    pending = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    denied = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.pending} pending, {self.approved} approved, {self.denied} denied"
+
+
+class FeedItem(models.Model):
+    """
+    Read model for the feed: one row per photo that can be shown, holding the
+    pre-shaped JSON the feed returns, so a feed page is one range scan over
+    this table with no joins. Only the photos services write it (see
+    `services.sync_feed_item` and friends); `manage.py rebuild_feed` rebuilds it.
+    """
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, primary_key=True, related_name='feed_item')
+    uploader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    # id, uploader summary, public image URL, caption, status and created_at.
+    # URLs are storage-relative; the view makes them absolute.
+    payload = models.JSONField()
+    like_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    # The newest few comments, oldest first: [{id, user: {id, username}, text, created_at}]
+    latest_comments = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            # Timelines read the newest photos of accounts too big to fan out.
+            models.Index(fields=['uploader', '-photo'], name='feed_uploader_idx'),
+        ]
+
+    def __str__(self):
+        return f"Feed item for photo {self.photo_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A photo in a user's home timeline, written when the photo is uploaded
+    (fan-out on write, see `services.fan_out_photo`). Timelines are read
+    newest first through the (user, photo) unique index.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='+')
+    # Uploader, copied so an unfollow can drop entries without a join.
+    uploader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'photo'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'uploader'], name='timeline_user_uploader_idx'),
+        ]
+
+    def __str__(self):
+        return f"Photo {self.photo_id} in {self.user_id}'s timeline"
+
+
 # --- NEW MODEL ---
 # This model stores the location of EVERY face detected in a photo,
 # not just those requiring consent. This allows us to avoid re-running face detection.
@@ -66,6 +214,23 @@ class DetectedFace(models.Model):
         related_name='faces_detected_in_photos'
     )
 
+    # The 128-d face descriptor, stored as raw little-endian float32 bytes
+    # (512 bytes per face). Keeping it lets us re-run matching with a new
+    # tolerance or gallery without ever re-running detection on the JPEG.
+    encoding = models.BinaryField(null=True, blank=True, editable=False)
+    # Short fingerprint of the landmarks the descriptor was computed from,
+    # and which detector/encoder produced it, so stale rows can be found.
+    landmarks_hash = models.CharField(max_length=64, blank=True)
+    detector_version = models.CharField(max_length=32, blank=True)
+
+    @property
+    def encoding_array(self):
+        """Return the stored encoding as a float32 numpy array, or None."""
+        if not self.encoding:
+            return None
+        import numpy as np
+        return np.frombuffer(bytes(self.encoding), dtype='<f4')
+
     def __str__(self):
         user_str = self.matched_user.username if self.matched_user else "Unknown"
         return f"Face ({user_str}) in Photo {self.photo.id} at {self.bounding_box}"
\ No newline at end of file
@@ -0,0 +1,126 @@
+# backend/photos/recognition.py
+#
+# The only place that touches face_recognition / dlib.
+#
+# Importing face_recognition loads dlib and deserializes the HOG detector,
+# shape predictor and ResNet encoder at import time (hundreds of MB), so it
+# is deferred until the first call that actually needs a model. Web workers
+# that only serve the API, management commands and `migrate` never load it.
+
+import logging
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger('photos')
+
+_api = None
+_api_lock = threading.Lock()
+
+
+def get_api():
+    """Return the `face_recognition.api` module, importing it on first use."""
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                start = time.perf_counter()
+                import face_recognition.api as api
+                _api = api
+                logger.info(f"[Recognition] Loaded face_recognition models in {time.perf_counter() - start:.2f}s.")
+    return _api
+
+
+def is_loaded():
+    """True once the models have been loaded in this process."""
+    return _api is not None
+
+
+def load_image_file(file, mode='RGB'):
+    """
+    Read an image into a numpy array.
+
+    Same result as `face_recognition.load_image_file`, but only needs Pillow,
+    so reading an image never pulls in the models.
+    """
+    image = Image.open(file)
+    if mode:
+        image = image.convert(mode)
+    return np.array(image)
+
+
+def face_locations(image, number_of_times_to_upsample=1, model='hog'):
+    return get_api().face_locations(image, number_of_times_to_upsample, model)
+
+
+def detect_hog(image, upsample=1):
+    """HOG + linear SVM detection. Returns (css locations, SVM scores)."""
+    api = get_api()
+    rects, scores, _ = api.face_detector.run(image, upsample, 0.0)
+    locations = [api._trim_css_to_bounds(api._rect_to_css(rect), image.shape) for rect in rects]
+    return locations, [float(score) for score in scores]
+
+
+def detect_cnn(image, upsample=1):
+    """dlib's MMOD CNN detector (slow on CPU, better on small/turned faces)."""
+    api = get_api()
+    detections = api.cnn_face_detector(image, upsample)
+    locations = [api._trim_css_to_bounds(api._rect_to_css(d.rect), image.shape) for d in detections]
+    return locations, [float(d.confidence) for d in detections]
+
+
+def face_encodings(image, known_face_locations=None, num_jitters=1, model='small'):
+    return get_api().face_encodings(image, known_face_locations, num_jitters, model)
+
+
+def raw_face_landmarks(image, face_locations, model='small'):
+    return get_api()._raw_face_landmarks(image, face_locations, model=model)
+
+
+def compute_face_descriptors(images, landmarks_per_image, num_jitters=1):
+    """
+    128-d descriptors for every face in every image, in one dlib call.
+
+    dlib batches all face chips of the batch through the ResNet together,
+    which amortizes the per-call overhead over crowd photos and multi-photo
+    batches. Returns one list of numpy arrays per image.
+    """
+    import dlib
+
+    api = get_api()
+    batch_images = []
+    batch_faces = []
+    for image, landmarks in zip(images, landmarks_per_image):
+        if len(landmarks) == 0:
+            continue
+        faces = dlib.full_object_detections()
+        faces.extend(landmarks)
+        batch_images.append(image)
+        batch_faces.append(faces)
+
+    batch_descriptors = iter(
+        api.face_encoder.compute_face_descriptor(batch_images, batch_faces, num_jitters) if batch_images else []
+    )
+    return [
+        [np.array(descriptor) for descriptor in next(batch_descriptors)] if len(landmarks) else []
+        for landmarks in landmarks_per_image
+    ]
+
+
+def warm_up(width=160, height=160):
+    """
+    Load the models and run each of them once on a blank image.
+
+    The first real photo otherwise pays for model deserialization plus dlib's
+    first-call buffer allocation. The whole image is fed to the shape predictor
+    and encoder as a fake face box, since detection finds nothing on a blank image.
+    """
+    start = time.perf_counter()
+    get_api()
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    face_locations(image)
+    landmarks = raw_face_landmarks(image, [(0, width - 1, height - 1, 0)])
+    compute_face_descriptors([image], [landmarks])
+    logger.info(f"[Recognition] Warm-up finished in {time.perf_counter() - start:.2f}s.")
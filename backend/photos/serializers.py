@@ -58,10 +58,9 @@ class ConsentRequestSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'photo', 'requested_user', 'bounding_box', 'created_at', 'updated_at']
 from rest_framework import serializers
-from .models import Photo, ConsentRequest
+from .models import Photo, ConsentRequest, FeedItem
 from users.models import CustomUser
-# Import the new serializers from the interactions app
-from interactions.serializers import LikeSerializer, CommentSerializer
+from .uploads import decode_image_upload
 
 # --- NESTED SERIALIZERS for Consent Requests ---
 class UploaderInfoSerializer(serializers.ModelSerializer):
@@ -81,25 +80,61 @@ class NestedPhotoSerializer(serializers.ModelSerializer):
 class PhotoSerializer(serializers.ModelSerializer):
     """
     Serializer for the main Photo model.
-    This is the key change: we are adding nested serializers for likes and comments.
+    Likes and comments are summarized from the photo's FeedItem (counts and
+    the newest comments); the full list is at /api/photos/{id}/comments/.
+    Select `feed_item` with the photos to avoid a query per photo.
     """
     # Instead of a simple username, we'll show the full uploader object
     uploader = UploaderInfoSerializer(read_only=True)
-    # These lines will include a list of all like/comment objects for each photo
-    likes = LikeSerializer(many=True, read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    like_count = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
+    # Needs the ids of the photos the viewer liked in context['liked_photo_ids'].
+    liked_by_me = serializers.SerializerMethodField()
+    # A plain FileField: `decode_image_upload` does the image validation, so the
+    # file is only opened and decoded once per upload.
+    original_image = serializers.FileField(write_only=True, required=True)
 
     class Meta:
         model = Photo
-        # Add 'likes' and 'comments' to the fields list
         fields = [
-            'id', 'uploader', 'public_image', 'original_image',
-            'caption', 'created_at', 'likes', 'comments'
+            'id', 'uploader', 'public_image', 'original_image', 'caption', 'status', 'created_at',
+            'like_count', 'comment_count', 'latest_comments', 'liked_by_me',
         ]
-        read_only_fields = ['id', 'created_at', 'public_image', 'likes', 'comments']
-        extra_kwargs = {
-            'original_image': {'write_only': True, 'required': True}
-        }
+        read_only_fields = ['id', 'created_at', 'public_image', 'status']
+
+    def validate_original_image(self, value):
+        """Enforce size/pixel limits and decode the image for face detection."""
+        return decode_image_upload(value)
+
+    def _feed_item(self, instance):
+        try:
+            return instance.feed_item
+        except FeedItem.DoesNotExist:
+            return None
+
+    def get_like_count(self, instance):
+        item = self._feed_item(instance)
+        return item.like_count if item else 0
+
+    def get_comment_count(self, instance):
+        item = self._feed_item(instance)
+        return item.comment_count if item else 0
+
+    def get_latest_comments(self, instance):
+        item = self._feed_item(instance)
+        return item.latest_comments if item else []
+
+    def get_liked_by_me(self, instance):
+        return instance.id in self.context.get('liked_photo_ids', ())
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Until the masked render exists there is nothing safe to show;
+        # clients render a placeholder for non-READY photos.
+        if instance.status != Photo.StatusChoices.READY:
+            data['public_image'] = None
+        return data
 
 
 class ConsentRequestSerializer(serializers.ModelSerializer):
@@ -119,4 +154,20 @@ class ConsentRequestSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'photo', 'requested_user', 'bounding_box', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'photo', 'requested_user', 'bounding_box', 'created_at', 'updated_at']
+
+class ConsentBulkActionSerializer(serializers.Serializer):
+    """
+    Body of POST /api/consent-requests/bulk/: approve or deny the listed
+    requests, or every pending one with `all_pending`.
+    """
+    status = serializers.ChoiceField(
+        choices=[ConsentRequest.StatusChoices.APPROVED, ConsentRequest.StatusChoices.DENIED]
+    )
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=5000)
+    all_pending = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if bool(attrs.get('ids')) == attrs['all_pending']:
+            raise serializers.ValidationError("Send either a non-empty 'ids' list or 'all_pending': true.")
+        return attrs
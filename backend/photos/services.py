@@ -1,112 +1,492 @@
 # backend/photos/services.py (FINAL OPTIMIZED VERSION)
 
-import face_recognition
 import numpy as np
+from asgiref.sync import sync_to_async
 from PIL import Image, ImageDraw
 from django.core.files import File
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+import hashlib
 import logging
 import time
+from collections import defaultdict
+from datetime import timedelta
+from io import BytesIO
 
 from users.models import CustomUser
-from users.services import get_face_encodings_dict
+from users.models import FaceEnrolment, Follow
+from interactions.models import Like, Comment
+from users.services import get_face_encodings_dict, get_enrolment_sets, add_face_enrolment, ENROLMENT_MAX_SIZE
 # Import the new DetectedFace model
-from .models import Photo, ConsentRequest, DetectedFace
+from .models import Photo, ConsentRequest, ConsentCounter, DetectedFace, ContentBlob, FeedItem, TimelineEntry
+from .embedding_store import get_embedding_store
+from . import recognition
+from . import counters
+from .detectors import get_detector
+from core.metrics import span, PHOTO_STAGE_SECONDS
+from core import events
 
 logger = logging.getLogger('photos')
 
+# Faces closer than this (euclidean distance) to a known encoding are a match.
+FACE_MATCH_TOLERANCE = 0.6
 
-def _regenerate_public_image(photo: Photo):
+# Centroid distances within this margin of the tolerance are borderline and
+# are re-checked against the user's full enrolment set.
+FACE_MATCH_BORDERLINE_MARGIN = 0.08
+
+# Bump this whenever the landmark model or encoder changes, so rows produced
+# by an older pipeline can be found and re-encoded. The detector's own id is
+# prefixed (see pipeline_version), e.g. 'hog-1/5pt/resnet-v1'.
+ENCODER_VERSION = '5pt/resnet-v1'
+
+# Comments carried in each feed item; the rest are fetched on demand.
+FEED_LATEST_COMMENTS = 2
+
+
+def pipeline_version(detector_id: str) -> str:
+    """The DetectedFace.detector_version for faces found by `detector_id`."""
+    return f"{detector_id}/{ENCODER_VERSION}"
+
+
+def encoding_to_bytes(encoding) -> bytes:
+    """Pack a 128-d encoding into the compact float32 form stored on DetectedFace."""
+    return np.asarray(encoding, dtype='<f4').tobytes()
+
+
+def _encode_faces(image, face_locations):
+    """
+    Compute the 128-d descriptor for every face location in `image`.
+
+    This does the same work as `face_recognition.face_encodings`, but keeps the
+    landmarks it computes along the way so we can fingerprint them.
+
+    Returns:
+        tuple: (list of numpy encodings, list of landmark hashes)
+    """
+    return _encode_faces_batch([image], [face_locations])[0]
+
+
+def _encode_faces_batch(images, face_locations_per_image):
+    """
+    `_encode_faces` for many images at once: landmarks are found per image,
+    then all descriptors are computed in a single batched encoder call.
+
+    Returns:
+        list: one (encodings, landmark hashes) tuple per image
+    """
+    landmarks_per_image = [
+        recognition.raw_face_landmarks(image, face_locations, model='small')
+        for image, face_locations in zip(images, face_locations_per_image)
+    ]
+    encodings_per_image = recognition.compute_face_descriptors(images, landmarks_per_image)
+
+    results = []
+    for landmarks_list, encodings in zip(landmarks_per_image, encodings_per_image):
+        landmarks_hashes = []
+        for landmarks in landmarks_list:
+            points = np.array([(p.x, p.y) for p in landmarks.parts()], dtype='<i4')
+            landmarks_hashes.append(hashlib.sha1(points.tobytes()).hexdigest())
+        results.append((encodings, landmarks_hashes))
+    return results
+
+
+def match_encodings(unknown_encodings, known_encodings_array, tolerance=FACE_MATCH_TOLERANCE,
+                    load_enrolments=None, margin=FACE_MATCH_BORDERLINE_MARGIN):
+    """
+    Vectorized nearest-neighbour matching of many faces against the gallery.
+
+    The gallery holds one centroid per user. If `load_enrolments` is given,
+    faces whose nearest centroid is within `margin` of the tolerance (either
+    side) are decided instead by their closest member of that user's full
+    enrolment set (max similarity). Only those few sets are loaded.
+
+    Args:
+        unknown_encodings: (N, 128) array of face encodings to identify
+        known_encodings_array: (G, 128) array of known user encodings
+        tolerance: maximum distance that still counts as a match
+        load_enrolments: optional callable taking gallery indices and
+            returning {gallery index: (k, 128) array}
+        margin: width of the borderline band around the tolerance
+
+    Returns:
+        numpy array of N gallery indices, with -1 where nothing matched
+    """
+    unknown = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, 128)
+    known = np.asarray(known_encodings_array, dtype=np.float32).reshape(-1, 128)
+    if len(unknown) == 0 or len(known) == 0:
+        return np.full(len(unknown), -1, dtype=np.int64)
+
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2ab, computed as one matrix product.
+    sq_dist = (
+        np.einsum('ij,ij->i', unknown, unknown)[:, None]
+        + np.einsum('ij,ij->i', known, known)[None, :]
+        - 2.0 * unknown @ known.T
+    )
+    best = np.argmin(sq_dist, axis=1)
+    best_dist = np.sqrt(np.maximum(sq_dist[np.arange(len(unknown)), best], 0.0))
+    matches = np.where(best_dist <= tolerance, best, -1)
+
+    if load_enrolments is not None:
+        borderline = np.flatnonzero(np.abs(best_dist - tolerance) <= margin)
+        if len(borderline):
+            enrolment_sets = load_enrolments(np.unique(best[borderline]).tolist())
+            for face_index in borderline:
+                samples = enrolment_sets.get(int(best[face_index]))
+                # A single-sample set is the centroid itself; keep the centroid decision.
+                if samples is None or len(samples) < 2:
+                    continue
+                closest = np.linalg.norm(samples - unknown[face_index], axis=1).min()
+                matches[face_index] = best[face_index] if closest <= tolerance else -1
+    return matches
+
+
+def get_candidate_user_ids(uploader_id):
+    """
+    The people most likely to appear in `uploader_id`'s photos: the uploader,
+    their followers and the people they follow, people who liked or commented
+    on their photos, people whose photos they liked or commented on, people
+    already recognised in their uploads, and uploaders of photos they were
+    recognised in. One UNION query.
+
+    Returns:
+        set: user ids
+    """
+    related = (
+        Follow.objects.filter(followee_id=uploader_id).values_list('follower_id')
+        .union(
+            Follow.objects.filter(follower_id=uploader_id).values_list('followee_id'),
+            Like.objects.filter(photo__uploader_id=uploader_id).values_list('user_id'),
+            Comment.objects.filter(photo__uploader_id=uploader_id).values_list('user_id'),
+            Like.objects.filter(user_id=uploader_id).values_list('photo__uploader_id'),
+            Comment.objects.filter(user_id=uploader_id).values_list('photo__uploader_id'),
+            DetectedFace.objects.filter(photo__uploader_id=uploader_id, matched_user__isnull=False)
+            .values_list('matched_user_id'),
+            DetectedFace.objects.filter(matched_user_id=uploader_id).values_list('photo__uploader_id'),
+        )
+    )
+    return {uploader_id} | {user_id for (user_id,) in related}
+
+
+def _prepare_gallery(gallery):
+    """
+    Index a loaded (encodings, users) gallery for repeated `_split_gallery`
+    calls: (encodings as a (G, 128) array, users as an object array,
+    their ids as an int array).
+    """
+    encodings, users = gallery
+    user_array = np.empty(len(users), dtype=object)
+    user_array[:] = users
+    user_ids = np.fromiter((user.id for user in users), dtype=np.int64, count=len(users))
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, 128), user_array, user_ids
+
+
+def _split_gallery(gallery, candidate_ids):
+    """Split a `_prepare_gallery` gallery into candidates and everyone else."""
+    encodings, users, user_ids = gallery
+    scoped = np.isin(user_ids, np.fromiter(candidate_ids, dtype=np.int64, count=len(candidate_ids)))
+    return (encodings[scoped], users[scoped]), (encodings[~scoped], users[~scoped])
+
+
+def match_faces_scoped(encodings, uploader_id, timings=None, tolerance=FACE_MATCH_TOLERANCE, gallery=None,
+                       candidate_ids=None):
+    """
+    Identify faces in a photo uploaded by `uploader_id`.
+
+    Faces are first matched against the uploader's candidate gallery
+    (`get_candidate_user_ids`), which is tiny compared to the whole user
+    base and has no look-alike strangers in it. Only faces left unmatched
+    are then matched against everyone else, unless
+    settings.FACE_MATCH_GLOBAL_FALLBACK is False.
+
+    A caller matching for many uploaders (see `rematch_faces`) may pass the
+    full gallery, loaded once and indexed by `_prepare_gallery`, and the
+    uploader's `candidate_ids`; both galleries are then taken from it and
+    nothing is queried.
+
+    Returns:
+        list: the matched CustomUser (or None) for each encoding
+    """
+    matched_users = [None] * len(encodings)
+    if len(encodings) == 0:
+        return matched_users
+
+    with span('gallery_load', timings) as gallery_span:
+        if candidate_ids is None:
+            candidate_ids = get_candidate_user_ids(uploader_id)
+        if gallery is not None:
+            (scoped_encodings, scoped_users), (global_encodings, global_users) = _split_gallery(gallery, candidate_ids)
+        else:
+            scoped_encodings, scoped_users = get_face_encodings_dict(user_ids=candidate_ids)
+    with span('matching', timings):
+        match_indices = match_encodings(
+            encodings, scoped_encodings, tolerance, load_enrolments=_enrolment_loader(scoped_users)
+        )
+    for face_index, match_index in enumerate(match_indices):
+        if match_index >= 0:
+            matched_users[face_index] = scoped_users[match_index]
+
+    unmatched = [i for i, user in enumerate(matched_users) if user is None]
+    logger.info(f"[Matching] Uploader {uploader_id}: {len(encodings) - len(unmatched)}/{len(encodings)} faces matched among {len(scoped_users)} candidates (loaded in {gallery_span.elapsed:.3f}s).")
+    if not unmatched or not getattr(settings, 'FACE_MATCH_GLOBAL_FALLBACK', True):
+        return matched_users
+
+    with span('gallery_load_global', timings) as global_span:
+        if gallery is None:
+            global_encodings, global_users = get_face_encodings_dict(exclude_user_ids=candidate_ids)
+    with span('matching_global', timings):
+        match_indices = match_encodings(
+            [encodings[i] for i in unmatched], global_encodings, tolerance,
+            load_enrolments=_enrolment_loader(global_users),
+        )
+    for face_index, match_index in zip(unmatched, match_indices):
+        if match_index >= 0:
+            matched_users[face_index] = global_users[match_index]
+    logger.info(f"[Matching] Uploader {uploader_id}: Fell back to {len(global_users)} global encodings for {len(unmatched)} faces in {global_span.elapsed:.3f}s.")
+    return matched_users
+
+
+def _enrolment_loader(known_users):
+    """A `load_enrolments` callable for `match_encodings` over `known_users`."""
+    def load(gallery_indices):
+        sets = get_enrolment_sets([known_users[i].id for i in gallery_indices])
+        return {i: sets.get(known_users[i].id) for i in gallery_indices}
+    return load
+
+
+def store_content_blob(upload, digest=None):
+    """
+    Hash an uploaded file and store its bytes once per unique content.
+
+    If identical bytes were uploaded before, the existing `ContentBlob` is
+    returned and nothing is written to storage.
+
+    Args:
+        upload: a Django UploadedFile
+        digest: SHA-256 hex digest computed while the upload streamed in
+            (see `HashingUploadHandler`); computed here if not given
+
+    Returns:
+        tuple: (ContentBlob, created)
+    """
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in upload.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+    existing = ContentBlob.objects.filter(sha256=digest).first()
+    if existing:
+        logger.info(f"[Dedup] Upload matches existing blob {digest[:12]}; reusing stored bytes.")
+        return existing, False
+
+    upload.seek(0)
+    blob = ContentBlob(
+        sha256=digest,
+        size=upload.size,
+        width=getattr(upload, 'image_width', None),
+        height=getattr(upload, 'image_height', None),
+    )
+    blob.file.save(upload.name, upload, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # Someone stored the same bytes concurrently; keep theirs, drop ours.
+        blob.file.delete(save=False)
+        return ContentBlob.objects.get(sha256=digest), False
+    return blob, True
+
+
+def _reuse_blob_detection(photo: Photo, detector):
+    """
+    Return the detection result of an earlier photo with identical bytes,
+    or None if detection has to run. A result is only reused if `detector`
+    could have produced it, so a backfill with a better detector re-detects.
+
+    Returns:
+        tuple or None: (face locations, face encodings, landmark hashes, detector_version)
+    """
+    blob = photo.content_blob
+    if blob is None or blob.detection_source_id is None:
+        return None
+    if blob.detector_version not in {pipeline_version(detector_id) for detector_id in detector.ids}:
+        return None
+
+    source_faces = list(
+        DetectedFace.objects.filter(photo_id=blob.detection_source_id)
+        .order_by('id')
+        .values_list('bounding_box', 'encoding', 'landmarks_hash')
+    )
+    if any(encoding is None for _, encoding, _ in source_faces):
+        return None
+
+    face_locations = []
+    face_encodings = []
+    landmarks_hashes = []
+    for bounding_box_str, encoding, landmarks_hash in source_faces:
+        left, top, right, bottom = [int(c) for c in bounding_box_str.split(',')]
+        face_locations.append((top, right, bottom, left))
+        face_encodings.append(np.frombuffer(bytes(encoding), dtype='<f4'))
+        landmarks_hashes.append(landmarks_hash)
+    return face_locations, face_encodings, landmarks_hashes, blob.detector_version
+
+
+def _mark_blob_detected(photo: Photo, detector_version: str):
+    """Record `photo` as holding the detection result for its content blob."""
+    if photo.content_blob_id is None:
+        return
+    ContentBlob.objects.filter(id=photo.content_blob_id).update(
+        detection_source=photo,
+        detector_version=detector_version,
+    )
+
+
+def _draw_masks(original, bounding_boxes, photo_id=None):
+    """
+    Return an RGB copy of `original` with a black box over each face.
+
+    Args:
+        original: PIL image of the pristine original
+        bounding_boxes: list of 'left,top,right,bottom' strings to mask
+    """
+    public_image = original.convert('RGB')
+    draw = ImageDraw.Draw(public_image)
+    for bounding_box_str in bounding_boxes:
+        try:
+            coords = [int(c) for c in bounding_box_str.split(',')]
+            left, top, right, bottom = coords
+            draw.rectangle(((left, top), (right, bottom)), outline=(0, 0, 0), fill=(0, 0, 0))
+        except Exception as e:
+            logger.error(f"[Regenerate] Photo {photo_id}: Error parsing bounding box '{bounding_box_str}': {e}")
+    del draw
+    return public_image
+
+
+def _encode_jpeg(image):
+    """Encode a rendered public image as JPEG into an in-memory buffer."""
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+def _regenerate_public_image(photo: Photo, original=None, timings=None):
     """
     This is the "source of truth" function, now optimized to use the DetectedFace table
     instead of re-running face detection.
     This fixes any seam/offset/artifact issues from re-saving.
+
+    `original` may be an already-decoded PIL image of the original, to avoid
+    reading it back from storage. Stage durations are recorded as metrics and,
+    if `timings` is given, added to that dict.
+
+    Returns True if the public image was written.
     """
-    logger.info(f"[Regenerate] START: Regenerating public_image for photo {photo.id}.")
-    start_time = time.time()
+    logger.info("[Regenerate] START: Regenerating public_image for photo %s.", photo.id)
+    with span('regenerate', timings) as total_span:
+        try:
+            # Read before the consent state, so any change made after it is noticed at save time.
+            consent_version = Photo.objects.filter(pk=photo.pk).values_list('consent_version', flat=True).get()
 
-    try:
-        # 1. Load the pristine original image
-        original = Image.open(photo.original_image.path)
-        public_image = original.convert('RGB')
-        draw = ImageDraw.Draw(public_image)
-
-        # 2. Get all detected faces *from the database*
-        all_detected_faces = photo.detected_faces.all()
-        logger.debug(f"[Regenerate] Photo {photo.id}: Found {len(all_detected_faces)} stored faces in database.")
-
-        if not all_detected_faces:
-            logger.warning(f"[Regenerate] Photo {photo.id}: No detected faces found in DB. Image will be public.")
-            # No faces, so just save a copy of the original as the public image
-            # (This logic is same as step 6)
+            # 1. Load the pristine original image
+            if original is None:
+                original = Image.open(photo.original_image.path)
+
+            # 2. Get all detected faces *from the database*
+            all_detected_faces = photo.detected_faces.select_related('matched_user')
+            logger.debug("[Regenerate] Photo %s: Found %d stored faces in database.", photo.id, len(all_detected_faces))
+
+            if not all_detected_faces:
+                logger.info("[Regenerate] Photo %s: No detected faces found in DB. Image will be public.", photo.id)
+                # No faces, so the public image is just a re-encoded copy of the original
+                # (This logic is same as step 6)
         
-        # 3. Get all *approved* consent requests for this photo
-        approved_users_ids = list(
-            photo.consent_requests.filter(status='APPROVED').values_list('requested_user_id', flat=True)
-        )
-        logger.debug(f"[Regenerate] Photo {photo.id}: Found {len(approved_users_ids)} approved users.")
+            # 3. Get all *approved* consent requests for this photo
+            approved_users_ids = list(
+                photo.consent_requests.filter(status='APPROVED').values_list('requested_user_id', flat=True)
+            )
+            logger.debug("[Regenerate] Photo %s: Found %d approved users.", photo.id, len(approved_users_ids))
 
-        # 4. Loop through all stored faces and decide which to mask
-        faces_to_mask = []
-        for face in all_detected_faces:
-            unmask_face = False
+            # 4. Loop through all stored faces and decide which to mask
+            faces_to_mask = []
+            for face in all_detected_faces:
+                unmask_face = False
             
-            # 4a. Check if the face belongs to a matched user
-            if face.matched_user:
-                # 4a.i. Is it the uploader?
-                if face.matched_user_id == photo.uploader_id:
-                    unmask_face = True
-                    logger.debug(f"[Regenerate] Photo {photo.id}: Unmasking face at {face.bounding_box} (Uploader: {face.matched_user.username}).")
+                # 4a. Check if the face belongs to a matched user
+                if face.matched_user:
+                    # 4a.i. Is it the uploader?
+                    if face.matched_user_id == photo.uploader_id:
+                        unmask_face = True
+                        logger.debug("[Regenerate] Photo %s: Unmasking face at %s (Uploader: %s).", photo.id, face.bounding_box, face.matched_user)
                 
-                # 4a.ii. Is it a 'PUBLIC' user?
-                elif face.matched_user.face_sharing_mode == CustomUser.FaceSharingMode.PUBLIC:
-                    unmask_face = True
-                    logger.debug(f"[Regenerate] Photo {photo.id}: Unmasking face at {face.bounding_box} (PUBLIC mode: {face.matched_user.username}).")
+                    # 4a.ii. Is it a 'PUBLIC' user?
+                    elif face.matched_user.face_sharing_mode == CustomUser.FaceSharingMode.PUBLIC:
+                        unmask_face = True
+                        logger.debug("[Regenerate] Photo %s: Unmasking face at %s (PUBLIC mode: %s).", photo.id, face.bounding_box, face.matched_user)
                 
-                # 4a.iii. Is it an 'APPROVED' request?
-                elif face.matched_user_id in approved_users_ids:
-                    unmask_face = True
-                    logger.debug(f"[Regenerate] Photo {photo.id}: Unmasking face at {face.bounding_box} (APPROVED: {face.matched_user.username}).")
+                    # 4a.iii. Is it an 'APPROVED' request?
+                    elif face.matched_user_id in approved_users_ids:
+                        unmask_face = True
+                        logger.debug("[Regenerate] Photo %s: Unmasking face at %s (APPROVED: %s).", photo.id, face.bounding_box, face.matched_user)
             
-            # 4b. If no unmask rule matched, it must be masked
-            if not unmask_face:
-                faces_to_mask.append(face.bounding_box)
-                logger.debug(f"[Regenerate] Photo {photo.id}: Masking face at {face.bounding_box} (User: {face.matched_user or 'Unknown'}).")
-
-        logger.info(f"[Regenerate] Photo {photo.id}: Total={len(all_detected_faces)}, Unmasked={len(all_detected_faces) - len(faces_to_mask)}, Masked={len(faces_to_mask)}.")
-
-        # 5. Draw all necessary masks
-        for bounding_box_str in faces_to_mask:
-            try:
-                coords = [int(c) for c in bounding_box_str.split(',')]
-                left, top, right, bottom = coords
-                draw.rectangle(((left, top), (right, bottom)), outline=(0, 0, 0), fill=(0, 0, 0))
-            except Exception as e:
-                logger.error(f"[Regenerate] Photo {photo.id}: Error parsing bounding box '{bounding_box_str}': {e}")
-
-        del draw
-
-        # 6. Save the final image to the public_image field
-        from io import BytesIO
-        temp_thumb = BytesIO()
-        public_image.save(temp_thumb, format='JPEG', quality=90)
-        temp_thumb.seek(0)
-
-        photo.public_image.save(
-            f"public_{photo.id}.jpg",
-            File(temp_thumb),
-            save=True
-        )
-        temp_thumb.close()
+                # 4b. If no unmask rule matched, it must be masked
+                if not unmask_face:
+                    faces_to_mask.append(face.bounding_box)
+                    logger.debug("[Regenerate] Photo %s: Masking face at %s (User: %s).", photo.id, face.bounding_box, face.matched_user or 'Unknown')
 
-        total_time = time.time() - start_time
-        logger.info(f"[Regenerate] SUCCESS: Regenerated public_image for {photo.id} in {total_time:.3f}s.")
+            logger.info(
+                "[Regenerate] Photo %s: Total=%d, Unmasked=%d, Masked=%d.",
+                photo.id, len(all_detected_faces), len(all_detected_faces) - len(faces_to_mask), len(faces_to_mask),
+            )
 
-    except Exception as e:
-        logger.error(f"[Regenerate] FAILED: Error regenerating public_image for {photo.id}: {e}", exc_info=True)
+            # 5. Draw all necessary masks
+            with span('render', timings):
+                public_image = _draw_masks(original, faces_to_mask, photo_id=photo.id)
+
+            # 6. Save the final image to the public_image field. This is the only
+            # place public_image is ever written, and the storage writes it atomically.
+            with span('jpeg_encode', timings):
+                temp_thumb = _encode_jpeg(public_image)
+
+            with span('storage_write', timings):
+                previous_public_name = photo.public_image.name
+                photo.public_image.save(
+                    f"public_{photo.id}.jpg",
+                    File(temp_thumb),
+                    save=False
+                )
+                photo.status = Photo.StatusChoices.READY
+                photo.save(update_fields=['public_image', 'status'])
+                photo.render_pending = not Photo.objects.filter(
+                    pk=photo.pk, consent_version=consent_version
+                ).update(render_pending=False)
+                if photo.render_pending:
+                    logger.info("[Regenerate] Photo %s: Consent changed during the render; left marked for another.", photo.id)
+                sync_feed_item(photo)
+            temp_thumb.close()
+
+            # The previous render is superseded; don't leave it on disk.
+            if previous_public_name and previous_public_name != photo.public_image.name:
+                photo.public_image.storage.delete(previous_public_name)
+
+            written = True
+
+        except Exception as e:
+            logger.error("[Regenerate] FAILED: Error regenerating public_image for %s: %s", photo.id, e, exc_info=True)
+            written = False
 
+    if written:
+        logger.info("[Regenerate] SUCCESS: Regenerated public_image for %s in %.3fs.", photo.id, total_span.elapsed)
+    return written
 
-def process_photo_for_faces(photo_id: int):
+
+def process_photo_for_faces(photo_id: int, image=None, detector=None, detection=None):
     """
     Service function to perform face recognition on *newly uploaded* photos.
     This function now:
@@ -114,8 +494,15 @@ def process_photo_for_faces(photo_id: int):
     2. Populates the new `DetectedFace` table with ALL faces.
     3. Creates `ConsentRequest` objects for matched users who require it.
     4. Calls `_regenerate_public_image()` to build the initial masked version.
+
+    `image` is the RGB numpy array decoded at upload time, if the caller has
+    it; otherwise the original is loaded from storage. `detector` names a
+    backend from photos.detectors; defaults to settings.FACE_DETECTOR.
+    `detection` is a result already computed by `process_photos_for_faces`
+    (locations, encodings, landmark hashes, detector_version).
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
+    timings = {}
     logger.info(f"[PhotoProcessing] START: Processing NEW photo_id {photo_id}...")
     
     try:
@@ -126,84 +513,393 @@ def process_photo_for_faces(photo_id: int):
         return
 
     try:
-        # --- Step 1: Create the initial public image (as a pristine copy) ---
-        photo.public_image.save(
-            photo.original_image.name,
-            File(photo.original_image.file),
-            save=True
-        )
+        detector = get_detector(detector)
 
-        # --- Step 2: Load pre-computed user encodings ---
-        encoding_load_start = time.time()
-        known_encodings_array, known_users = get_face_encodings_dict()
-        encoding_load_time = time.time() - encoding_load_start
-        logger.info(f"[PhotoProcessing] Photo {photo.id}: Loaded {len(known_users)} encodings in {encoding_load_time:.3f}s.")
-        
-        # --- Step 3: Detect faces in the uploaded photo (RUNS ONCE) ---
-        detection_start = time.time()
-        original_image_path = photo.original_image.path
-        unknown_image = face_recognition.load_image_file(original_image_path)
-        unknown_face_locations = face_recognition.face_locations(unknown_image)
-        unknown_face_encodings = face_recognition.face_encodings(unknown_image, unknown_face_locations)
-        detection_time = time.time() - detection_start
-        logger.info(f"[PhotoProcessing] Photo {photo.id}: Detected {len(unknown_face_locations)} faces in {detection_time:.3f}s.")
+        # --- Step 1: Nothing is copied to public_image up front. ---
+        # The photo stays PROCESSING (and imageless in the API) until the
+        # renderer in Step 5 writes the masked version, so the unmasked
+        # original is never publicly served.
+
+        # --- Step 2: User encodings are loaded in Step 4, only if faces were
+        # found, and scoped to the uploader's circle first. ---
+
+        # --- Step 3: Detect faces in the uploaded photo (RUNS ONCE per unique content) ---
+        reused_detection = None
+        if detection is None:
+            with span('detection_reuse', timings) as reuse_span:
+                reused_detection = _reuse_blob_detection(photo, detector)
+
+        if detection is not None:
+            unknown_face_locations, unknown_face_encodings, landmarks_hashes, detector_version = detection
+            logger.info(f"[PhotoProcessing] Photo {photo.id}: Using {len(unknown_face_locations)} faces from batch detection.")
+        elif reused_detection is not None:
+            unknown_face_locations, unknown_face_encodings, landmarks_hashes, detector_version = reused_detection
+            logger.info(f"[PhotoProcessing] Photo {photo.id}: Reused {len(unknown_face_locations)} faces from duplicate content in {reuse_span.elapsed:.3f}s.")
+        else:
+            if image is not None:
+                unknown_image = image
+            else:
+                with span('decode', timings):
+                    unknown_image = recognition.load_image_file(photo.original_image.path)
+            with span('detection', timings) as detection_span:
+                detections = detector.detect(unknown_image)
+            unknown_face_locations = detections.locations
+            detector_version = pipeline_version(detections.detector)
+            with span('encoding', timings) as encoding_span:
+                unknown_face_encodings, landmarks_hashes = _encode_faces(unknown_image, unknown_face_locations)
+            logger.info(f"[PhotoProcessing] Photo {photo.id}: Detected {len(unknown_face_locations)} faces with {detections.detector} in {detection_span.elapsed:.3f}s, encoded in {encoding_span.elapsed:.3f}s.")
 
         if len(unknown_face_locations) == 0:
             logger.info(f"[PhotoProcessing] Photo {photo.id}: No faces detected.")
-            return
 
         # --- Step 4: Save ALL faces to DB and Create Consent Requests ---
-        matching_start = time.time()
         logger.info(f"[PhotoProcessing] Photo {photo.id}: Saving all {len(unknown_face_locations)} detected faces to database...")
         
         found_users_for_consent = set()
+        saved_face_ids = []
+        matched_users = match_faces_scoped(unknown_face_encodings, uploader.id, timings)
         
-        for unknown_encoding, face_location in zip(unknown_face_encodings, unknown_face_locations):
-            top, right, bottom, left = face_location
-            bounding_box_str = f"{left},{top},{right},{bottom}"
-            matched_user = None # Default to unknown
-
-            # Try to match the face
-            if len(known_users) > 0:
-                matches = face_recognition.compare_faces(known_encodings_array, unknown_encoding, tolerance=0.6)
-                if True in matches:
-                    matched_user = known_users[matches.index(True)]
-
-            # Save this face to the new DetectedFace table
-            DetectedFace.objects.create(
-                photo=photo,
-                bounding_box=bounding_box_str,
-                matched_user=matched_user
-            )
+        with span('db_write', timings) as db_write_span:
+            for unknown_encoding, landmarks_hash, face_location, matched_user in zip(
+                unknown_face_encodings, landmarks_hashes, unknown_face_locations, matched_users
+            ):
+                top, right, bottom, left = face_location
+                bounding_box_str = f"{left},{top},{right},{bottom}"
+
+                # Save this face (and its encoding, for later rematching) to the DetectedFace table
+                detected_face = DetectedFace.objects.create(
+                    photo=photo,
+                    bounding_box=bounding_box_str,
+                    matched_user=matched_user,
+                    encoding=encoding_to_bytes(unknown_encoding),
+                    landmarks_hash=landmarks_hash,
+                    detector_version=detector_version,
+                )
+                saved_face_ids.append(detected_face.id)
 
-            # If we found a user, check if they need a consent request
-            if matched_user:
-                is_uploader = matched_user.id == uploader.id
-                is_public = matched_user.face_sharing_mode == CustomUser.FaceSharingMode.PUBLIC
+                # If we found a user, check if they need a consent request
+                if matched_user:
+                    is_uploader = matched_user.id == uploader.id
+                    is_public = matched_user.face_sharing_mode == CustomUser.FaceSharingMode.PUBLIC
                 
-                # Only create a request if they are not the uploader, not public,
-                # and we haven't already made a request for them for this photo.
-                if not is_uploader and not is_public and matched_user.id not in found_users_for_consent:
-                    ConsentRequest.objects.create(
-                        photo=photo,
-                        requested_user=matched_user,
-                        bounding_box=bounding_box_str
-                    )
-                    found_users_for_consent.add(matched_user.id)
-                    logger.info(f"[PhotoProcessing] Photo {photo.id}: Created ConsentRequest for {matched_user.username}.")
-        
-        matching_time = time.time() - matching_start 
-        logger.info(f"[PhotoProcessing] Photo {photo.id}: DB save complete in {matching_time:.3f}s. Created {len(found_users_for_consent)} requests.")
+                    # Only create a request if they are not the uploader, not public,
+                    # and we haven't already made a request for them for this photo.
+                    if not is_uploader and not is_public and matched_user.id not in found_users_for_consent:
+                        ConsentRequest.objects.create(
+                            photo=photo,
+                            requested_user=matched_user,
+                            bounding_box=bounding_box_str
+                        )
+                        found_users_for_consent.add(matched_user.id)
+                        logger.info(f"[PhotoProcessing] Photo {photo.id}: Created ConsentRequest for {matched_user.username}.")
+
+            adjust_consent_counters(
+                (user_id, None, ConsentRequest.StatusChoices.PENDING) for user_id in found_users_for_consent
+            )
+
+        if reused_detection is None:
+            _mark_blob_detected(photo, detector_version)
+
+        # Mirror the new encodings into the memory-mapped store for corpus-wide scans.
+        # The DB row is the source of truth, so a failure here must not fail the upload.
+        try:
+            get_embedding_store().append(saved_face_ids, unknown_face_encodings)
+        except Exception as e:
+            logger.error(f"[PhotoProcessing] Photo {photo.id}: Could not append to embedding store: {e}")
+
+        logger.info(f"[PhotoProcessing] Photo {photo.id}: DB save complete in {db_write_span.elapsed:.3f}s. Created {len(found_users_for_consent)} requests.")
         
         # --- Step 5: Call the regeneration function ---
         logger.info(f"[PhotoProcessing] Photo {photo.id}: Calling _regenerate_public_image to create initial masked version.")
-        _regenerate_public_image(photo)
+        original = Image.fromarray(image) if image is not None else None
+        if not _regenerate_public_image(photo, original=original, timings=timings):
+            _mark_photo_failed(photo.id, timings)
+            return
 
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
+        PHOTO_STAGE_SECONDS.observe(total_time, stage='total')
+        timings['total'] = round(total_time, 6)
+        Photo.objects.filter(id=photo.id).update(processing_timings=timings)
         logger.info(f"[PhotoProcessing] SUCCESS: Finished NEW photo {photo.id} in {total_time:.3f}s.")
 
     except Exception as e:
         logger.error(f"[PhotoProcessing] FAILED: Error processing NEW photo {photo.id}: {e}", exc_info=True)
+        _mark_photo_failed(photo.id, timings)
+
+
+def _mark_photo_failed(photo_id, timings=None):
+    """FAILED photos are never shown, so they also leave the feed."""
+    Photo.objects.filter(id=photo_id).update(status=Photo.StatusChoices.FAILED, processing_timings=timings)
+    FeedItem.objects.filter(photo_id=photo_id).delete()
+
+
+def reset_photo_detection(photo_ids):
+    """
+    Forget previous (partial) processing of photos so they can be processed
+    again from scratch: their DetectedFace rows and ConsentRequests are
+    deleted, and content blobs that pointed at them for reuse are cleared.
+
+    Only meant for photos that never became READY, which were never shown,
+    so their consent requests can simply be sent again.
+    """
+    with transaction.atomic():
+        ContentBlob.objects.filter(detection_source_id__in=photo_ids).update(
+            detection_source=None, detector_version=''
+        )
+        requests = ConsentRequest.objects.filter(photo_id__in=photo_ids)
+        adjust_consent_counters(
+            (user_id, status, None) for user_id, status in requests.values_list('requested_user_id', 'status')
+        )
+        requests.delete()
+        DetectedFace.objects.filter(photo_id__in=photo_ids).delete()
+
+
+def process_photos_for_faces(photo_ids, detector=None):
+    """
+    Batch variant of `process_photo_for_faces` for backfills.
+
+    Each photo is decoded and run through the detector, then the faces of the
+    whole batch are encoded in one batched call, and each photo is finished
+    (matching, DB write, render) by `process_photo_for_faces`. Photos whose
+    content was already detected reuse that result as usual.
+
+    Batch detection/encoding time shows up in the stage histograms, not in
+    each photo's `processing_timings`.
+
+    Returns:
+        int: number of photos that reached READY
+    """
+    detector = get_detector(detector)
+    pending = []  # (photo_id, image, detections)
+    for photo in Photo.objects.filter(id__in=photo_ids).select_related('content_blob').order_by('id'):
+        if _reuse_blob_detection(photo, detector) is not None:
+            process_photo_for_faces(photo.id, detector=detector.name)
+            continue
+        try:
+            with span('decode'):
+                image = recognition.load_image_file(photo.original_image.path)
+            with span('detection'):
+                detections = detector.detect(image)
+        except Exception as e:
+            logger.error(f"[BatchProcessing] Photo {photo.id}: Detection failed: {e}", exc_info=True)
+            _mark_photo_failed(photo.id)
+            continue
+        pending.append((photo.id, image, detections))
+
+    if pending:
+        with span('encoding') as encoding_span:
+            encoded = _encode_faces_batch(
+                [image for _, image, _ in pending],
+                [detections.locations for _, _, detections in pending],
+            )
+        face_count = sum(len(detections.locations) for _, _, detections in pending)
+        logger.info(f"[BatchProcessing] Encoded {face_count} faces from {len(pending)} photos in one batch in {encoding_span.elapsed:.3f}s.")
+
+        for (photo_id, image, detections), (encodings, landmarks_hashes) in zip(pending, encoded):
+            process_photo_for_faces(
+                photo_id,
+                image=image,
+                detector=detector.name,
+                detection=(detections.locations, encodings, landmarks_hashes, pipeline_version(detections.detector)),
+            )
+
+    return Photo.objects.filter(id__in=photo_ids, status=Photo.StatusChoices.READY).count()
+
+
+# ConsentRequest.status -> ConsentCounter field
+_COUNTER_FIELDS = {
+    ConsentRequest.StatusChoices.PENDING: 'pending',
+    ConsentRequest.StatusChoices.APPROVED: 'approved',
+    ConsentRequest.StatusChoices.DENIED: 'denied',
+}
+
+
+def adjust_consent_counters(changes):
+    """
+    Apply consent request status changes to the per-user ConsentCounter rows
+    with F() increments, one UPDATE per affected user.
+
+    Args:
+        changes: iterable of (user_id, old_status, new_status); old_status is
+            None for a new request and new_status None for a deleted one
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for user_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        if old_status:
+            deltas[user_id][_COUNTER_FIELDS[old_status]] -= 1
+        if new_status:
+            deltas[user_id][_COUNTER_FIELDS[new_status]] += 1
+
+    missing = []
+    for user_id, delta in deltas.items():
+        updates = {field: F(field) + amount for field, amount in delta.items() if amount}
+        if not updates:
+            continue
+        if not ConsentCounter.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **updates):
+            missing.append(user_id)
+    # No counter yet (e.g. first request ever): count the rows instead.
+    if missing:
+        recount_consent_counters(missing)
+
+    # Wake up these users' open consent streams once the change is visible.
+    changed_user_ids = list(deltas)
+    if changed_user_ids:
+        transaction.on_commit(lambda: notify_consent_changed(changed_user_ids))
+
+
+def consent_channel(user_id):
+    """The core.events channel a user's consent stream listens on."""
+    return f"consent:{user_id}"
+
+
+def issue_stream_ticket(user):
+    """
+    A ticket that opens one consent stream for `user`, valid for
+    CONSENT_STREAM_TICKET_SECONDS. EventSource cannot send headers, so the
+    stream is authenticated by this in its URL instead of the access token.
+    """
+    return signing.dumps(user.id, salt='photos.consent-stream')
+
+
+async def aredeem_stream_ticket(ticket):
+    """The user id of a valid stream ticket that was not used before, else None."""
+    max_age = getattr(settings, 'CONSENT_STREAM_TICKET_SECONDS', 30)
+    try:
+        user_id = signing.loads(ticket, salt='photos.consent-stream', max_age=max_age)
+    except signing.BadSignature:
+        return None
+    # Single use: a ticket copied from a log or history opens nothing.
+    used_key = f"consent-stream-ticket:{hashlib.sha256(ticket.encode()).hexdigest()}"
+    if not await cache.aadd(used_key, True, timeout=max_age):
+        return None
+    return user_id
+
+
+def notify_consent_changed(user_ids):
+    for user_id in user_ids:
+        events.publish(consent_channel(user_id), 'changed')
+
+
+def recount_consent_counters(user_ids=None):
+    """Rebuild ConsentCounter rows from the requests themselves (all users if `user_ids` is None)."""
+    requests = ConsentRequest.objects.all()
+    if user_ids is not None:
+        requests = requests.filter(requested_user_id__in=user_ids)
+    rows = requests.values('requested_user_id').annotate(
+        **{
+            field: Count('id', filter=Q(status=status))
+            for status, field in _COUNTER_FIELDS.items()
+        }
+    )
+    counted = set()
+    for row in rows:
+        user_id = row.pop('requested_user_id')
+        ConsentCounter.objects.update_or_create(user_id=user_id, defaults=row)
+        counted.add(user_id)
+    for user_id in set(user_ids or ()) - counted:
+        ConsentCounter.objects.update_or_create(
+            user_id=user_id, defaults={field: 0 for field in _COUNTER_FIELDS.values()}
+        )
+
+
+def get_consent_counts(user):
+    """The user's consent request counts per status, from their counter."""
+    counter = ConsentCounter.objects.filter(user=user).first()
+    if counter is None:
+        recount_consent_counters([user.id])
+        counter = ConsentCounter.objects.get(user=user)
+    return {status.value: getattr(counter, field) for status, field in _COUNTER_FIELDS.items()}
+
+
+async def aget_consent_counts(user):
+    """Async-ORM variant of `get_consent_counts`, for the async views."""
+    counter = await ConsentCounter.objects.filter(user=user).afirst()
+    if counter is None:
+        await sync_to_async(recount_consent_counters)([user.id])
+        counter = await ConsentCounter.objects.aget(user=user)
+    return {status.value: getattr(counter, field) for status, field in _COUNTER_FIELDS.items()}
+
+
+def bulk_set_consent_status(user, status, ids=None):
+    """
+    Approve or deny many of `user`'s consent requests at once: the given
+    `ids`, or every PENDING request if `ids` is None.
+
+    All status changes are made in one transaction with a single UPDATE,
+    which also marks every affected photo `render_pending`. Afterwards (for
+    approvals) the newest confirmed faces are added to the user's enrolment
+    set, and up to CONSENT_BULK_INLINE_RENDERS photos are regenerated right
+    away, once each however many of their requests changed. The rest stay
+    marked for `render_pending_photos`, so a large bulk action neither
+    blocks the request nor loses renders when it is interrupted.
+
+    Returns:
+        dict: {'updated': number of requests changed, 'photos_regenerated': ...,
+               'photos_pending': photos left for render_pending_photos}
+    """
+    approved = ConsentRequest.StatusChoices.APPROVED
+    with transaction.atomic():
+        requests = ConsentRequest.objects.select_for_update().filter(requested_user=user).exclude(status=status)
+        if ids is None:
+            requests = requests.filter(status=ConsentRequest.StatusChoices.PENDING)
+        else:
+            requests = requests.filter(id__in=ids)
+        changed = list(requests.values_list('id', 'photo_id', 'status'))
+        if not changed:
+            return {'updated': 0, 'photos_regenerated': 0, 'photos_pending': 0}
+
+        ConsentRequest.objects.filter(id__in=[request_id for request_id, _, _ in changed]).update(
+            status=status, updated_at=timezone.now()
+        )
+        adjust_consent_counters((user.id, old_status, status) for _, _, old_status in changed)
+
+        # Masks only change where an approval was granted or revoked.
+        photo_ids = {photo_id for _, photo_id, old_status in changed if approved in (old_status, status)}
+        Photo.objects.filter(id__in=photo_ids).update(
+            render_pending=True, consent_version=F('consent_version') + 1
+        )
+    logger.info(f"[Consent] User {user.username}: Set {len(changed)} requests to {status} in one transaction.")
+
+    if status == approved:
+        try:
+            faces = (
+                DetectedFace.objects.filter(photo_id__in=photo_ids, matched_user=user, encoding__isnull=False)
+                .order_by('-id')[:ENROLMENT_MAX_SIZE]
+            )
+            for face in faces:
+                add_face_enrolment(user, face.encoding_array, FaceEnrolment.SourceChoices.CONFIRMED_MATCH, detected_face=face)
+        except Exception as e:
+            logger.error(f"[Consent] User {user.username}: Could not enrol confirmed faces: {e}")
+
+    inline = getattr(settings, 'CONSENT_BULK_INLINE_RENDERS', 20)
+    regenerated = render_pending_photos(photo_ids=photo_ids, limit=inline)
+    return {
+        'updated': len(changed),
+        'photos_regenerated': regenerated,
+        'photos_pending': len(photo_ids) - regenerated,
+    }
+
+
+def render_pending_photos(photo_ids=None, limit=None):
+    """
+    Regenerate the public image of photos marked `render_pending` (all of
+    them, or those among `photo_ids`), oldest first, at most `limit`.
+    A photo whose render fails stays marked for the next run.
+
+    Returns:
+        int: number of photos regenerated
+    """
+    photos = Photo.objects.filter(render_pending=True).order_by('id')
+    if photo_ids is not None:
+        photos = photos.filter(id__in=photo_ids)
+    if limit is not None:
+        photos = photos[:limit]
+    regenerated = 0
+    for photo in photos:
+        regenerated += bool(_regenerate_public_image(photo))
+    return regenerated
 
 
 def unmask_approved_face(consent_request_id: int):
@@ -224,6 +920,17 @@ def unmask_approved_face(consent_request_id: int):
         user = consent_request.requested_user
         logger.info(f"[Unmasking] Request {consent_request_id}: User {user.username} approved. Triggering regeneration for photo {photo.id}.")
         
+        # The user confirmed this face is theirs: add it to their enrolment set.
+        # Failing to enrol must not block the unmasking itself.
+        try:
+            face = DetectedFace.objects.filter(
+                photo=photo, matched_user=user, bounding_box=consent_request.bounding_box
+            ).first()
+            if face is not None and face.encoding:
+                add_face_enrolment(user, face.encoding_array, FaceEnrolment.SourceChoices.CONFIRMED_MATCH, detected_face=face)
+        except Exception as e:
+            logger.error(f"[Unmasking] Request {consent_request_id}: Could not enrol confirmed face: {e}")
+
         # --- NEW LOGIC ---
         # Call the ultra-fast regeneration function. No face detection needed!
         _regenerate_public_image(photo)
@@ -235,4 +942,430 @@ def unmask_approved_face(consent_request_id: int):
     except Photo.DoesNotExist:
         logger.error(f"[Unmasking] FAILED: Photo not found for request {consent_request_id}.")
     except Exception as e:
-        logger.error(f"[Unmasking] FAILED: An unexpected error occurred for request {consent_request_id}. Error: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"[Unmasking] FAILED: An unexpected error occurred for request {consent_request_id}. Error: {e}", exc_info=True)
+
+
+def rematch_faces(tolerance=FACE_MATCH_TOLERANCE, batch_size=20000, dry_run=False, regenerate=True):
+    """
+    Re-run matching for every stored face using only the persisted encodings.
+
+    No image is opened and no detector runs: encodings are streamed from the
+    memory-mapped embedding store in chunks and, grouped by uploader, matched
+    with `match_faces_scoped` like a new upload is (candidate circle first),
+    so a rematch with unchanged tolerance and gallery changes nothing. Faces
+    whose match changed are updated, new `ConsentRequest`s are created where
+    needed, and each affected photo is regenerated once at the end.
+
+    Existing consent requests are never deleted, so a user who already
+    approved or denied keeps that decision.
+
+    The store is local to this host and appends to it may fail, so it is
+    first checked against the database and rebuilt if any encoded face is
+    missing from it; otherwise those faces would silently not be rematched.
+
+    Returns:
+        dict: Statistics about the rematch
+    """
+    gallery = _prepare_gallery(get_face_encodings_dict())
+    # Each uploader's circle, queried once per run rather than once per chunk.
+    candidates = {}
+
+    stats = {'scanned': 0, 'changed': 0, 'consent_requests': 0, 'photos_regenerated': 0, 'store_rebuilt': False}
+    affected_photo_ids = set()
+
+    store = get_embedding_store()
+    missing = store.count_missing()
+    if missing:
+        logger.warning(f"[Rematch] {missing} stored faces are missing from the embedding store; rebuilding it.")
+        store.rebuild()
+        stats['store_rebuilt'] = True
+
+    for face_ids, encodings in store.iter_chunks(batch_size):
+        stats['scanned'] += len(face_ids)
+        # Faces deleted since they were appended simply don't come back from this query.
+        current = DetectedFace.objects.filter(id__in=[int(face_id) for face_id in face_ids]).values_list(
+            'id', 'matched_user_id', 'photo_id', 'photo__uploader_id', 'bounding_box'
+        )
+        rows = {row[0]: row for row in current.iterator(chunk_size=5000)}
+
+        positions_by_uploader = defaultdict(list)
+        for position, face_id in enumerate(face_ids):
+            row = rows.get(int(face_id))
+            if row is not None:
+                positions_by_uploader[row[3]].append(position)
+
+        new_users = {}
+        for uploader_id, positions in positions_by_uploader.items():
+            if uploader_id not in candidates:
+                candidates[uploader_id] = get_candidate_user_ids(uploader_id)
+            matched = match_faces_scoped(
+                encodings[positions], uploader_id, tolerance=tolerance,
+                gallery=gallery, candidate_ids=candidates[uploader_id],
+            )
+            for position, user in zip(positions, matched):
+                new_users[int(face_ids[position])] = user
+        new_user_ids = {face_id: (user.id if user else None) for face_id, user in new_users.items()}
+
+        changed_faces = [row for face_id, row in rows.items() if new_user_ids[face_id] != row[1]]
+        stats['changed'] += len(changed_faces)
+
+        if dry_run or not changed_faces:
+            continue
+
+        with transaction.atomic():
+            DetectedFace.objects.bulk_update(
+                [DetectedFace(id=face_id, matched_user_id=new_user_ids[face_id])
+                 for face_id, *_ in changed_faces],
+                ['matched_user'],
+                batch_size=1000,
+            )
+
+            photo_ids = {photo_id for _, _, photo_id, _, _ in changed_faces}
+            existing_requests = set(
+                ConsentRequest.objects.filter(photo_id__in=photo_ids)
+                .values_list('photo_id', 'requested_user_id')
+            )
+            new_requests = []
+            for face_id, _, photo_id, uploader_id, bounding_box in changed_faces:
+                affected_photo_ids.add(photo_id)
+                user = new_users[face_id]
+                if user is None or user.id == uploader_id:
+                    continue
+                if user.face_sharing_mode == CustomUser.FaceSharingMode.PUBLIC:
+                    continue
+                if (photo_id, user.id) in existing_requests:
+                    continue
+                existing_requests.add((photo_id, user.id))
+                new_requests.append(ConsentRequest(
+                    photo_id=photo_id,
+                    requested_user=user,
+                    bounding_box=bounding_box,
+                ))
+            ConsentRequest.objects.bulk_create(new_requests, batch_size=1000)
+            adjust_consent_counters(
+                (request.requested_user.id, None, ConsentRequest.StatusChoices.PENDING) for request in new_requests
+            )
+            stats['consent_requests'] += len(new_requests)
+
+        logger.info(f"[Rematch] Scanned {stats['scanned']} faces, {stats['changed']} changed so far.")
+
+    if regenerate and not dry_run:
+        for photo in Photo.objects.filter(id__in=affected_photo_ids):
+            _regenerate_public_image(photo)
+            stats['photos_regenerated'] += 1
+
+    logger.info(f"[Rematch] Complete: {stats}")
+    return stats
+
+
+# --- Feed read model ---
+#
+# FeedItem rows are derived data: every write path that changes what a feed
+# item shows calls one of the functions below, and `rebuild_feed_items`
+# recomputes them from the source tables.
+
+def _file_url(field):
+    return field.url if field else None
+
+
+def _feed_payload(photo, uploader):
+    is_ready = photo.status == Photo.StatusChoices.READY
+    return {
+        'id': photo.id,
+        'uploader': {
+            'id': uploader.id,
+            'username': uploader.username,
+            'profile_pic': _file_url(uploader.profile_pic),
+        },
+        # Nothing is safe to show until the masked render exists.
+        'public_image': _file_url(photo.public_image) if is_ready else None,
+        'caption': photo.caption,
+        'status': photo.status,
+        'created_at': photo.created_at.isoformat(),
+    }
+
+
+def _latest_comments(photo_ids, limit=FEED_LATEST_COMMENTS):
+    """photo_id -> its newest `limit` comments (oldest first), in one query."""
+    rows = (
+        Comment.objects.filter(photo_id__in=photo_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=[F('photo_id')], order_by=F('id').desc()))
+        .filter(rank__lte=limit)
+        .values('id', 'photo_id', 'user_id', 'user__username', 'text', 'created_at')
+        .order_by('photo_id', 'id')
+    )
+    latest = defaultdict(list)
+    for row in rows:
+        latest[row['photo_id']].append({
+            'id': row['id'],
+            'user': {'id': row['user_id'], 'username': row['user__username']},
+            'text': row['text'],
+            'created_at': row['created_at'].isoformat(),
+        })
+    return latest
+
+
+def sync_feed_item(photo):
+    """
+    Create or refresh the feed item of one photo from the source tables.
+    Called on upload and after every render; FAILED photos are removed.
+    """
+    if photo.status == Photo.StatusChoices.FAILED:
+        FeedItem.objects.filter(photo_id=photo.id).delete()
+        return
+    FeedItem.objects.update_or_create(
+        photo_id=photo.id,
+        defaults={
+            'uploader_id': photo.uploader_id,
+            'payload': _feed_payload(photo, photo.uploader),
+            'like_count': Like.objects.filter(photo_id=photo.id).count(),
+            'comment_count': Comment.objects.filter(photo_id=photo.id).count(),
+            'latest_comments': _latest_comments([photo.id]).get(photo.id, []),
+        },
+    )
+
+
+def adjust_feed_like_count(photo_id, delta):
+    """A like was added (+1) or removed (-1)."""
+    if counters.enabled():
+        # Buffered once the like itself is committed; see photos.counters.
+        transaction.on_commit(lambda: counters.buffer.add_likes(photo_id, delta))
+        return
+    FeedItem.objects.filter(photo_id=photo_id).update(like_count=F('like_count') + delta)
+
+
+def get_feed_like_count(photo_id):
+    """The photo's like count, including deltas not yet written behind."""
+    stored = FeedItem.objects.filter(photo_id=photo_id).values_list('like_count', flat=True).first() or 0
+    return stored + (counters.buffer.pending_likes(photo_id) if counters.enabled() else 0)
+
+
+def refresh_feed_comments(photo_id):
+    """A comment was added, edited or removed: refresh the count and preview."""
+    if counters.enabled():
+        transaction.on_commit(lambda: counters.buffer.mark_comments(photo_id))
+        return
+    write_feed_comments(photo_id)
+
+
+def write_feed_comments(photo_id):
+    FeedItem.objects.filter(photo_id=photo_id).update(
+        comment_count=Comment.objects.filter(photo_id=photo_id).count(),
+        latest_comments=_latest_comments([photo_id]).get(photo_id, []),
+    )
+
+
+def reconcile_feed_counters(photo_ids=None, settle_seconds=60, batch_size=1000):
+    """
+    Recount like_count and comment_count from the Like and Comment tables
+    and fix feed items that drifted (e.g. deltas lost when a process died
+    before its write-behind flush).
+
+    Photos liked or commented on in the last `settle_seconds`, and photos
+    whose like count any process changed within FEED_COUNTER_TOUCH_SECONDS
+    (unlikes included, see `counters.recently_touched`), are skipped: their
+    deltas may still be pending in some process, and recounting them now
+    would count those twice.
+
+    Returns:
+        int: number of feed items corrected
+    """
+    recent = timezone.now() - timedelta(seconds=settle_seconds)
+    busy = set(Like.objects.filter(created_at__gte=recent).values_list('photo_id', flat=True))
+    busy |= set(Comment.objects.filter(created_at__gte=recent).values_list('photo_id', flat=True))
+    if 'LocMemCache' in settings.CACHES['default']['BACKEND']:
+        logger.warning("[Feed] Reconciling with a per-process cache: recent unlikes buffered in other processes can't be seen.")
+
+    items = FeedItem.objects.order_by('photo_id')
+    if photo_ids is not None:
+        items = items.filter(photo_id__in=photo_ids)
+
+    corrected = 0
+    last_id = 0
+    while True:
+        batch = list(items.filter(photo_id__gt=last_id).values_list('photo_id', 'like_count', 'comment_count')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        busy |= counters.recently_touched([photo_id for photo_id, _, _ in batch])
+        ids = [photo_id for photo_id, _, _ in batch if photo_id not in busy]
+        like_counts = dict(
+            Like.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        comment_counts = dict(
+            Comment.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        for photo_id, like_count, comment_count in batch:
+            if photo_id in busy:
+                continue
+            actual = (like_counts.get(photo_id, 0), comment_counts.get(photo_id, 0))
+            if actual != (like_count, comment_count):
+                FeedItem.objects.filter(photo_id=photo_id).update(like_count=actual[0], comment_count=actual[1])
+                corrected += 1
+
+    logger.info(f"[Feed] Reconciled counters: {corrected} feed items corrected, {len(busy)} busy photos skipped.")
+    return corrected
+
+
+def refresh_feed_uploader(user):
+    """The user's username or profile picture changed: rewrite their items."""
+    summary = {'id': user.id, 'username': user.username, 'profile_pic': _file_url(user.profile_pic)}
+    items = list(FeedItem.objects.filter(uploader=user).only('photo_id', 'payload'))
+    for item in items:
+        item.payload['uploader'] = summary
+    FeedItem.objects.bulk_update(items, ['payload'], batch_size=500)
+
+
+def rebuild_feed_items(photo_ids=None, batch_size=500):
+    """
+    Recompute feed items from the source tables: for every photo, or just
+    `photo_ids`. Items of photos that can no longer be shown are removed.
+
+    Returns:
+        int: number of feed items written
+    """
+    photos = Photo.objects.exclude(status=Photo.StatusChoices.FAILED).select_related('uploader').order_by('id')
+    stale = FeedItem.objects.filter(photo__status=Photo.StatusChoices.FAILED)
+    if photo_ids is not None:
+        photos = photos.filter(id__in=photo_ids)
+        stale = stale.filter(photo_id__in=photo_ids)
+    stale.delete()
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(photos.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        ids = [photo.id for photo in batch]
+        like_counts = dict(
+            Like.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        comment_counts = dict(
+            Comment.objects.filter(photo_id__in=ids).values('photo_id').annotate(n=Count('id')).values_list('photo_id', 'n')
+        )
+        latest = _latest_comments(ids)
+        items = [
+            FeedItem(
+                photo_id=photo.id,
+                uploader_id=photo.uploader_id,
+                payload=_feed_payload(photo, photo.uploader),
+                like_count=like_counts.get(photo.id, 0),
+                comment_count=comment_counts.get(photo.id, 0),
+                latest_comments=latest.get(photo.id, []),
+            )
+            for photo in batch
+        ]
+        with transaction.atomic():
+            FeedItem.objects.filter(photo_id__in=ids).delete()
+            FeedItem.objects.bulk_create(items)
+        written += len(items)
+
+    logger.info(f"[Feed] Rebuilt {written} feed items.")
+    return written
+
+
+# --- Home timelines ---
+#
+# Fan-out on write: a new photo is copied into the timeline of its uploader
+# and of each follower, so reading a timeline is one index range scan.
+# Accounts with more than TIMELINE_FANOUT_MAX_FOLLOWERS followers would make
+# each upload write that many rows, so their photos are not copied; readers
+# fetch them from FeedItem and merge them in (fan-in on read).
+
+FEED_ROW_FIELDS = ('photo_id', 'payload', 'like_count', 'comment_count', 'latest_comments')
+
+
+def _fanout_max_followers():
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def fan_out_photo(photo, batch_size=1000):
+    """
+    Add a new photo to its uploader's timeline and, unless the uploader has
+    too many followers, to every follower's.
+
+    Returns:
+        int: number of timelines written
+    """
+    uploader = photo.uploader
+    entries = [TimelineEntry(user_id=uploader.id, photo_id=photo.id, uploader_id=uploader.id)]
+    if uploader.follower_count <= _fanout_max_followers():
+        follower_ids = Follow.objects.filter(followee_id=uploader.id).values_list('follower_id', flat=True)
+        entries += [
+            TimelineEntry(user_id=follower_id, photo_id=photo.id, uploader_id=uploader.id)
+            for follower_id in follower_ids.iterator(chunk_size=batch_size)
+        ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+    logger.info(f"[Timeline] Photo {photo.id}: Fanned out to {len(entries)} timelines.")
+    return len(entries)
+
+
+def backfill_timeline(user, uploader):
+    """`user` just followed `uploader`: copy in their recent photos."""
+    if uploader.follower_count > _fanout_max_followers():
+        return  # Read from FeedItem instead.
+    photo_ids = (
+        FeedItem.objects.filter(uploader=uploader)
+        .order_by('-photo_id')
+        .values_list('photo_id', flat=True)[:getattr(settings, 'TIMELINE_BACKFILL_PHOTOS', 50)]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user.id, photo_id=photo_id, uploader_id=uploader.id) for photo_id in photo_ids],
+        ignore_conflicts=True,
+    )
+
+
+def prune_timeline(user, uploader):
+    """`user` unfollowed `uploader`: drop their photos from the timeline."""
+    TimelineEntry.objects.filter(user=user, uploader=uploader).delete()
+
+
+def _timeline_querysets(user, before, limit):
+    entries = TimelineEntry.objects.filter(user=user, photo__feed_item__isnull=False)
+    big_accounts = Follow.objects.filter(
+        follower=user, followee__follower_count__gt=_fanout_max_followers()
+    ).values('followee_id')
+    fanned_in = FeedItem.objects.filter(uploader_id__in=big_accounts)
+    if before is not None:
+        entries = entries.filter(photo_id__lt=before)
+        fanned_in = fanned_in.filter(photo_id__lt=before)
+
+    entries = entries.order_by('-photo_id').values(
+        'photo_id',
+        payload=F('photo__feed_item__payload'),
+        like_count=F('photo__feed_item__like_count'),
+        comment_count=F('photo__feed_item__comment_count'),
+        latest_comments=F('photo__feed_item__latest_comments'),
+    )[:limit + 1]
+    return entries, fanned_in.order_by('-photo_id').values(*FEED_ROW_FIELDS)[:limit + 1]
+
+
+def _merge_timeline(rows, limit):
+    merged = {row['photo_id']: row for row in rows}
+    ordered = sorted(merged.values(), key=lambda row: row['photo_id'], reverse=True)
+    return ordered[:limit], len(ordered) > limit
+
+
+def get_timeline_page(user, before=None, limit=20):
+    """
+    One page of `user`'s home timeline, newest first: their fanned-out
+    entries merged with the photos of followed accounts too big to fan out.
+    Photos that left the feed (e.g. FAILED) are skipped.
+
+    Args:
+        before: only photos with a smaller id (the previous page's cursor)
+
+    Returns:
+        (rows, has_more): FeedItem rows as dicts with FEED_ROW_FIELDS
+    """
+    entries, fanned_in = _timeline_querysets(user, before, limit)
+    return _merge_timeline(list(entries) + list(fanned_in), limit)
+
+
+async def aget_timeline_page(user, before=None, limit=20):
+    """Async-ORM variant of `get_timeline_page`, for the async views."""
+    entries, fanned_in = _timeline_querysets(user, before, limit)
+    rows = [row async for row in entries] + [row async for row in fanned_in]
+    return _merge_timeline(rows, limit)
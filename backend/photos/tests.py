@@ -1,3 +1,1073 @@
-from django.test import TestCase
+# backend/photos/tests.py
+#
+# Nothing here runs face detection, so neither the face stack nor Postgres
+# is needed: faces are made from synthetic 128-d encodings.
 
-# Create your tests here.
+import asyncio
+import hashlib
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
+from django.test import AsyncClient, Client, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from interactions.models import Comment, Like
+from interactions.services import like_photo, liked_photo_ids, unlike_photo
+from users.models import CustomUser
+from users.services import find_matching_faces, follow_user
+from core.metrics import span
+from . import counters, detectors, services
+from .detectors import Detections
+from .models import ConsentCounter, ConsentRequest, ContentBlob, DetectedFace, FeedItem, Photo, TimelineEntry
+
+
+def make_user(username, encoding=None, **fields):
+    if encoding is not None:
+        fields.update(face_encoding=[float(x) for x in encoding], encoding_status='SUCCESS')
+    return CustomUser.objects.create_user(username=username, password='pw', **fields)
+
+
+def jpeg_bytes(size=(64, 48), color=(200, 120, 80)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def make_photo(uploader, status=Photo.StatusChoices.READY, with_original=False):
+    """A photo; its original is only written (under MEDIA_ROOT) if `with_original`."""
+    photo = Photo(uploader=uploader, original_image='photos/originals/test.jpg', status=status)
+    if with_original:
+        photo.original_image.save('test.jpg', ContentFile(jpeg_bytes()), save=False)
+    photo.save()
+    services.sync_feed_item(photo)
+    return photo
+
+
+def make_face(photo, encoding, matched_user=None):
+    return DetectedFace.objects.create(
+        photo=photo, bounding_box='0,0,10,10', matched_user=matched_user,
+        encoding=services.encoding_to_bytes(encoding),
+    )
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def at_distance(base, distance, axis):
+    """A point `distance` away from `base`, along the coordinate `axis`."""
+    point = np.array(base, dtype=np.float32)
+    point[axis] += distance
+    return point
+
+
+class EmbeddingStoreTestCase(TestCase):
+    """Points the embedding store at a fresh temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(FACE_EMBEDDING_STORE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class FakeDetector:
+    """Stands in for a photos.detectors backend: finds the same faces in every image."""
+    ids = {'fake-1'}
+
+    def __init__(self, locations=((2, 22, 22, 2),)):
+        self.locations = list(locations)
+        self.calls = 0
+
+    def detect(self, image):
+        self.calls += 1
+        return Detections(self.locations, [1.0] * len(self.locations), 'fake-1')
+
+
+def fake_encoder(encoding):
+    """An `_encode_faces` stand-in that encodes every face as `encoding`."""
+    def encode(image, locations):
+        return [np.asarray(encoding, dtype=np.float32) for _ in locations], ['landmarks'] * len(locations)
+    return encode
+
+
+def stub_face_stack(test, encoding):
+    """Patch the photos services to detect with a FakeDetector for the rest of `test`."""
+    detector = FakeDetector()
+    for target, replacement in [
+        ('get_detector', lambda name=None: detector),
+        ('_encode_faces', fake_encoder(encoding)),
+    ]:
+        patcher = mock.patch.object(services, target, replacement)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return detector
+
+
+class MediaTestCase(TestCase):
+    """Writes media to a fresh temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ScopedRematchTests(EmbeddingStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.friend = make_user('friend', unit(np.arange(1, 129)))
+        # A stranger who looks a little closer to the faces than the friend.
+        self.stranger = make_user('stranger', at_distance(self.friend.face_encoding, 0.3, 0))
+        self.uploaders = [make_user('first'), make_user('second')]
+        for uploader in self.uploaders:
+            uploader.following.create(followee=self.friend)
+        self.faces = [
+            make_face(make_photo(uploader), at_distance(self.friend.face_encoding, 0.2, 0))
+            for uploader in self.uploaders * 2
+        ]
+        services.get_embedding_store().rebuild()
+
+    def test_split_gallery(self):
+        gallery = services._prepare_gallery(services.get_face_encodings_dict())
+        (scoped, scoped_users), (others, other_users) = services._split_gallery(gallery, {self.friend.id})
+        self.assertEqual([user.id for user in scoped_users], [self.friend.id])
+        self.assertEqual([user.id for user in other_users], [self.stranger.id])
+        self.assertEqual((scoped.shape, others.shape), ((1, 128), (1, 128)))
+
+    def test_candidates_queried_once_per_uploader_per_run(self):
+        get_candidates = mock.patch.object(services, 'get_candidate_user_ids', wraps=services.get_candidate_user_ids)
+        load_gallery = mock.patch.object(services, 'get_face_encodings_dict', wraps=services.get_face_encodings_dict)
+        with get_candidates as get_candidates, load_gallery as load_gallery:
+            stats = services.rematch_faces(batch_size=1, regenerate=False)
+
+        self.assertEqual(sorted(call.args[0] for call in get_candidates.call_args_list),
+                         sorted(uploader.id for uploader in self.uploaders))
+        self.assertEqual(load_gallery.call_count, 1)
+        self.assertEqual((stats['scanned'], stats['changed']), (4, 4))
+        # The friend is in every uploader's circle, so wins over the closer stranger.
+        self.assertEqual(
+            set(DetectedFace.objects.values_list('matched_user_id', flat=True)), {self.friend.id}
+        )
+        self.assertEqual(ConsentRequest.objects.filter(requested_user=self.friend).count(), 4)
+
+    def test_unchanged_rematch_is_a_no_op(self):
+        services.rematch_faces(regenerate=False)
+        stats = services.rematch_faces(batch_size=3, regenerate=False)
+        self.assertEqual(stats['changed'], 0)
+
+
+class CommentPagingTests(TestCase):
+    def setUp(self):
+        self.uploader = make_user('uploader')
+        self.photo = make_photo(self.uploader)
+        self.comments = [
+            Comment.objects.create(user=self.uploader, photo=self.photo, text=f'comment {i}') for i in range(7)
+        ]
+        Comment.objects.create(user=self.uploader, photo=make_photo(self.uploader), text='elsewhere')
+        self.client = APIClient()
+        self.client.force_authenticate(self.uploader)
+
+    def walk(self, url):
+        seen, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [comment['id'] for comment in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return seen, pages
+
+    def test_pages_cover_every_comment_once_in_order(self):
+        seen, pages = self.walk(f'/api/photos/{self.photo.id}/comments/?page_size=3')
+        self.assertEqual(seen, [comment.id for comment in self.comments])
+        self.assertEqual(pages, 3)
+
+    def test_photo_query_param(self):
+        seen, _ = self.walk(f'/api/comments/?photo={self.photo.id}&page_size=5')
+        self.assertEqual(seen, [comment.id for comment in self.comments])
+
+    def test_invalid_photo_query_param(self):
+        for value in ('abc', '0', '-3', '1.5'):
+            response = self.client.get(f'/api/comments/?photo={value}')
+            self.assertEqual(response.status_code, 400, value)
+
+
+@override_settings(CONSENT_BULK_INLINE_RENDERS=2)
+class BulkConsentTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+        self.subject = make_user('subject')
+        self.photos = [make_photo(self.uploader, with_original=True) for _ in range(3)]
+        self.requests = [
+            ConsentRequest.objects.create(photo=photo, requested_user=self.subject, bounding_box='0,0,10,10')
+            for photo in self.photos
+        ]
+        for photo in self.photos:
+            make_face(photo, unit(np.ones(128)), matched_user=self.subject)
+        services.recount_consent_counters([self.subject.id])
+
+    def test_bulk_approve_renders_inline_up_to_the_limit(self):
+        result = services.bulk_set_consent_status(self.subject, ConsentRequest.StatusChoices.APPROVED)
+
+        self.assertEqual(result, {'updated': 3, 'photos_regenerated': 2, 'photos_pending': 1})
+        self.assertEqual(services.get_consent_counts(self.subject), {'PENDING': 0, 'APPROVED': 3, 'DENIED': 0})
+        self.assertEqual(Photo.objects.filter(render_pending=True).count(), 1)
+
+        self.assertEqual(services.render_pending_photos(), 1)
+        self.assertFalse(Photo.objects.filter(render_pending=True).exists())
+        for photo in Photo.objects.all():
+            self.assertTrue(photo.public_image.name.startswith('photos/public/'))
+
+    def test_bulk_on_given_ids_only(self):
+        result = services.bulk_set_consent_status(
+            self.subject, ConsentRequest.StatusChoices.DENIED, ids=[self.requests[0].id]
+        )
+        # A denial of a pending request changes no mask: nothing to render.
+        self.assertEqual(result, {'updated': 1, 'photos_regenerated': 0, 'photos_pending': 0})
+        self.assertEqual(services.get_consent_counts(self.subject), {'PENDING': 2, 'APPROVED': 0, 'DENIED': 1})
+
+    def test_repeated_bulk_is_a_no_op(self):
+        services.bulk_set_consent_status(self.subject, ConsentRequest.StatusChoices.APPROVED)
+        result = services.bulk_set_consent_status(self.subject, ConsentRequest.StatusChoices.APPROVED)
+        self.assertEqual(result, {'updated': 0, 'photos_regenerated': 0, 'photos_pending': 0})
+
+    def test_bulk_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.subject)
+        response = client.post(
+            '/api/consent-requests/bulk/', {'status': 'APPROVED', 'all_pending': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(response.data['counts']['APPROVED'], 3)
+
+    def test_change_during_render_keeps_photo_marked(self):
+        photo = self.photos[0]
+        Photo.objects.filter(pk=photo.pk).update(render_pending=True, consent_version=F('consent_version') + 1)
+        draw_masks = services._draw_masks
+
+        def draw_while_consent_changes(*args, **kwargs):
+            Photo.objects.filter(pk=photo.pk).update(render_pending=True, consent_version=F('consent_version') + 1)
+            return draw_masks(*args, **kwargs)
+
+        with mock.patch.object(services, '_draw_masks', side_effect=draw_while_consent_changes):
+            self.assertTrue(services._regenerate_public_image(Photo.objects.get(pk=photo.pk)))
+        self.assertTrue(Photo.objects.get(pk=photo.pk).render_pending)
+
+        self.assertEqual(services.render_pending_photos(), 1)
+        self.assertFalse(Photo.objects.get(pk=photo.pk).render_pending)
+
+
+class PhotoListTests(TestCase):
+    def test_photo_list_is_paginated(self):
+        uploader = make_user('uploader')
+        for _ in range(3):
+            make_photo(uploader)
+        client = APIClient()
+        client.force_authenticate(uploader)
+        response = client.get('/api/photos/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_consent_request_list_is_a_plain_list(self):
+        uploader, subject = make_user('uploader'), make_user('subject')
+        ConsentRequest.objects.create(photo=make_photo(uploader), requested_user=subject, bounding_box='0,0,1,1')
+        client = APIClient()
+        client.force_authenticate(subject)
+        response = client.get('/api/consent-requests/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class UploadLimitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('uploader'))
+
+    def upload(self, content):
+        image = SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')
+        return self.client.post('/api/photos/', {'original_image': image, 'caption': 'hi'}, format='multipart')
+
+    @override_settings(MAX_UPLOAD_BYTES=2000)
+    def test_upload_over_max_bytes_is_413(self):
+        noise = Image.fromarray(np.random.default_rng(0).integers(0, 255, (200, 200, 3), dtype=np.uint8))
+        buffer = BytesIO()
+        noise.save(buffer, format='JPEG')
+        self.assertGreater(len(buffer.getvalue()), 2000)
+
+        response = self.upload(buffer.getvalue())
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Photo.objects.exists())
+
+    @override_settings(MAX_IMAGE_PIXELS=1000)
+    def test_image_over_max_pixels_is_rejected_before_decoding(self):
+        with mock.patch('PIL.Image.Image.convert') as convert:
+            response = self.upload(jpeg_bytes(size=(64, 48)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pixels', str(response.data['original_image']))
+        convert.assert_not_called()
+        self.assertFalse(Photo.objects.exists())
+
+    def test_not_an_image_is_rejected(self):
+        response = self.upload(b'GIF89a but not really')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Photo.objects.exists())
+
+
+class EmbeddingStoreTests(EmbeddingStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = services.get_embedding_store()
+        self.uploader = make_user('uploader')
+        self.photo = make_photo(self.uploader)
+
+    def test_append_and_iter_chunks(self):
+        vectors = np.random.default_rng(0).random((5, 128), dtype=np.float32)
+        self.store.append([1, 2, 3], vectors[:3])
+        self.store.append([4, 5], vectors[3:])
+
+        self.assertEqual(len(self.store), 5)
+        chunks = list(self.store.iter_chunks(2))
+        self.assertEqual([list(ids) for ids, _ in chunks], [[1, 2], [3, 4], [5]])
+        np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in chunks]), vectors)
+
+    def test_append_rejects_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            self.store.append([1, 2], np.zeros((1, 128)))
+
+    def test_torn_tail_is_ignored_and_overwritten(self):
+        self.store.append([1], np.ones((1, 128)))
+        with open(self.store.vectors_path, 'ab') as vectors_file:
+            vectors_file.write(b'\0' * 100)  # A crash mid-append.
+        self.assertEqual(len(self.store), 1)
+        self.store.append([2], np.full((1, 128), 2.0))
+        self.assertEqual(list(self.store.ids()), [1, 2])
+        self.assertEqual(self.store.vectors()[1, 0], 2.0)
+
+    def test_rebuild_and_count_missing(self):
+        faces = [make_face(self.photo, unit(np.arange(i, i + 128))) for i in range(1, 4)]
+        self.store.append([faces[0].id, 999999], np.zeros((2, 128)))
+        self.assertEqual(self.store.count_missing(), 2)
+
+        self.assertEqual(self.store.rebuild(), 3)
+        self.assertEqual(self.store.count_missing(), 0)
+        self.assertEqual(list(self.store.ids()), [face.id for face in faces])
+        np.testing.assert_array_equal(self.store.vectors()[2], faces[2].encoding_array)
+
+    def test_rematch_rebuilds_a_store_missing_faces(self):
+        friend = make_user('friend', unit(np.arange(1, 129)))
+        face = make_face(self.photo, at_distance(friend.face_encoding, 0.1, 0))
+        self.assertEqual(len(self.store), 0)
+
+        stats = services.rematch_faces(regenerate=False)
+        self.assertTrue(stats['store_rebuilt'])
+        self.assertEqual(stats['scanned'], 1)
+        face.refresh_from_db()
+        self.assertEqual(face.matched_user_id, friend.id)
+        self.assertFalse(services.rematch_faces(regenerate=False)['store_rebuilt'])
+
+    def test_find_matching_faces(self):
+        target = unit(np.arange(1, 129))
+        near = make_face(self.photo, at_distance(target, 0.2, 0))
+        make_face(self.photo, unit(np.arange(128, 0, -1)))
+        self.store.rebuild()
+
+        face_ids, distances = find_matching_faces(target, chunk_size=1)
+        self.assertEqual(list(face_ids), [near.id])
+        np.testing.assert_allclose(distances, [0.2], atol=1e-5)
+        self.assertEqual(len(find_matching_faces(np.zeros(128))[0]), 0)
+
+
+Status = ConsentRequest.StatusChoices
+
+
+def bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+
+class ConsentCounterTests(TestCase):
+    def setUp(self):
+        self.uploader = make_user('uploader')
+        self.subject = make_user('subject')
+        self.photo = make_photo(self.uploader)
+
+    def request(self, status=Status.PENDING):
+        return ConsentRequest.objects.create(
+            photo=self.photo, requested_user=self.subject, status=status, bounding_box='0,0,1,1'
+        )
+
+    def counts(self):
+        return services.get_consent_counts(self.subject)
+
+    def test_missing_counter_is_recounted(self):
+        self.request()
+        self.request(Status.APPROVED)
+        self.assertFalse(ConsentCounter.objects.filter(user=self.subject).exists())
+        services.adjust_consent_counters([(self.subject.id, None, Status.PENDING)])
+        self.assertEqual(self.counts(), {'PENDING': 1, 'APPROVED': 1, 'DENIED': 0})
+
+    def test_new_changed_and_deleted_requests(self):
+        services.recount_consent_counters([self.subject.id])
+        self.assertEqual(self.counts(), {'PENDING': 0, 'APPROVED': 0, 'DENIED': 0})
+
+        services.adjust_consent_counters([(self.subject.id, None, Status.PENDING)] * 3)
+        self.assertEqual(self.counts(), {'PENDING': 3, 'APPROVED': 0, 'DENIED': 0})
+
+        services.adjust_consent_counters([
+            (self.subject.id, Status.PENDING, Status.APPROVED),
+            (self.subject.id, Status.PENDING, Status.DENIED),
+            (self.subject.id, Status.APPROVED, Status.APPROVED),
+        ])
+        self.assertEqual(self.counts(), {'PENDING': 1, 'APPROVED': 1, 'DENIED': 1})
+
+        services.adjust_consent_counters([(self.subject.id, Status.DENIED, None)])
+        self.assertEqual(self.counts(), {'PENDING': 1, 'APPROVED': 1, 'DENIED': 0})
+
+    def test_no_op_changes_leave_no_counter(self):
+        services.adjust_consent_counters([(self.subject.id, Status.PENDING, Status.PENDING)])
+        self.assertFalse(ConsentCounter.objects.filter(user=self.subject).exists())
+
+    def test_changed_users_are_notified_on_commit(self):
+        services.recount_consent_counters([self.subject.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            services.adjust_consent_counters([(self.subject.id, None, Status.PENDING)])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_deleting_a_photo_updates_the_counter(self):
+        self.request()
+        services.recount_consent_counters([self.subject.id])
+        client = APIClient()
+        client.force_authenticate(self.uploader)
+        self.assertEqual(client.delete(f'/api/photos/{self.photo.id}/').status_code, 204)
+        self.assertEqual(self.counts(), {'PENDING': 0, 'APPROVED': 0, 'DENIED': 0})
+
+
+@override_settings(CONSENT_STREAM_MAX_SECONDS=0.2, CONSENT_STREAM_HEARTBEAT_SECONDS=0.1)
+class ConsentStreamTests(TestCase):
+    def setUp(self):
+        self.subject = make_user('subject')
+        ConsentRequest.objects.create(
+            photo=make_photo(make_user('uploader')), requested_user=self.subject, bounding_box='0,0,1,1'
+        )
+
+    def ticket(self):
+        # Browsers send no CSRF token with it: the Authorization header is the credential.
+        response = Client(enforce_csrf_checks=True).post('/api/consent-requests/stream/ticket/', **bearer(self.subject))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['ticket']
+
+    async def read_stream(self, query):
+        response = await AsyncClient().get(f'/api/consent-requests/stream/?{query}')
+        if response.status_code != 200:
+            return response.status_code, ''
+        return 200, ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+    def test_ticket_needs_an_access_token(self):
+        self.assertEqual(Client().post('/api/consent-requests/stream/ticket/').status_code, 401)
+        self.assertEqual(Client().get('/api/consent-requests/stream/ticket/', **bearer(self.subject)).status_code, 405)
+
+    async def test_stream_opens_once_per_ticket(self):
+        ticket = await sync_to_async(self.ticket)()
+        status, body = await self.read_stream(f'ticket={ticket}')
+        self.assertEqual(status, 200)
+        self.assertIn('event: summary\ndata: {"PENDING": 1, "APPROVED": 0, "DENIED": 0}', body)
+
+        self.assertEqual((await self.read_stream(f'ticket={ticket}'))[0], 401)
+
+    async def test_stream_rejects_access_tokens_and_forged_tickets(self):
+        token = AccessToken.for_user(self.subject)
+        self.assertEqual((await self.read_stream(f'token={token}'))[0], 401)
+        self.assertEqual((await self.read_stream(f'ticket={token}'))[0], 401)
+        self.assertEqual((await self.read_stream('ticket=')), (401, ''))
+
+    @override_settings(CONSENT_STREAM_TICKET_SECONDS=0)
+    async def test_expired_ticket(self):
+        ticket = await sync_to_async(self.ticket)()
+        await asyncio.sleep(1.1)
+        self.assertEqual((await self.read_stream(f'ticket={ticket}'))[0], 401)
+
+    def test_stream_needs_asgi(self):
+        response = Client().get(f'/api/consent-requests/stream/?ticket={self.ticket()}')
+        self.assertEqual(response.status_code, 501)
+
+
+class PersistedEncodingTests(MediaTestCase, EmbeddingStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+        self.face_encoding = unit(np.arange(1, 129))
+        self.detector = stub_face_stack(self, self.face_encoding)
+
+    def test_processing_stores_each_encoding(self):
+        photo = make_photo(self.uploader, status=Photo.StatusChoices.PROCESSING, with_original=True)
+        services.process_photo_for_faces(photo.id)
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.StatusChoices.READY)
+        face = DetectedFace.objects.get(photo=photo)
+        self.assertEqual(face.bounding_box, '2,2,22,22')
+        self.assertEqual(face.detector_version, services.pipeline_version('fake-1'))
+        np.testing.assert_array_equal(face.encoding_array, self.face_encoding)
+        store = services.get_embedding_store()
+        self.assertEqual(list(store.ids()), [face.id])
+
+    def test_rematch_uses_stored_encodings_only(self):
+        photo = make_photo(self.uploader, status=Photo.StatusChoices.PROCESSING, with_original=True)
+        services.process_photo_for_faces(photo.id)
+        self.assertIsNone(DetectedFace.objects.get(photo=photo).matched_user)
+
+        # Someone whose face it is signs up later.
+        friend = make_user('friend', self.face_encoding)
+        self.detector.calls = 0
+        with mock.patch.object(services.recognition, 'load_image_file', side_effect=AssertionError('decoded')):
+            stats = services.rematch_faces(regenerate=False)
+
+        self.assertEqual(self.detector.calls, 0)
+        self.assertEqual((stats['changed'], stats['consent_requests']), (1, 1))
+        self.assertEqual(DetectedFace.objects.get(photo=photo).matched_user, friend)
+        self.assertTrue(ConsentRequest.objects.filter(photo=photo, requested_user=friend).exists())
+
+
+class ContentDedupTests(MediaTestCase, EmbeddingStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.uploader = make_user('uploader')
+        self.detector = stub_face_stack(self, unit(np.arange(1, 129)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.uploader)
+
+    def upload(self, content):
+        image = SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')
+        response = self.client.post('/api/photos/', {'original_image': image}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Photo.objects.get(id=response.data['id'])
+
+    def test_identical_uploads_share_one_blob_and_one_detection(self):
+        first = self.upload(jpeg_bytes())
+        second = self.upload(jpeg_bytes())
+
+        blob = ContentBlob.objects.get()
+        self.assertEqual((first.content_blob, second.content_blob), (blob, blob))
+        self.assertEqual(first.original_image.name, second.original_image.name)
+        self.assertEqual((blob.width, blob.height), (64, 48))
+        self.assertEqual(blob.detection_source, first)
+        self.assertEqual(self.detector.calls, 1)
+        # The reused detection still gives the repost its own faces and render.
+        self.assertEqual(DetectedFace.objects.filter(photo=second).count(), 1)
+        self.assertEqual(second.status, Photo.StatusChoices.READY)
+
+    def test_different_bytes_get_their_own_blob(self):
+        self.upload(jpeg_bytes(color=(0, 0, 0)))
+        self.upload(jpeg_bytes(color=(255, 255, 255)))
+        self.assertEqual(ContentBlob.objects.count(), 2)
+        self.assertEqual(self.detector.calls, 2)
+
+    def test_detection_by_another_detector_is_not_reused(self):
+        first = self.upload(jpeg_bytes())
+        ContentBlob.objects.update(detector_version='other-1')
+        self.upload(jpeg_bytes())
+        self.assertEqual(self.detector.calls, 2)
+        self.assertNotEqual(ContentBlob.objects.get().detection_source, first)
+
+    def test_store_content_blob_hashes_when_no_digest_is_given(self):
+        content = jpeg_bytes()
+        blob, created = services.store_content_blob(SimpleUploadedFile('a.jpg', content))
+        again, created_again = services.store_content_blob(SimpleUploadedFile('b.jpg', content))
+        self.assertEqual((created, created_again), (True, False))
+        self.assertEqual(blob, again)
+        self.assertEqual(blob.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(blob.file.read(), content)
+
+
+class ScriptedDetector(detectors.FaceDetector):
+    """A backend whose results are set by the test, per class."""
+    results = ([], [])
+    calls = 0
+
+    def _detect(self, image, upsample):
+        type(self).calls += 1
+        type(self).last_shape = image.shape
+        return self.results
+
+
+class Cheap(ScriptedDetector):
+    pass
+
+
+class Better(ScriptedDetector):
+    results = ([(5, 15, 15, 5)], [0.99])
+
+
+@override_settings(FACE_DETECTOR_CASCADE=['cheap', 'better'], FACE_DETECTOR_CASCADE_MIN_SCORE=0.5)
+class DetectorCascadeTests(TestCase):
+    image = np.zeros((40, 60, 3), dtype=np.uint8)
+
+    def setUp(self):
+        registry = mock.patch.dict(detectors.DETECTORS, {'cheap': Cheap, 'better': Better})
+        registry.start()
+        self.addCleanup(registry.stop)
+        for backend in (Cheap, Better):
+            backend.name, backend.calls = backend.__name__.lower(), 0
+        Cheap.results = ([], [])
+        detectors.get_detector.cache_clear()
+        self.addCleanup(detectors.get_detector.cache_clear)
+
+    def detect(self):
+        return detectors.get_detector('cascade').detect(self.image)
+
+    def test_confident_first_stage_wins(self):
+        Cheap.results = ([(1, 11, 11, 1)], [0.9])
+        self.assertEqual(self.detect(), Detections([(1, 11, 11, 1)], [0.9], 'cheap-1'))
+        self.assertEqual((Cheap.calls, Better.calls), (1, 0))
+
+    def test_unsure_first_stage_escalates(self):
+        Cheap.results = ([(1, 11, 11, 1), (20, 30, 30, 20)], [0.9, 0.2])
+        self.assertEqual(self.detect(), Detections([(5, 15, 15, 5)], [0.99], 'better-1'))
+        self.assertEqual((Cheap.calls, Better.calls), (1, 1))
+
+    def test_no_face_escalates_only_if_configured(self):
+        self.assertEqual(self.detect().detector, 'cheap-1')
+        with override_settings(FACE_DETECTOR_CASCADE_ESCALATE_ON_EMPTY=True):
+            detectors.get_detector.cache_clear()
+            self.assertEqual(self.detect().detector, 'better-1')
+
+    def test_cascade_accepts_results_of_every_stage(self):
+        self.assertEqual(detectors.get_detector('cascade').ids, {'cheap-1', 'better-1'})
+
+    def test_large_images_are_detected_downscaled(self):
+        with override_settings(FACE_DETECTOR_MAX_SIDE=30):
+            result = detectors.get_detector('better').detect(self.image)
+        self.assertEqual(Better.last_shape[:2], (20, 30))
+        # Boxes come back in the coordinates of the full-size image.
+        self.assertEqual(result.locations, [(10, 30, 30, 10)])
+
+    def test_misconfiguration(self):
+        with self.assertRaises(ImproperlyConfigured):
+            detectors.get_detector('no-such-detector')
+        with override_settings(FACE_DETECTOR_CASCADE=['cheap', 'cascade']), self.assertRaises(ImproperlyConfigured):
+            detectors.get_detector('cascade')
+
+
+class MatchEncodingsTests(TestCase):
+    tolerance = services.FACE_MATCH_TOLERANCE
+    margin = services.FACE_MATCH_BORDERLINE_MARGIN
+
+    def setUp(self):
+        self.alice = unit(np.arange(1, 129))
+        self.bob = unit(np.arange(128, 0, -1))
+        self.gallery = np.stack([self.alice, self.bob])
+
+    def test_nearest_centroid_within_tolerance(self):
+        faces = [at_distance(self.alice, 0.1, 0), at_distance(self.bob, 0.1, 5)]
+        self.assertEqual(services.match_encodings(faces, self.gallery).tolist(), [0, 1])
+
+    def test_beyond_tolerance_is_unmatched(self):
+        face = at_distance(self.alice, self.tolerance + self.margin + 0.1, 0)
+        self.assertEqual(services.match_encodings([face], self.gallery).tolist(), [-1])
+
+    def test_empty_inputs(self):
+        self.assertEqual(services.match_encodings(np.empty((0, 128)), self.gallery).tolist(), [])
+        self.assertEqual(services.match_encodings([self.alice], np.empty((0, 128))).tolist(), [-1])
+
+    def test_borderline_rejected_by_enrolment_set(self):
+        # Just inside the tolerance of the centroid, but far from every sample.
+        face = at_distance(self.alice, self.tolerance - self.margin / 2, 0)
+        samples = np.stack([at_distance(self.alice, 0.5, 1), at_distance(self.alice, -0.5, 1)])
+        loaded = []
+
+        def load_enrolments(indices):
+            loaded.extend(indices)
+            return {0: samples}
+
+        self.assertEqual(services.match_encodings([face], self.gallery).tolist(), [0])
+        self.assertEqual(
+            services.match_encodings([face], self.gallery, load_enrolments=load_enrolments).tolist(), [-1]
+        )
+        self.assertEqual(loaded, [0])
+
+    def test_borderline_accepted_by_enrolment_set(self):
+        # Just outside the tolerance of the centroid, but close to one sample.
+        face = at_distance(self.alice, self.tolerance + self.margin / 2, 0)
+        samples = np.stack([at_distance(self.alice, self.tolerance + self.margin / 2 - 0.05, 0), self.alice])
+
+        self.assertEqual(services.match_encodings([face], self.gallery).tolist(), [-1])
+        self.assertEqual(
+            services.match_encodings([face], self.gallery, load_enrolments=lambda _: {0: samples}).tolist(), [0]
+        )
+
+    def test_single_sample_set_keeps_centroid_decision(self):
+        inside = at_distance(self.alice, self.tolerance - self.margin / 2, 0)
+        outside = at_distance(self.alice, self.tolerance + self.margin / 2, 0)
+        far_sample = {0: at_distance(self.alice, 0.5, 1)[None, :]}
+        matches = services.match_encodings([inside, outside], self.gallery, load_enrolments=lambda _: far_sample)
+        self.assertEqual(matches.tolist(), [0, -1])
+
+    def test_clear_cases_skip_enrolments(self):
+        def load_enrolments(indices):
+            raise AssertionError(f"loaded enrolments for {indices}")
+
+        faces = [self.alice, at_distance(self.alice, self.tolerance + self.margin + 0.1, 0)]
+        matches = services.match_encodings(faces, self.gallery, load_enrolments=load_enrolments)
+        self.assertEqual(matches.tolist(), [0, -1])
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.small = make_user('small')
+        self.big = make_user('big')
+        self.stranger = make_user('stranger')
+        follow_user(self.reader, self.small)
+        follow_user(self.reader, self.big)
+        follow_user(self.stranger, self.big)
+
+    def post(self, uploader):
+        photo = make_photo(uploader)
+        uploader.refresh_from_db()
+        services.fan_out_photo(photo)
+        return photo.id
+
+    def page_ids(self, **kwargs):
+        rows, has_more = services.get_timeline_page(self.reader, **kwargs)
+        return [row['photo_id'] for row in rows], has_more
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_merges_fanned_out_and_fanned_in_photos(self):
+        own = self.post(self.reader)
+        small = self.post(self.small)
+        big = self.post(self.big)
+        self.post(self.stranger)
+
+        # `big` has 2 followers, over the limit: no entries were written for it.
+        self.assertFalse(TimelineEntry.objects.filter(uploader=self.big).exclude(user=self.big).exists())
+        self.assertEqual(self.page_ids(), ([big, small, own], False))
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_cursor_pages_have_no_gaps_or_duplicates(self):
+        posted = [self.post(uploader) for uploader in [self.small, self.big, self.reader] * 4]
+        seen, before = [], None
+        while True:
+            ids, has_more = self.page_ids(before=before, limit=5)
+            seen += ids
+            if not has_more:
+                break
+            before = ids[-1]
+        self.assertEqual(seen, sorted(posted, reverse=True))
+
+    def test_failed_photos_leave_the_timeline(self):
+        kept = self.post(self.small)
+        failed = Photo.objects.get(id=self.post(self.small))
+        failed.status = Photo.StatusChoices.FAILED
+        failed.save()
+        services.sync_feed_item(failed)
+        self.assertEqual(self.page_ids(), ([kept], False))
+
+    def test_backfill_on_follow(self):
+        newcomer = make_user('newcomer')
+        photo_id = self.post(self.small)
+        follow_user(newcomer, self.small)
+        self.small.refresh_from_db()
+        services.backfill_timeline(newcomer, self.small)
+        rows, _ = services.get_timeline_page(newcomer)
+        self.assertEqual([row['photo_id'] for row in rows], [photo_id])
+
+
+class LikeTests(TestCase):
+    def setUp(self):
+        self.uploader = make_user('uploader')
+        self.fan = make_user('fan')
+        self.photo = make_photo(self.uploader)
+
+    def like_count(self):
+        return FeedItem.objects.get(photo=self.photo).like_count
+
+    def test_like_is_idempotent(self):
+        self.assertTrue(like_photo(self.fan, self.photo.id))
+        self.assertFalse(like_photo(self.fan, self.photo.id))
+        self.assertEqual(Like.objects.filter(photo=self.photo).count(), 1)
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(liked_photo_ids(self.fan, [self.photo.id]), {self.photo.id})
+
+    def test_unlike_is_idempotent(self):
+        like_photo(self.fan, self.photo.id)
+        self.assertTrue(unlike_photo(self.fan, self.photo.id))
+        self.assertFalse(unlike_photo(self.fan, self.photo.id))
+        self.assertFalse(Like.objects.filter(photo=self.photo).exists())
+        self.assertEqual(self.like_count(), 0)
+
+    def test_unlike_without_like_leaves_count_alone(self):
+        like_photo(self.uploader, self.photo.id)
+        self.assertFalse(unlike_photo(self.fan, self.photo.id))
+        self.assertEqual(self.like_count(), 1)
+
+    def test_like_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.fan)
+        url = f'/api/photos/{self.photo.id}/like/'
+
+        for _ in range(2):
+            response = client.post(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {'liked': True, 'like_count': 1})
+        for _ in range(2):
+            response = client.delete(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {'liked': False, 'like_count': 0})
+
+    def test_like_endpoint_unknown_photo(self):
+        client = APIClient()
+        client.force_authenticate(self.fan)
+        self.assertEqual(client.post('/api/photos/999999/like/').status_code, 404)
+
+
+@override_settings(FEED_COUNTER_WRITE_BEHIND=True)
+class WriteBehindCounterTests(TestCase):
+    def setUp(self):
+        # A buffer of our own, flushed by the test instead of a thread.
+        self.buffer = counters.WriteBehindCounters()
+        self.buffer._thread = mock.Mock()
+        patcher = mock.patch.object(counters, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.uploader = make_user('uploader')
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+        self.photo = make_photo(self.uploader)
+
+    def stored_like_count(self, photo=None):
+        return FeedItem.objects.get(photo=photo or self.photo).like_count
+
+    def like(self, user, photo=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            like_photo(user, (photo or self.photo).id)
+
+    def test_likes_are_buffered_until_flushed(self):
+        for fan in self.fans:
+            self.like(fan)
+        with self.captureOnCommitCallbacks(execute=True):
+            unlike_photo(self.fans[0], self.photo.id)
+
+        self.assertEqual(self.stored_like_count(), 0)
+        self.assertEqual(self.buffer.pending_likes(self.photo.id), 2)
+        self.assertEqual(services.get_feed_like_count(self.photo.id), 2)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), (1, 0))
+        self.assertEqual(self.stored_like_count(), 2)
+        self.assertEqual(self.buffer.pending_likes(self.photo.id), 0)
+        self.assertEqual(services.get_feed_like_count(self.photo.id), 2)
+
+    def test_like_is_buffered_only_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            like_photo(self.fans[0], self.photo.id)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.buffer.pending_likes(self.photo.id), 0)
+
+    def test_one_update_for_many_photos(self):
+        other = make_photo(self.uploader)
+        self.like(self.fans[0])
+        self.like(self.fans[1], other)
+        self.like(self.fans[2], other)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), (2, 0))
+        self.assertEqual((self.stored_like_count(), self.stored_like_count(other)), (1, 2))
+
+    def test_failed_flush_keeps_deltas(self):
+        self.like(self.fans[0])
+        with mock.patch.object(FeedItem.objects, 'filter', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.buffer.flush(), (0, 0))
+        self.assertEqual(self.buffer.pending_likes(self.photo.id), 1)
+        self.buffer.flush()
+        self.assertEqual(self.stored_like_count(), 1)
+
+    def test_comment_previews_are_coalesced(self):
+        with mock.patch.object(services, 'write_feed_comments') as write_feed_comments:
+            for fan in self.fans:
+                with self.captureOnCommitCallbacks(execute=True):
+                    Comment.objects.create(user=fan, photo=self.photo, text='nice')
+                    services.refresh_feed_comments(self.photo.id)
+            self.assertEqual(self.buffer.flush(), (0, 1))
+        write_feed_comments.assert_called_once_with(self.photo.id)
+
+    def test_reconcile_skips_photos_with_buffered_unlikes(self):
+        drifted = make_photo(self.uploader)
+        FeedItem.objects.filter(photo=drifted).update(like_count=7)
+        Like.objects.create(user=self.fans[0], photo=self.photo)
+        FeedItem.objects.filter(photo=self.photo).update(like_count=1)
+        # The unlike leaves no Like row behind; only the touch mark shows it.
+        with self.captureOnCommitCallbacks(execute=True):
+            unlike_photo(self.fans[0], self.photo.id)
+        self.assertEqual(counters.recently_touched([self.photo.id, drifted.id]), {self.photo.id})
+
+        self.assertEqual(services.reconcile_feed_counters(settle_seconds=0), 1)
+        self.assertEqual(self.stored_like_count(drifted), 0)
+        self.buffer.flush()
+        self.assertEqual(self.stored_like_count(), 0)
+
+        cache.clear()
+        self.assertEqual(services.reconcile_feed_counters(settle_seconds=0), 0)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.uploader = make_user('uploader')
+        self.photos = [make_photo(self.uploader) for _ in range(5)]
+        # Per request: Django 4.2's AsyncClient drops headers given to its constructor.
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'}
+
+    async def get(self, path, authenticated=True, **params):
+        response = await AsyncClient().get(path, params, headers=self.headers if authenticated else None)
+        return response.status_code, response.json()
+
+    async def test_feed_pages(self):
+        await sync_to_async(like_photo)(self.reader, self.photos[3].id)
+        newest_first = [photo.id for photo in reversed(self.photos)]
+
+        status, page = await self.get('/api/photos/feed/', page_size=2)
+        self.assertEqual(status, 200)
+        self.assertEqual([item['id'] for item in page['results']], newest_first[:2])
+        self.assertEqual([item['liked_by_me'] for item in page['results']], [False, True])
+        self.assertEqual(page['results'][1]['like_count'], 1)
+        self.assertEqual(page['next'], f'http://testserver/api/photos/feed/?before={newest_first[1]}&page_size=2')
+
+        seen = []
+        next_url = 'http://testserver/api/photos/feed/?page_size=2'
+        while next_url:
+            status, page = await self.get(next_url.removeprefix('http://testserver'))
+            seen += [item['id'] for item in page['results']]
+            next_url = page['next']
+        self.assertEqual(seen, newest_first)
+
+    async def test_feed_needs_auth_and_integers(self):
+        self.assertEqual((await self.get('/api/photos/feed/', authenticated=False))[0], 401)
+        status, body = await self.get('/api/photos/feed/', before='latest')
+        self.assertEqual(status, 400)
+        self.assertIn('before', body['detail'])
+        self.assertEqual((await AsyncClient().post('/api/photos/feed/', headers=self.headers)).status_code, 405)
+
+    async def test_timeline_follows_anyone(self):
+        status, page = await self.get('/api/photos/timeline/')
+        self.assertEqual((status, page['results'], page['follows_anyone']), (200, [], False))
+
+        await sync_to_async(follow_user)(self.reader, self.uploader)
+        await sync_to_async(services.backfill_timeline)(self.reader, self.uploader)
+        status, page = await self.get('/api/photos/timeline/', page_size=10)
+        self.assertTrue(page['follows_anyone'])
+        self.assertEqual([item['id'] for item in page['results']], [photo.id for photo in reversed(self.photos)])
+
+    async def test_photo_status(self):
+        processing = await sync_to_async(make_photo)(self.uploader, status=Photo.StatusChoices.PROCESSING)
+        ready = self.photos[0]
+        await Photo.objects.filter(id__in=[ready.id, processing.id]).aupdate(public_image='photos/public/x.jpg')
+
+        status, body = await self.get('/api/photos/status/', ids=f'{ready.id},{processing.id},999999')
+        self.assertEqual(status, 200)
+        results = {row['id']: row for row in body['results']}
+        self.assertEqual(set(results), {ready.id, processing.id})
+        self.assertEqual(results[ready.id]['status'], 'READY')
+        self.assertTrue(results[ready.id]['public_image'].endswith('photos/public/x.jpg'))
+        self.assertEqual((results[processing.id]['status'], results[processing.id]['public_image']), ('PROCESSING', None))
+
+        self.assertEqual((await self.get('/api/photos/status/', ids='1,two'))[0], 400)
+
+    async def test_consent_summary(self):
+        await ConsentRequest.objects.acreate(photo=self.photos[0], requested_user=self.reader, bounding_box='0,0,1,1')
+        status, body = await self.get('/api/consent-requests/summary/')
+        self.assertEqual((status, body), (200, {'PENDING': 1, 'APPROVED': 0, 'DENIED': 0}))
+        self.assertEqual((await self.get('/api/consent-requests/summary/', authenticated=False))[0], 401)
+
+
+class MediaServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ['photos/public/masked.jpg', 'photos/originals/raw.jpg', 'blobs/ab/abcdef.jpg']:
+            path = Path(settings.MEDIA_ROOT, name)
+            path.parent.mkdir(parents=True)
+            path.write_bytes(jpeg_bytes())
+
+    def get(self, path):
+        return Client().get(f'/media/{path}')
+
+    def test_only_public_prefixes_are_served(self):
+        for mode in ['django', 'x-accel', 'sendfile']:
+            with self.subTest(mode=mode), override_settings(MEDIA_SERVE_MODE=mode):
+                for path in ['photos/originals/raw.jpg', 'blobs/ab/abcdef.jpg', 'photos/public/../originals/raw.jpg']:
+                    self.assertEqual(self.get(path).status_code, 404, path)
+                self.assertEqual(self.get('photos/public/missing.jpg').status_code, 404)
+                self.assertEqual(self.get('photos/public/masked.jpg').status_code, 200)
+
+    @override_settings(MEDIA_SERVE_MODE='django')
+    def test_django_mode_streams_the_file(self):
+        response = self.get('photos/public/masked.jpg')
+        self.assertEqual(b''.join(response.streaming_content), jpeg_bytes())
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_x_accel_mode_hands_off_to_nginx(self):
+        response = self.get('photos/public/masked.jpg')
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-media/photos/public/masked.jpg')
+        self.assertEqual(response.headers['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SERVE_MODE='sendfile')
+    def test_sendfile_mode(self):
+        response = self.get('photos/public/masked.jpg')
+        self.assertEqual(response.headers['X-Sendfile'], str(Path(settings.MEDIA_ROOT, 'photos/public/masked.jpg')))
+
+    @override_settings(MEDIA_SERVE_MODE='off')
+    def test_off_mode_routes_nothing(self):
+        from core.media import media_urlpatterns
+        self.assertEqual(media_urlpatterns(), [])
+
+
+@override_settings(METRICS_TOKEN='scrape-secret', METRICS_ALLOWED_IPS=['10.0.0.5'])
+class MetricsAccessTests(TestCase):
+    def get(self, client=None, **extra):
+        return (client or Client()).get('/metrics', REMOTE_ADDR=extra.pop('REMOTE_ADDR', '203.0.113.9'), **extra)
+
+    def test_token(self):
+        with span('detection'):
+            pass
+        response = self.get(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('photo_stage_duration_seconds_count{stage="detection"}', response.content.decode())
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_allowed_ip(self):
+        self.assertEqual(self.get(REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    def test_staff_only(self):
+        client = Client()
+        client.force_login(make_user('member'))
+        self.assertEqual(self.get(client).status_code, 403)
+        client.force_login(make_user('operator', is_staff=True))
+        self.assertEqual(self.get(client).status_code, 200)
+
+    def test_anonymous_is_forbidden(self):
+        self.assertEqual(self.get().status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            # No token configured: an empty bearer must not match it.
+            self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
@@ -0,0 +1,122 @@
+# backend/photos/uploads.py
+
+import hashlib
+import logging
+
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+logger = logging.getLogger('photos')
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    First handler in FILE_UPLOAD_HANDLERS.
+
+    It sees every chunk as it arrives from the client, so it can:
+      - hash the file while it streams in (no second read to dedupe it), and
+      - abort the upload as soon as it exceeds MAX_UPLOAD_BYTES, before the
+        rest of the body is buffered to memory or disk.
+
+    Chunks are passed through untouched to the next handler, which builds
+    the actual UploadedFile. Digests end up in `request.upload_digests`,
+    keyed by form field name; the name of a field whose file was cut off for
+    size goes in `request.upload_too_large`, so `LimitedMultiPartParser` can
+    answer 413 instead of the request looking like it had no file.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_BYTES:
+            logger.warning(f"[Upload] Aborted '{self.field_name}': exceeds {settings.MAX_UPLOAD_BYTES} bytes.")
+            self.request.upload_too_large = self.field_name
+            # The rest of the body is read and discarded, not stored, so the
+            # client still receives the error response.
+            raise StopUpload(connection_reset=False)
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_digests'):
+            self.request.upload_digests = {}
+        self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler return the file object.
+        return None
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """MultiPartParser that fails with 413 when HashingUploadHandler cut a file off."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        request = (parser_context or {}).get('request')
+        field_name = getattr(request, 'upload_too_large', None)
+        if field_name:
+            raise UploadTooLarge(
+                f"'{field_name}' is larger than the maximum of {settings.MAX_UPLOAD_BYTES} bytes."
+            )
+        return result
+
+
+def decode_image_upload(upload):
+    """
+    Validate an uploaded image and decode it exactly once.
+
+    The header is read first, so oversized images (decompression bombs) are
+    rejected before any pixels are decoded. The decoded RGB array is attached
+    to the upload as `upload.decoded_image`, along with `upload.image_width`
+    and `upload.image_height`, so face detection can use it directly instead
+    of reading the file back from storage.
+
+    Raises:
+        serializers.ValidationError: if the file is too big or not an image
+    """
+    if upload.size > settings.MAX_UPLOAD_BYTES:
+        raise serializers.ValidationError(
+            f"Image is too large ({upload.size} bytes). The maximum is {settings.MAX_UPLOAD_BYTES} bytes."
+        )
+
+    try:
+        upload.seek(0)
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            raise serializers.ValidationError(
+                f"Image dimensions {width}x{height} exceed the maximum of {settings.MAX_IMAGE_PIXELS} pixels."
+            )
+        # Same conversion face_recognition.load_image_file does.
+        decoded = np.array(image.convert('RGB'))
+    except serializers.ValidationError:
+        raise
+    except Image.DecompressionBombError:
+        raise serializers.ValidationError(
+            f"Image dimensions exceed the maximum of {settings.MAX_IMAGE_PIXELS} pixels."
+        )
+    except Exception as e:
+        logger.warning(f"[Upload] Rejected '{upload.name}': not a valid image ({e}).")
+        raise serializers.ValidationError(
+            "Upload a valid image. The file you uploaded was either not an image or a corrupted image."
+        )
+    finally:
+        upload.seek(0)
+
+    upload.decoded_image = decoded
+    upload.image_width = width
+    upload.image_height = height
+    return upload
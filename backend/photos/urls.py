@@ -1,7 +1,9 @@
 # photos/urls.py
 
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import PhotoViewSet, ConsentRequestViewSet
+from . import async_views
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -9,4 +11,12 @@ router.register(r'photos', PhotoViewSet, basename='photo')
 router.register(r'consent-requests', ConsentRequestViewSet, basename='consentrequest')
 
 # The API URLs are now determined automatically by the router.
-urlpatterns = router.urls
\ No newline at end of file
+# The async endpoints come first so the router's detail routes don't capture them.
+urlpatterns = [
+    path('photos/feed/', async_views.feed, name='photo-feed'),
+    path('photos/timeline/', async_views.timeline, name='photo-timeline'),
+    path('photos/status/', async_views.photo_status, name='photo-status'),
+    path('consent-requests/summary/', async_views.consent_summary, name='consentrequest-summary'),
+    path('consent-requests/stream/', async_views.consent_stream, name='consentrequest-stream'),
+    path('consent-requests/stream/ticket/', async_views.consent_stream_ticket, name='consentrequest-stream-ticket'),
+] + router.urls
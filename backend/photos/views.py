@@ -1,16 +1,36 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
 from .models import Photo, ConsentRequest
-from .serializers import PhotoSerializer, ConsentRequestSerializer
+from interactions import services as interaction_services
+from interactions.models import Comment
+from interactions.serializers import CommentSerializer
+from core.pagination import DefaultPagination
+from interactions.views import CommentPagination
+from .serializers import PhotoSerializer, ConsentRequestSerializer, ConsentBulkActionSerializer
 from . import services
 
+
+class ConsentInboxPagination(CursorPagination):
+    """Newest first; cursors stay stable while new requests keep arriving."""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
 class PhotoViewSet(viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update`, and `destroy` actions for Photos.
     """
-    queryset = Photo.objects.all()
+    queryset = Photo.objects.select_related('uploader', 'feed_item')
     serializer_class = PhotoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # The list is every photo on the site; clients page it (or use /feed/).
+    pagination_class = DefaultPagination
 
     def perform_create(self, serializer):
         """
@@ -19,15 +39,70 @@ class PhotoViewSet(viewsets.ModelViewSet):
         1. Automatically set the uploader to the currently logged-in user.
         2. Trigger our facial recognition service.
         
-        NOTE: The serializer is already configured to handle the 'original_image'
-        field from the request, so we just need to save it.
+        NOTE: The serializer validates the 'original_image' field from the
+        request; the bytes themselves are stored through `store_content_blob`.
         """
-        # First, save the photo instance. The serializer handles saving the
-        # 'original_image' and the uploader is set from the request.
-        photo_instance = serializer.save(uploader=self.request.user)
+        # Store the uploaded bytes content-addressed: a repost of an image we
+        # already have reuses the existing file instead of writing a new one.
+        # The digest was computed while the upload streamed in.
+        upload = serializer.validated_data.pop('original_image')
+        digest = getattr(self.request, 'upload_digests', {}).get('original_image')
+        content_blob, _ = services.store_content_blob(upload, digest=digest)
+
+        # Save the photo instance pointing at the shared blob file.
+        # The uploader is set from the request.
+        photo_instance = serializer.save(
+            uploader=self.request.user,
+            content_blob=content_blob,
+            original_image=content_blob.file.name,
+        )
         
-        # Now, call our service function with the new photo's ID
-        services.process_photo_for_faces(photo_id=photo_instance.id)
+        # Visible in the feed (as a placeholder) while it is being processed.
+        services.sync_feed_item(photo_instance)
+        services.fan_out_photo(photo_instance)
+
+        # Now, call our service function with the new photo's ID, handing over
+        # the pixels decoded during validation so the file isn't read again.
+        services.process_photo_for_faces(photo_id=photo_instance.id, image=upload.decoded_image)
+
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """
+        GET /api/photos/{id}/comments/?cursor=...&page_size=N
+        The photo's comments, oldest first, one page at a time.
+        """
+        photo = get_object_or_404(Photo.objects.only('id'), pk=pk)
+        paginator = CommentPagination()
+        page = paginator.paginate_queryset(
+            Comment.objects.filter(photo_id=photo.id).select_related('user'), request, view=self
+        )
+        return paginator.get_paginated_response(CommentSerializer(page, many=True, context={'request': request}).data)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def like(self, request, pk=None):
+        """
+        POST /api/photos/{id}/like/ likes the photo, DELETE unlikes it.
+        Both are idempotent; the response has the new state and count.
+        """
+        photo = get_object_or_404(Photo.objects.only('id'), pk=pk)
+        if request.method == 'POST':
+            interaction_services.like_photo(request.user, photo.id)
+        else:
+            interaction_services.unlike_photo(request.user, photo.id)
+        return Response({'liked': request.method == 'POST', 'like_count': services.get_feed_like_count(photo.id)})
+
+    def perform_update(self, serializer):
+        photo = serializer.save()
+        services.sync_feed_item(photo)
+
+    def perform_destroy(self, instance):
+        # The photo's consent requests are deleted with it; keep the counters in step.
+        with transaction.atomic():
+            services.adjust_consent_counters(
+                (user_id, status, None)
+                for user_id, status in instance.consent_requests.values_list('requested_user_id', 'status')
+            )
+            instance.delete()
 
 
 class ConsentRequestViewSet(viewsets.ModelViewSet):
@@ -45,7 +120,8 @@ class ConsentRequestViewSet(viewsets.ModelViewSet):
         behavior of showing all objects.
         """
         user = self.request.user
-        return ConsentRequest.objects.filter(requested_user=user)
+        # The nested photo + uploader come in the same query.
+        return ConsentRequest.objects.filter(requested_user=user).select_related('photo__uploader')
 
     def perform_update(self, serializer):
         """
@@ -53,9 +129,51 @@ class ConsentRequestViewSet(viewsets.ModelViewSet):
         This hook runs when a consent request is updated (e.g., PATCH request).
         """
         # First, save the instance to ensure the status is updated in the database.
-        instance = serializer.save()
+        old_status = serializer.instance.status
+        with transaction.atomic():
+            instance = serializer.save()
+            services.adjust_consent_counters([(instance.requested_user_id, old_status, instance.status)])
 
         # After saving, check if the new status is 'APPROVED'.
         if instance.status == 'APPROVED':
             # If it is, call our new service to perform the unmasking.
             services.unmask_approved_face(consent_request_id=instance.id)
+
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """
+        GET /api/consent-requests/inbox/?status=PENDING[,DENIED]&page_size=50
+
+        Cursor-paginated inbox, newest first, with the user's counts per
+        status (from their counter, not a COUNT query) alongside.
+        """
+        queryset = self.get_queryset()
+        statuses = [s for s in request.query_params.get('status', '').upper().split(',') if s]
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        paginator = ConsentInboxPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        response = paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['counts'] = services.get_consent_counts(request.user)
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST /api/consent-requests/bulk/ {"status": "APPROVED", "ids": [...]}
+                                      or {"status": "DENIED", "all_pending": true}
+
+        Updates all matching requests in one transaction, then regenerates
+        affected photos once each: a bounded number inline, the rest later
+        by render_pending_photos (reported as photos_pending).
+        """
+        serializer = ConsentBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = services.bulk_set_consent_status(
+            request.user,
+            serializer.validated_data['status'],
+            ids=serializer.validated_data.get('ids'),
+        )
+        result['counts'] = services.get_consent_counts(request.user)
+        return Response(result)
@@ -3,9 +3,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import CustomUser
+from .models import CustomUser, FaceEnrolment
 from .services import extract_face_encoding
 
+class FaceEnrolmentInline(admin.TabularInline):
+    model = FaceEnrolment
+    fields = ['source', 'detected_face', 'created_at']
+    readonly_fields = ['source', 'detected_face', 'created_at']
+    extra = 0
+    can_delete = True
+
+
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = [
@@ -26,6 +34,7 @@ class CustomUserAdmin(UserAdmin):
     )
     
     readonly_fields = ['encoding_status']
+    inlines = [FaceEnrolmentInline]
     
     actions = ['recompute_face_encodings']
     
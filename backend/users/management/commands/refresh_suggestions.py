@@ -0,0 +1,20 @@
+# backend/users/management/commands/refresh_suggestions.py
+
+from django.core.management.base import BaseCommand
+from users.services import refresh_user_suggestions, SUGGESTIONS_PER_USER
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed "people you may know" table (run periodically, e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            default=SUGGESTIONS_PER_USER,
+            help=f'Suggestions kept per user (default {SUGGESTIONS_PER_USER})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding user suggestions...")
+        count = refresh_user_suggestions(per_user=options['per_user'])
+        self.stdout.write(self.style.SUCCESS(f"✓ Wrote {count} suggestions"))
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.13 on 2026-10-19 12:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import numpy as np
+
+
+def enrol_existing_encodings(apps, schema_editor):
+    # Each user's current profile pic encoding becomes the first member of
+    # their enrolment set (and is trivially its own centroid).
+    CustomUser = apps.get_model('users', 'CustomUser')
+    FaceEnrolment = apps.get_model('users', 'FaceEnrolment')
+    users = CustomUser.objects.filter(encoding_status='SUCCESS', face_encoding__isnull=False)
+    FaceEnrolment.objects.bulk_create(
+        [
+            FaceEnrolment(
+                user_id=user_id,
+                encoding=np.asarray(encoding, dtype='<f4').tobytes(),
+                source='PROFILE_PIC',
+            )
+            for user_id, encoding in users.values_list('id', 'face_encoding').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0008_photo_processing_timings'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceEnrolment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encoding', models.BinaryField()),
+                ('source', models.CharField(choices=[('PROFILE_PIC', 'Profile picture'), ('CONFIRMED_MATCH', 'Confirmed match')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('detected_face', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='photos.detectedface')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='face_enrolments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='users_facee_user_id_defdb8_idx')],
+            },
+        ),
+        migrations.RunPython(enrol_existing_encodings, migrations.RunPython.noop),
+    ]
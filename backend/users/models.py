@@ -53,7 +53,11 @@ class CustomUser(AbstractUser):
         choices=FaceSharingMode.choices,
         default=FaceSharingMode.REQUIRE_CONSENT,
         help_text="User's preference for face sharing"
-    )    
+    )
+    # Denormalized count of Follow rows pointing at this user, kept in step
+    # by users.services.follow_user/unfollow_user. Decides whether their
+    # photos are fanned out to timelines (see photos.services.fan_out_photo).
+    follower_count = models.IntegerField(default=0)
     groups = models.ManyToManyField(
         'auth.Group',
         verbose_name='groups',
@@ -76,4 +80,88 @@ class CustomUser(AbstractUser):
     
     def has_valid_face_encoding(self):
         """Check if user has a successfully computed face encoding."""
-        return self.encoding_status == 'SUCCESS' and self.face_encoding is not None
\ No newline at end of file
+        return self.encoding_status == 'SUCCESS' and self.face_encoding is not None
+
+class FaceEnrolment(models.Model):
+    """
+    One known-good encoding of a user's face. A user's enrolment set holds
+    encodings from their profile picture history and from photos where they
+    confirmed the match (approved a consent request).
+
+    CustomUser.face_encoding holds the centroid of this set, which is what
+    the fast matching pass compares against; the full set is only loaded
+    for borderline matches.
+    """
+    class SourceChoices(models.TextChoices):
+        PROFILE_PIC = 'PROFILE_PIC', 'Profile picture'
+        CONFIRMED_MATCH = 'CONFIRMED_MATCH', 'Confirmed match'
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='face_enrolments')
+    # 128 little-endian float32 values, like DetectedFace.encoding
+    encoding = models.BinaryField(editable=False)
+    source = models.CharField(max_length=20, choices=SourceChoices.choices)
+    detected_face = models.ForeignKey(
+        'photos.DetectedFace',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    def __str__(self):
+        return f"{self.get_source_display()} enrolment for {self.user.username}"
+
+    @property
+    def encoding_array(self):
+        """Return the stored encoding as a float32 numpy array."""
+        import numpy as np
+        return np.frombuffer(bytes(self.encoding), dtype='<f4')
+
+
+class UserSuggestion(models.Model):
+    """
+    Precomputed "people you may know" rows, rebuilt periodically by
+    `services.refresh_user_suggestions` (manage.py refresh_suggestions).
+    Reading suggestions is then one indexed range scan per user.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='suggestions')
+    suggested_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    # How often the two were recognised in the same photo (either as subject or uploader)
+    co_appearances = models.IntegerField(default=0)
+    # Likes on each other's photos, counted the way that makes them mutual: min(a->b, b->a)
+    mutual_likes = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested_user'], name='unique_user_suggestion'),
+        ]
+        indexes = [models.Index(fields=['user', '-score'], name='user_suggestion_rank_idx')]
+
+    def __str__(self):
+        return f"{self.suggested_user_id} for {self.user_id} ({self.score:.1f})"
+
+
+class Follow(models.Model):
+    """`follower` sees `followee`'s photos in their home timeline."""
+    follower = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='following')
+    followee = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='unique_follow'),
+            models.CheckConstraint(check=~models.Q(follower=models.F('followee')), name='no_self_follow'),
+        ]
+        indexes = [
+            # Fan-out: everyone following an uploader.
+            models.Index(fields=['followee', 'follower'], name='follow_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followee_id}"
@@ -2,11 +2,16 @@
 
 from rest_framework import serializers
 from .models import CustomUser
+from photos.uploads import decode_image_upload
 
 class CustomUserSerializer(serializers.ModelSerializer):
     """
     Serializer for the CustomUser model.
     """
+    # A plain FileField: `decode_image_upload` does the image validation, so the
+    # file is only opened and decoded once, after the pixel limit is checked.
+    profile_pic = serializers.FileField(required=False, allow_null=True)
+
     class Meta:
         model = CustomUser
         # Fields to include in the API representation
@@ -28,6 +33,12 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'password': {'write_only': True}
         }
 
+    def validate_profile_pic(self, value):
+        # Enforce size/pixel limits and decode once for face encoding.
+        if value is None:
+            return value
+        return decode_image_upload(value)
+
     def create(self, validated_data):
         # This method is called when a new user is created.
         # We use the custom create_user method to ensure the password is hashed.
@@ -36,4 +47,11 @@ class CustomUserSerializer(serializers.ModelSerializer):
         if password is not None:
             instance.set_password(password)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Slim user record for suggestions, moments and other lists."""
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'profile_pic', 'bio']
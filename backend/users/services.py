@@ -1,18 +1,40 @@
 # backend/users/services.py
 
-import face_recognition
 import numpy as np
+import heapq
 import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef, Q
+from django.utils import timezone
+from photos import recognition
+from photos.embedding_store import get_embedding_store
+from users.models import FaceEnrolment
 
 logger = logging.getLogger('users')
 
-def extract_face_encoding(user):
+# Newest encodings kept per user; older ones are dropped as new ones arrive.
+ENROLMENT_MAX_SIZE = 20
+
+# Suggestion score = sum of weight * signal; see refresh_user_suggestions.
+SUGGESTION_WEIGHTS = {
+    'co_appearances': 3.0,
+    'mutual_likes': 2.0,
+    'likes_received': 0.5,
+}
+SUGGESTIONS_PER_USER = 50
+
+def extract_face_encoding(user, image=None):
     """
     Extract and save face encoding from user's profile picture.
     This should be called when a user uploads/updates their profile pic.
     
     Args:
         user: CustomUser instance
+        image: optional RGB numpy array of the profile pic, already decoded
+            at upload time; read from storage if not given
         
     Returns:
         bool: True if encoding extracted successfully, False otherwise
@@ -24,28 +46,29 @@ def extract_face_encoding(user):
         return False
     
     try:
-        # Load the profile picture
-        profile_pic_path = user.profile_pic.path
-        image = face_recognition.load_image_file(profile_pic_path)
+        # Load the profile picture, unless the upload already decoded it
+        if image is None:
+            image = recognition.load_image_file(user.profile_pic.path)
         
-        # Extract face encodings
-        encodings = face_recognition.face_encodings(image)
+        # Find faces; a profile pic may contain several, the subject is usually the largest
+        face_locations = recognition.face_locations(image)
         
-        if len(encodings) == 0:
+        if len(face_locations) == 0:
             logger.warning(f"No face detected in profile pic for user {user.username}")
             user.encoding_status = 'NO_FACE'
             user.face_encoding = None
             user.save()
             return False
         
-        if len(encodings) > 1:
-            logger.warning(f"Multiple faces detected for user {user.username}, using first one")
+        if len(face_locations) > 1:
+            logger.warning(f"Multiple faces detected for user {user.username}, using the largest one")
         
-        # Get the first encoding and convert numpy array to list for JSON storage
-        encoding = encodings[0]
-        user.face_encoding = encoding.tolist()
+        largest = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+        encoding = recognition.face_encodings(image, [largest])[0]
+
+        # Add it to the enrolment set; face_encoding becomes the set's centroid
         user.encoding_status = 'SUCCESS'
-        user.save()
+        add_face_enrolment(user, encoding, FaceEnrolment.SourceChoices.PROFILE_PIC)
         
         logger.info(f"Successfully extracted face encoding for user {user.username}")
         return True
@@ -62,6 +85,57 @@ def extract_face_encoding(user):
         return False
 
 
+def add_face_enrolment(user, encoding, source, detected_face=None):
+    """
+    Add an encoding to the user's enrolment set, keep only the newest
+    ENROLMENT_MAX_SIZE, and store the set's centroid in user.face_encoding.
+
+    Re-adding an encoding that is already enrolled (same profile pic computed
+    again, same face approved twice) only refreshes the centroid.
+
+    Returns:
+        bool: True if the encoding was new
+    """
+    encoding_bytes = np.asarray(encoding, dtype='<f4').tobytes()
+    enrolments = FaceEnrolment.objects.filter(user=user)
+    already_enrolled = enrolments.filter(encoding=encoding_bytes).exists() or (
+        detected_face is not None and enrolments.filter(detected_face=detected_face).exists()
+    )
+
+    if not already_enrolled:
+        FaceEnrolment.objects.create(
+            user=user,
+            encoding=encoding_bytes,
+            source=source,
+            detected_face=detected_face,
+        )
+        stale_ids = list(
+            enrolments.order_by('-created_at', '-id').values_list('id', flat=True)[ENROLMENT_MAX_SIZE:]
+        )
+        if stale_ids:
+            FaceEnrolment.objects.filter(id__in=stale_ids).delete()
+
+    enrolment_set = get_enrolment_sets([user.id])[user.id]
+    user.face_encoding = enrolment_set.mean(axis=0).tolist()
+    user.save()
+    logger.info(f"Enrolled {source} encoding for user {user.username} ({len(enrolment_set)} in set)")
+    return not already_enrolled
+
+
+def get_enrolment_sets(user_ids):
+    """
+    Load the full enrolment sets of the given users.
+
+    Returns:
+        dict: user id -> (k, 128) float32 numpy array
+    """
+    sets = {}
+    rows = FaceEnrolment.objects.filter(user_id__in=user_ids).values_list('user_id', 'encoding')
+    for user_id, encoding in rows:
+        sets.setdefault(user_id, []).append(np.frombuffer(bytes(encoding), dtype='<f4'))
+    return {user_id: np.stack(encodings) for user_id, encodings in sets.items()}
+
+
 def get_users_with_encodings():
     """
     Get all users who have successfully computed face encodings.
@@ -76,15 +150,23 @@ def get_users_with_encodings():
     )
 
 
-def get_face_encodings_dict():
+def get_face_encodings_dict(user_ids=None, exclude_user_ids=None):
     """
     Get a dictionary mapping user IDs to their face encodings.
     This is optimized for batch face recognition operations.
     
+    Args:
+        user_ids: optional iterable of user ids to restrict the gallery to
+        exclude_user_ids: optional iterable of user ids to leave out
+    
     Returns:
         tuple: (numpy array of encodings, list of user objects)
     """
     users = get_users_with_encodings()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    if exclude_user_ids:
+        users = users.exclude(id__in=exclude_user_ids)
     
     if not users.exists():
         return np.array([]), []
@@ -135,4 +217,222 @@ def recompute_all_face_encodings():
             stats['error'] += 1
     
     logger.info(f"Face encoding recomputation complete: {stats}")
-    return stats
\ No newline at end of file
+    return stats
+
+
+def find_matching_faces(encoding, tolerance=None, chunk_size=65536):
+    """
+    Scan every stored face in the corpus for matches against one encoding.
+    Used for retroactive matching, e.g. after a user enrols a new profile pic.
+
+    The scan runs over the memory-mapped embedding store in chunks, each
+    matched with `photos.services.match_encodings`, so memory use stays flat
+    no matter how many faces exist and no DetectedFace rows are loaded.
+
+    Returns:
+        tuple: (numpy array of DetectedFace ids, numpy array of distances)
+    """
+    from photos.services import FACE_MATCH_TOLERANCE, match_encodings
+
+    if tolerance is None:
+        tolerance = FACE_MATCH_TOLERANCE
+    target = np.asarray(encoding, dtype=np.float32).reshape(1, -1)
+    matched_ids = []
+    matched_distances = []
+
+    for face_ids, vectors in get_embedding_store().iter_chunks(chunk_size):
+        hits = match_encodings(vectors, target, tolerance) == 0
+        if hits.any():
+            matched_ids.append(np.array(face_ids[hits]))
+            matched_distances.append(np.linalg.norm(vectors[hits] - target, axis=1))
+
+    if not matched_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(matched_ids), np.concatenate(matched_distances)
+
+
+def refresh_user_suggestions(per_user=SUGGESTIONS_PER_USER):
+    """
+    Rebuild the UserSuggestion table from signals we already store:
+    - co-appearances: two people recognised in the same photo, or one
+      recognised in the other's upload (DetectedFace). Only faces left
+      unmasked count (the uploader's own, PUBLIC users', approved ones):
+      a masked face must not tell the uploader whose it is;
+    - mutual likes: both liked each other's photos;
+    - likes received: someone keeps liking your photos.
+    Meant to run periodically (manage.py refresh_suggestions), not per request.
+
+    Returns:
+        int: number of suggestion rows written
+    """
+    from photos.models import ConsentRequest, DetectedFace
+    from interactions.models import Like
+    from users.models import CustomUser, UserSuggestion
+
+    co_appearances = Counter()
+
+    def count_photo(people):
+        for a, b in combinations(sorted(people), 2):
+            co_appearances[a, b] += 1
+            co_appearances[b, a] += 1
+
+    # Same unmasking rules as photos.services._regenerate_public_image.
+    approved = ConsentRequest.objects.filter(
+        photo_id=OuterRef('photo_id'),
+        requested_user_id=OuterRef('matched_user_id'),
+        status=ConsentRequest.StatusChoices.APPROVED,
+    )
+    faces = (
+        DetectedFace.objects.filter(matched_user__isnull=False)
+        .filter(
+            Q(matched_user_id=F('photo__uploader_id'))
+            | Q(matched_user__face_sharing_mode=CustomUser.FaceSharingMode.PUBLIC)
+            | Exists(approved)
+        )
+        .order_by('photo_id')
+        .values_list('photo_id', 'photo__uploader_id', 'matched_user_id')
+    )
+    current_photo_id, people = None, set()
+    for photo_id, uploader_id, user_id in faces.iterator(chunk_size=5000):
+        if photo_id != current_photo_id:
+            count_photo(people)
+            current_photo_id, people = photo_id, set()
+        people.update((uploader_id, user_id))
+    count_photo(people)
+
+    # (liker, uploader) -> number of likes
+    likes = Counter(
+        Like.objects.exclude(user_id=F('photo__uploader_id'))
+        .values_list('user_id', 'photo__uploader_id')
+        .iterator(chunk_size=5000)
+    )
+
+    candidates = defaultdict(list)
+    pairs = set(co_appearances) | set(likes) | {(b, a) for a, b in likes}
+    for user_id, other_id in pairs:
+        co = co_appearances.get((user_id, other_id), 0)
+        mutual = min(likes.get((user_id, other_id), 0), likes.get((other_id, user_id), 0))
+        received = likes.get((other_id, user_id), 0)
+        score = (
+            SUGGESTION_WEIGHTS['co_appearances'] * co
+            + SUGGESTION_WEIGHTS['mutual_likes'] * mutual
+            + SUGGESTION_WEIGHTS['likes_received'] * received
+        )
+        if score > 0:
+            candidates[user_id].append((score, other_id, co, mutual))
+
+    rows = [
+        UserSuggestion(user_id=user_id, suggested_user_id=other_id, score=score,
+                       co_appearances=co, mutual_likes=mutual)
+        for user_id, scored in candidates.items()
+        for score, other_id, co, mutual in heapq.nlargest(per_user, scored)
+    ]
+    with transaction.atomic():
+        UserSuggestion.objects.all().delete()
+        UserSuggestion.objects.bulk_create(rows, batch_size=2000)
+
+    logger.info(f"Refreshed suggestions: {len(rows)} rows for {len(candidates)} users")
+    return len(rows)
+
+
+def _slim_users():
+    from users.models import CustomUser
+    return CustomUser.objects.only('id', 'username', 'profile_pic', 'bio')
+
+
+def get_suggestions(user, limit=10):
+    """
+    People `user` may know, best first, from the precomputed table. Topped up
+    with the newest members (with a profile picture) for users with little
+    or no history.
+
+    Returns:
+        list: CustomUser objects with only the summary fields loaded
+    """
+    from users.models import UserSuggestion
+
+    rows = (
+        UserSuggestion.objects.filter(user=user)
+        .select_related('suggested_user')
+        .only('suggested_user__id', 'suggested_user__username', 'suggested_user__profile_pic', 'suggested_user__bio')
+        .order_by('-score')[:limit]
+    )
+    users = [row.suggested_user for row in rows]
+    if len(users) < limit:
+        exclude_ids = {user.id} | {suggested.id for suggested in users}
+        users += list(
+            _slim_users().exclude(id__in=exclude_ids).exclude(profile_pic__in=['', None])
+            .order_by('-date_joined')[:limit - len(users)]
+        )
+    return users
+
+
+def get_moments(user, limit=10, window_hours=24):
+    """
+    People who posted recently, ranked by how close they are to `user`
+    (suggestion score), then by how recently they posted. Topped up with
+    suggestions when few people posted in the window.
+
+    Returns:
+        list: (CustomUser, latest photo time or None) tuples
+    """
+    from photos.models import Photo
+    from users.models import UserSuggestion
+
+    since = timezone.now() - timedelta(hours=window_hours)
+    recent = (
+        Photo.objects.filter(status=Photo.StatusChoices.READY, created_at__gte=since)
+        .exclude(uploader=user)
+        .values('uploader_id')
+        .annotate(latest=Max('created_at'))
+        .order_by('-latest')[:500]
+    )
+    latest_by_user = {row['uploader_id']: row['latest'] for row in recent}
+    scores = dict(
+        UserSuggestion.objects.filter(user=user, suggested_user_id__in=latest_by_user)
+        .values_list('suggested_user_id', 'score')
+    )
+    ranked = sorted(latest_by_user, key=lambda uid: (scores.get(uid, 0.0), latest_by_user[uid]), reverse=True)[:limit]
+    users_by_id = _slim_users().in_bulk(ranked)
+    moments = [(users_by_id[uid], latest_by_user[uid]) for uid in ranked if uid in users_by_id]
+
+    if len(moments) < limit:
+        included = {moment_user.id for moment_user, _ in moments}
+        for suggested in get_suggestions(user, limit):
+            if len(moments) >= limit:
+                break
+            if suggested.id not in included:
+                moments.append((suggested, None))
+    return moments
+
+
+def follow_user(follower, followee):
+    """
+    Make `follower` follow `followee`. Idempotent.
+
+    Returns:
+        bool: True if a new follow was created
+    """
+    from users.models import CustomUser, Follow
+
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, followee=followee)
+        if created:
+            CustomUser.objects.filter(id=followee.id).update(follower_count=F('follower_count') + 1)
+    return created
+
+
+def unfollow_user(follower, followee):
+    """
+    Stop `follower` following `followee`. Idempotent.
+
+    Returns:
+        bool: True if a follow was removed
+    """
+    from users.models import CustomUser, Follow
+
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if deleted:
+            CustomUser.objects.filter(id=followee.id).update(follower_count=F('follower_count') - 1)
+    return bool(deleted)
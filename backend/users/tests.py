@@ -1,3 +1,161 @@
-from django.test import TestCase
+# backend/users/tests.py
 
-# Create your tests here.
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+
+from interactions.models import Like
+from photos.models import ConsentRequest, DetectedFace, Photo
+from .models import CustomUser, Follow, UserSuggestion
+from .services import follow_user, get_suggestions, refresh_user_suggestions, unfollow_user
+
+
+def make_user(username, **fields):
+    return CustomUser.objects.create_user(username=username, password='pw', **fields)
+
+
+def jpeg_upload(name='me.jpg', size=(64, 48)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (90, 140, 200)).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class UserListTests(TestCase):
+    def test_user_list_is_a_plain_list(self):
+        users = [make_user(f'user{i}') for i in range(3)]
+        client = APIClient()
+        client.force_authenticate(users[0])
+        response = client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(user['id'] for user in response.data), sorted(user.id for user in users))
+
+
+@mock.patch('users.views.extract_face_encoding', return_value=True)
+class ProfilePicUploadTests(TestCase):
+    def register(self, profile_pic):
+        return APIClient().post('/api/users/', {
+            'username': 'newcomer', 'password': 'a-long-password', 'profile_pic': profile_pic,
+        }, format='multipart')
+
+    def test_profile_pic_is_decoded_once(self, extract_face_encoding):
+        with mock.patch('PIL.Image.open', wraps=Image.open) as image_open:
+            response = self.register(jpeg_upload())
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(image_open.call_count, 1)
+        image = extract_face_encoding.call_args.kwargs['image']
+        self.assertEqual(image.shape, (48, 64, 3))
+
+    @override_settings(MAX_IMAGE_PIXELS=1000)
+    def test_pixel_limit_is_checked_before_decoding(self, extract_face_encoding):
+        with mock.patch('PIL.Image.Image.convert') as convert:
+            response = self.register(jpeg_upload())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pixels', str(response.data['profile_pic']))
+        convert.assert_not_called()
+        self.assertFalse(CustomUser.objects.filter(username='newcomer').exists())
+
+    def test_not_an_image(self, extract_face_encoding):
+        response = self.register(SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('profile_pic', response.data)
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        self.me = make_user('me')
+        self.public = make_user('public', face_sharing_mode=CustomUser.FaceSharingMode.PUBLIC)
+        self.approved = make_user('approved')
+        self.masked = make_user('masked')
+        self.mutual = make_user('mutual')
+        self.fan = make_user('fan')
+
+        group = self.photo(self.me)
+        for user in (self.public, self.approved, self.masked):
+            DetectedFace.objects.create(photo=group, bounding_box='0,0,10,10', matched_user=user)
+        ConsentRequest.objects.create(photo=group, requested_user=self.approved, bounding_box='0,0,10,10',
+                                      status=ConsentRequest.StatusChoices.APPROVED)
+        ConsentRequest.objects.create(photo=group, requested_user=self.masked, bounding_box='0,0,10,10')
+
+        Like.objects.create(user=self.mutual, photo=self.photo(self.me))
+        Like.objects.create(user=self.me, photo=self.photo(self.mutual))
+        Like.objects.create(user=self.fan, photo=self.photo(self.me))
+        Like.objects.create(user=self.me, photo=self.photo(self.me))
+        refresh_user_suggestions()
+
+    def photo(self, uploader):
+        return Photo.objects.create(uploader=uploader, original_image='photos/originals/test.jpg',
+                                    status=Photo.StatusChoices.READY)
+
+    def test_ranking(self):
+        rows = {row.suggested_user: row for row in UserSuggestion.objects.filter(user=self.me)}
+        self.assertEqual(set(rows), {self.public, self.approved, self.mutual, self.fan})
+        self.assertEqual((rows[self.public].co_appearances, rows[self.mutual].mutual_likes), (1, 1))
+        ranked = [user.username for user in get_suggestions(self.me, limit=4)]
+        self.assertEqual(ranked[2:], ['mutual', 'fan'])
+        self.assertEqual(set(ranked[:2]), {'public', 'approved'})
+
+    def test_masked_face_is_not_a_co_appearance(self):
+        self.assertFalse(UserSuggestion.objects.filter(user=self.me, suggested_user=self.masked).exists())
+        self.assertFalse(UserSuggestion.objects.filter(user=self.masked).exists())
+        # The unmasked faces in the same photo do count for each other.
+        self.assertTrue(UserSuggestion.objects.filter(user=self.approved, suggested_user=self.public).exists())
+
+    def test_refresh_replaces_previous_rows(self):
+        Like.objects.filter(user=self.fan).delete()
+        refresh_user_suggestions()
+        self.assertFalse(UserSuggestion.objects.filter(suggested_user=self.fan).exists())
+
+    def test_topped_up_with_newest_members_with_a_picture(self):
+        newcomer = make_user('newcomer', profile_pic='profile_pics/newcomer.jpg')
+        # Liking someone's photos suggests the liker to them, not the other way round.
+        self.assertEqual(get_suggestions(self.fan, limit=3), [newcomer])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.me)
+        response = client.get('/api/users/suggestions/', {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual({user['username'] for user in response.data}, {'public', 'approved'})
+
+
+class FollowTests(TestCase):
+    def setUp(self):
+        self.follower = make_user('follower')
+        self.followee = make_user('followee')
+
+    def follower_count(self):
+        return CustomUser.objects.get(id=self.followee.id).follower_count
+
+    def test_follow_is_idempotent(self):
+        self.assertTrue(follow_user(self.follower, self.followee))
+        self.assertFalse(follow_user(self.follower, self.followee))
+        self.assertEqual(Follow.objects.filter(followee=self.followee).count(), 1)
+        self.assertEqual(self.follower_count(), 1)
+
+    def test_unfollow_is_idempotent(self):
+        follow_user(self.follower, self.followee)
+        self.assertTrue(unfollow_user(self.follower, self.followee))
+        self.assertFalse(unfollow_user(self.follower, self.followee))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.follower_count(), 0)
+
+    def test_unfollow_without_follow_leaves_count_alone(self):
+        follow_user(make_user('other'), self.followee)
+        self.assertFalse(unfollow_user(self.follower, self.followee))
+        self.assertEqual(self.follower_count(), 1)
+
+    def test_follow_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.follower)
+        url = f'/api/users/{self.followee.id}/follow/'
+        self.assertEqual(client.post(url).data, {'following': True})
+        self.assertEqual(self.follower_count(), 1)
+        self.assertEqual(client.delete(url).data, {'following': False})
+        self.assertEqual(self.follower_count(), 0)
+        self.assertEqual(client.post(f'/api/users/{self.follower.id}/follow/').status_code, 400)
@@ -4,9 +4,11 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import CustomUser
-from .serializers import CustomUserSerializer
+from .serializers import CustomUserSerializer, UserSummarySerializer
 from photos.serializers import PhotoSerializer
-from .services import extract_face_encoding  # NEW IMPORT
+from photos.services import refresh_feed_uploader, backfill_timeline, prune_timeline
+from interactions.services import liked_photo_ids
+from .services import extract_face_encoding, get_suggestions, get_moments, follow_user, unfollow_user
 import logging
 
 logger = logging.getLogger('users')
@@ -28,12 +30,13 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         Override to extract face encoding when user registers.
         """
+        profile_pic_upload = serializer.validated_data.get('profile_pic')
         user = serializer.save()
         
         # Extract face encoding from profile picture
         if user.profile_pic:
             logger.info(f"Extracting face encoding for new user {user.username}")
-            success = extract_face_encoding(user)
+            success = extract_face_encoding(user, image=getattr(profile_pic_upload, 'decoded_image', None))
             
             if not success:
                 logger.warning(f"Failed to extract face encoding for {user.username}")
@@ -48,6 +51,7 @@ class UserViewSet(viewsets.ModelViewSet):
         # Check if profile_pic is being updated
         old_instance = self.get_object()
         old_profile_pic = old_instance.profile_pic
+        profile_pic_upload = serializer.validated_data.get('profile_pic')
         
         user = serializer.save()
         new_profile_pic = user.profile_pic
@@ -55,7 +59,58 @@ class UserViewSet(viewsets.ModelViewSet):
         # If profile pic changed, re-extract encoding
         if old_profile_pic != new_profile_pic and new_profile_pic:
             logger.info(f"Profile pic changed for {user.username}, re-extracting encoding")
-            extract_face_encoding(user)
+            extract_face_encoding(user, image=getattr(profile_pic_upload, 'decoded_image', None))
+
+        # Their feed items carry a copy of the username and picture.
+        if old_profile_pic != new_profile_pic or old_instance.username != user.username:
+            refresh_feed_uploader(user)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def follow(self, request, pk=None):
+        """
+        POST /api/users/{id}/follow/ follows the user, DELETE unfollows.
+        Both are idempotent.
+        """
+        followee = self.get_object()
+        if followee == request.user:
+            return Response({'detail': 'You cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            if follow_user(request.user, followee):
+                followee.refresh_from_db(fields=['follower_count'])
+                backfill_timeline(request.user, followee)
+        elif unfollow_user(request.user, followee):
+            prune_timeline(request.user, followee)
+        return Response({'following': request.method == 'POST'})
+
+    def _limit(self, request, default=10, maximum=50):
+        try:
+            return max(1, min(int(request.query_params.get('limit', default)), maximum))
+        except ValueError:
+            return default
+
+    @action(detail=False, methods=['get'])
+    def suggestions(self, request):
+        """
+        GET /api/users/suggestions/?limit=N
+        People the current user may know, from the precomputed suggestion table.
+        """
+        users = get_suggestions(request.user, self._limit(request))
+        return Response(UserSummarySerializer(users, many=True, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'])
+    def moments(self, request):
+        """
+        GET /api/users/moments/?limit=N
+        People who posted recently, closest to the current user first.
+        """
+        moments = get_moments(request.user, self._limit(request))
+        data = []
+        for moment_user, latest_photo_at in moments:
+            item = UserSummarySerializer(moment_user, context={'request': request}).data
+            item['latest_photo_at'] = latest_photo_at
+            data.append(item)
+        return Response(data)
 
     @action(detail=False, methods=['get'], url_path='profile/(?P<username>[^/.]+)')
     def profile(self, request, username=None):
@@ -66,8 +121,9 @@ class UserViewSet(viewsets.ModelViewSet):
             user = CustomUser.objects.get(username=username)
             user_serializer = self.get_serializer(user)
             
-            photos = user.uploaded_photos.all().order_by('-created_at')
-            photos_serializer = PhotoSerializer(photos, many=True)
+            photos = list(user.uploaded_photos.select_related('uploader', 'feed_item').order_by('-created_at'))
+            liked = liked_photo_ids(request.user, [photo.id for photo in photos])
+            photos_serializer = PhotoSerializer(photos, many=True, context={'liked_photo_ids': liked})
 
             return Response({
                 'user': user_serializer.data,
@@ -149,7 +149,7 @@ const PhotoGrid = ({ photos }) => {
             {/* Optional: Hover overlay with likes/comments count */}
             <div className="absolute inset-0 bg-black bg-opacity-0 group-hover:bg-opacity-40 transition-all duration-300 flex items-center justify-center opacity-0 group-hover:opacity-100">
               <div className="text-white text-sm font-semibold">
-                {photo.likes?.length || 0} ❤️ {photo.comments?.length || 0} 💬
+                {photo.like_count || 0} ❤️ {photo.comment_count || 0} 💬
               </div>
             </div>
           </div>
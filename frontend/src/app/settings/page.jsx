@@ -38,12 +38,9 @@ export default function SettingsPage() {
       const fetchStats = async () => {
         setLoadingStats(true);
         try {
-          const res = await api.get('/api/consent-requests/');
-          const requests = res.data;
-          const total = requests.length;
-          const pending = requests.filter(r => r.status === 'PENDING').length;
-          const approved = requests.filter(r => r.status === 'APPROVED').length;
-          setStats({ total, pending, approved });
+          const res = await api.get('/api/consent-requests/summary/');
+          const { PENDING: pending, APPROVED: approved, DENIED: denied } = res.data;
+          setStats({ total: pending + approved + denied, pending, approved });
         } catch (error) {
           console.error('Failed to fetch consent stats:', error);
         } finally {
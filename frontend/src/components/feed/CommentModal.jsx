@@ -5,16 +5,36 @@
 // =======================================================================
 'use client';
 
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import { useAuth } from '@/context/AuthContext';
 import api from '@/lib/api';
 import { X, Send } from 'lucide-react';
 
 export default function CommentModal({ post, onClose, onCommentAdded }) {
     const { user } = useAuth();
-    const [comments, setComments] = useState(post.comments || []);
+    const [comments, setComments] = useState(post.latest_comments || []);
     const [newComment, setNewComment] = useState('');
     const [isSubmitting, setIsSubmitting] = useState(false);
+    const [nextPage, setNextPage] = useState(null);
+
+    // The feed only carries the newest comments; page through the rest, oldest first.
+    const firstPage = `/api/photos/${post.id}/comments/`;
+    const loadComments = async (url) => {
+        try {
+            const response = await api.get(url);
+            setComments(previous => {
+                const loaded = url === firstPage ? [] : previous;
+                const seen = new Set(loaded.map(comment => comment.id));
+                return [...loaded, ...response.data.results.filter(comment => !seen.has(comment.id))];
+            });
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error("Failed to fetch comments:", error);
+        }
+    };
+    useEffect(() => {
+        loadComments(firstPage);
+    }, [post.id]);
 
     const handleCommentSubmit = async (e) => {
         e.preventDefault();
@@ -67,6 +87,14 @@ export default function CommentModal({ post, onClose, onCommentAdded }) {
                     ) : (
                         <p className="text-center text-gray-500 py-8">No comments yet.</p>
                     )}
+                    {nextPage && (
+                        <button
+                            onClick={() => loadComments(nextPage)}
+                            className="w-full text-sm text-gray-500 hover:text-gray-700 transition-colors"
+                        >
+                            Load more comments
+                        </button>
+                    )}
                 </div>
 
                 {/* Comment Input Form (Fixed at the bottom) */}
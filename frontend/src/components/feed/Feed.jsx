@@ -14,6 +14,8 @@ import { Loader2, ImageOff } from 'lucide-react';
 export default function Feed() {
   const [posts, setPosts] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { user } = useAuth();
 
   useEffect(() => {
@@ -24,9 +26,15 @@ export default function Feed() {
       }
       setLoading(true);
       try {
-        const photosResponse = await api.get('/api/photos/');
-        const reversedPosts = [...photosResponse.data].reverse();
-        setPosts(reversedPosts);
+        // Home timeline: own photos and followed accounts, newest first.
+        // Until the user follows someone (their timeline then only holds
+        // their own photos) or while it is empty, show everyone's photos.
+        let feedResponse = await api.get('/api/photos/timeline/');
+        if (!feedResponse.data.follows_anyone || feedResponse.data.results.length === 0) {
+          feedResponse = await api.get('/api/photos/feed/');
+        }
+        setPosts(feedResponse.data.results);
+        setNextPage(feedResponse.data.next);
       } catch (error) {
         console.error("Failed to fetch feed data:", error);
       } finally {
@@ -36,6 +44,19 @@ export default function Feed() {
     fetchData();
   }, [user]);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const feedResponse = await api.get(nextPage);
+      setPosts([...posts, ...feedResponse.data.results]);
+      setNextPage(feedResponse.data.next);
+    } catch (error) {
+      console.error("Failed to fetch more posts:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <div className="w-full flex items-center justify-center py-20">
@@ -62,6 +83,15 @@ export default function Feed() {
               uploader={post.uploader}
             />
           ))}
+          {nextPage && (
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="w-full py-3 text-sm font-semibold text-primary hover:text-dark-accent transition-colors disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       ) : (
         /* Empty State */
@@ -18,7 +18,8 @@ export default function Moments() {
     const fetchMomentsData = async () => {
       setLoading(true);
       try {
-        const response = await api.get('/api/users/');
+        // Recent posters, closest to the current user first
+        const response = await api.get('/api/users/moments/', { params: { limit: 20 } });
         
         // Create "Your Story" moment
         const currentUserMoment = {
@@ -28,10 +29,7 @@ export default function Moments() {
           isYou: true,
         };
 
-        // Get other users
-        const otherUsers = response.data
-          .filter(u => u.username !== currentUser.username)
-          .map(u => ({ ...u, isYou: false }));
+        const otherUsers = response.data.map(u => ({ ...u, isYou: false }));
 
         setMoments([currentUserMoment, ...otherUsers]);
 
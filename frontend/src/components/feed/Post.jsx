@@ -4,37 +4,62 @@
 // =======================================================================
 'use client';
 
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import { MoreHorizontal, Heart, MessageCircle, Send, Bookmark } from 'lucide-react';
 import { useAuth } from '@/context/AuthContext';
 import api from '@/lib/api';
 import CommentModal from './CommentModal';
 
+const STATUS_POLL_MS = 3000;
+
 export default function Post({ post, uploader }) {
   const { user } = useAuth();
-  const [likes, setLikes] = useState(post.likes || []);
-  const [comments, setComments] = useState(post.comments || []);
+  const [likeCount, setLikeCount] = useState(post.like_count || 0);
+  const [hasLiked, setHasLiked] = useState(Boolean(post.liked_by_me));
+  const [comments, setComments] = useState(post.latest_comments || []);
+  const [commentCount, setCommentCount] = useState(post.comment_count || 0);
   const [isCommentModalOpen, setCommentModalOpen] = useState(false);
-
-  if (!post || !post.public_image || !uploader) {
+  const [status, setStatus] = useState(post?.status);
+  const [publicImage, setPublicImage] = useState(post?.public_image);
+
+  // Poll the cheap status endpoint until the masked image is ready.
+  useEffect(() => {
+    if (status !== 'PROCESSING') return;
+    const timer = setInterval(async () => {
+      try {
+        const response = await api.get('/api/photos/status/', { params: { ids: post.id } });
+        const photo = response.data.results[0];
+        if (photo && photo.status !== 'PROCESSING') {
+          setStatus(photo.status);
+          setPublicImage(photo.public_image);
+        }
+      } catch (error) {
+        console.error('Failed to fetch photo status:', error);
+      }
+    }, STATUS_POLL_MS);
+    return () => clearInterval(timer);
+  }, [status, post?.id]);
+
+  // Photos still being masked have no public image yet; show a placeholder
+  // for those and hide anything that failed processing.
+  const isProcessing = status === 'PROCESSING';
+  if (!post || !uploader || (!publicImage && !isProcessing)) {
     return null;
   }
 
-  const hasLiked = likes.some(like => like.user.id === user.id);
-
   const handleLike = async () => {
-    if (hasLiked) {
-      const like = likes.find(like => like.user.id === user.id);
-      await api.delete(`/api/likes/${like.id}/`);
-      setLikes(likes.filter(l => l.id !== like.id));
-    } else {
-      const response = await api.post('/api/likes/', { photo: post.id });
-      setLikes([...likes, response.data]);
-    }
+    // Idempotent on the server, so a double-tap can't fail or double-count
+    const response = hasLiked
+      ? await api.delete(`/api/photos/${post.id}/like/`)
+      : await api.post(`/api/photos/${post.id}/like/`);
+    setHasLiked(response.data.liked);
+    setLikeCount(response.data.like_count);
   };
 
   const handleCommentAdded = (newComment) => {
-    setComments([...comments, newComment]);
+    // The card only previews the newest two comments
+    setComments([...comments, newComment].slice(-2));
+    setCommentCount(commentCount + 1);
   };
 
   const formatDate = (dateString) => {
@@ -81,15 +106,21 @@ export default function Post({ post, uploader }) {
 
         {/* Post Image */}
         <div className="relative w-full bg-gray-100">
-          <img 
-            src={post.public_image} 
-            alt={post.caption || 'A photo by ' + uploader.username} 
-            className="w-full h-auto object-contain max-h-[500px] md:max-h-[600px]"
-            onError={(e) => { 
-              e.target.onerror = null; 
-              e.target.src = 'https://placehold.co/800x600/eee/ccc?text=Image+Not+Available'; 
-            }}
-          />
+          {publicImage ? (
+            <img 
+              src={publicImage} 
+              alt={post.caption || 'A photo by ' + uploader.username} 
+              className="w-full h-auto object-contain max-h-[500px] md:max-h-[600px]"
+              onError={(e) => { 
+                e.target.onerror = null; 
+                e.target.src = 'https://placehold.co/800x600/eee/ccc?text=Image+Not+Available'; 
+              }}
+            />
+          ) : (
+            <div className="w-full aspect-[4/3] flex items-center justify-center animate-pulse text-sm text-gray-500">
+              Protecting faces in this photo...
+            </div>
+          )}
         </div>
 
         {/* Post Actions */}
@@ -135,20 +166,11 @@ export default function Post({ post, uploader }) {
           </div>
 
           {/* Likes Count */}
-          {likes.length > 0 && (
+          {likeCount > 0 && (
             <div className="flex items-center space-x-2">
-              {likes.length === 1 ? (
-                <p className="text-sm">
-                  <span className="font-semibold text-gray-900">
-                    {likes[0].user.username}
-                  </span>
-                  <span className="text-gray-600"> liked this</span>
-                </p>
-              ) : (
-                <p className="text-sm font-semibold text-gray-900">
-                  {likes.length.toLocaleString()} likes
-                </p>
-              )}
+              <p className="text-sm font-semibold text-gray-900">
+                {likeCount === 1 ? '1 like' : `${likeCount.toLocaleString()} likes`}
+              </p>
             </div>
           )}
 
@@ -165,16 +187,16 @@ export default function Post({ post, uploader }) {
           {/* Comments Preview */}
           {comments.length > 0 && (
             <div className="space-y-1 md:space-y-2">
-              {comments.length > 2 && (
+              {commentCount > comments.length && (
                 <button 
                   onClick={() => setCommentModalOpen(true)}
                   className="text-sm text-gray-500 hover:text-gray-700 transition-colors"
                 >
-                  View all {comments.length} comments
+                  View all {commentCount} comments
                 </button>
               )}
               
-              {comments.slice(0, 2).map(comment => (
+              {comments.map(comment => (
                 <div key={comment.id} className="text-sm">
                   <span className="font-semibold text-gray-900 mr-2">
                     {comment.user.username}
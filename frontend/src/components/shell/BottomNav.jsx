@@ -12,7 +12,7 @@ import { LayoutGrid, Sparkles, PlusSquare, ShieldCheck, User } from 'lucide-reac
 import UploadModal from '@/components/upload/UploadModal';
 import UploadToast from '@/components/upload/UploadToast';
 import ConsentModal from '@/components/consent/ConsentModal';
-import api from '@/lib/api';
+import useConsentSummary from '@/hooks/useConsentSummary';
 
 export default function BottomNav() {
   const pathname = usePathname();
@@ -22,7 +22,6 @@ export default function BottomNav() {
   const [isUploadModalOpen, setUploadModalOpen] = useState(false);
   const [isConsentModalOpen, setConsentModalOpen] = useState(false);
   const [uploadStatus, setUploadStatus] = useState(null);
-  const [pendingCount, setPendingCount] = useState(0);
 
   // Update active tab based on pathname
   useEffect(() => {
@@ -31,23 +30,9 @@ export default function BottomNav() {
     else if (pathname.startsWith('/profile')) setActiveTab('profile');
   }, [pathname]);
 
-  // Fetch pending consent count
-  useEffect(() => {
-    const fetchPendingCount = async () => {
-      if (!user) return;
-      try {
-        const res = await api.get('/api/consent-requests/');
-        const pending = res.data.filter(r => r.status === 'PENDING').length;
-        setPendingCount(pending);
-      } catch (error) {
-        console.error('Failed to fetch consent count:', error);
-      }
-    };
-
-    fetchPendingCount();
-    const interval = setInterval(fetchPendingCount, 30000);
-    return () => clearInterval(interval);
-  }, [user]);
+  // Live pending consent count (pushed by the server, see useConsentSummary)
+  const { counts: consentCounts, refresh: refreshConsentCounts } = useConsentSummary(user);
+  const pendingCount = consentCounts.PENDING;
 
   const handleUploadStart = (status) => {
     setUploadStatus(status);
@@ -256,15 +241,8 @@ export default function BottomNav() {
           isOpen={isConsentModalOpen}
           onClose={() => {
             setConsentModalOpen(false);
-            // Refresh consent count
-            if (user) {
-              api.get('/api/consent-requests/')
-                .then(res => {
-                  const pending = res.data.filter(r => r.status === 'PENDING').length;
-                  setPendingCount(pending);
-                })
-                .catch(err => console.error('Failed to refresh count:', err));
-            }
+            // Refresh count after closing modal
+            if (user) refreshConsentCounts();
           }} 
         />
       )}
@@ -21,15 +21,15 @@ export default function RightSidebar() {
       if (!user) return;
       
       try {
-        // Fetch consent requests
-        const consentRes = await api.get('/api/consent-requests/');
-        const pending = consentRes.data.filter(r => r.status === 'PENDING');
-        setConsentRequests(pending.slice(0, 3));
+        // Fetch the 3 newest pending consent requests
+        const consentRes = await api.get('/api/consent-requests/inbox/', {
+          params: { status: 'PENDING', page_size: 3 },
+        });
+        setConsentRequests(consentRes.data.results);
 
-        // Fetch user suggestions
-        const usersRes = await api.get('/api/users/');
-        const otherUsers = usersRes.data.filter(u => u.username !== user.username);
-        setSuggestions(otherUsers.slice(0, 3));
+        // Fetch the top 3 precomputed user suggestions
+        const suggestionsRes = await api.get('/api/users/suggestions/', { params: { limit: 3 } });
+        setSuggestions(suggestionsRes.data);
       } catch (error) {
         console.error('Failed to fetch sidebar data:', error);
       } finally {
@@ -244,6 +244,20 @@ const ConsentRequestPreview = ({ request, onClick }) => {
 
 const SuggestionItem = ({ user }) => {
   const router = useRouter();
+  const [following, setFollowing] = useState(false);
+
+  const toggleFollow = async () => {
+    try {
+      if (following) {
+        await api.delete(`/api/users/${user.id}/follow/`);
+      } else {
+        await api.post(`/api/users/${user.id}/follow/`);
+      }
+      setFollowing(!following);
+    } catch (error) {
+      console.error('Failed to update follow:', error);
+    }
+  };
   
   return (
     <div className="flex items-center justify-between p-2 rounded-lg hover:bg-background transition-colors">
@@ -267,8 +281,11 @@ const SuggestionItem = ({ user }) => {
           </p>
         </div>
       </div>
-      <button className="text-xs font-bold text-primary hover:text-dark-accent px-3 py-1 rounded-md hover:bg-primary/5 transition-colors">
-        Follow
+      <button
+        onClick={toggleFollow}
+        className="text-xs font-bold text-primary hover:text-dark-accent px-3 py-1 rounded-md hover:bg-primary/5 transition-colors"
+      >
+        {following ? 'Following' : 'Follow'}
       </button>
     </div>
   );
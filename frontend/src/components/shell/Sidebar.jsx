@@ -1,39 +1,24 @@
 // frontend/src/components/shell/Sidebar.jsx
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import Link from 'next/link';
 import { usePathname } from 'next/navigation';
 import { useAuth } from '@/context/AuthContext';
 import { mainNavItems, userNavItems, logoutNavItem } from '@/config/nav';
 import { PlusSquare, User, Bell } from 'lucide-react';
-import api from '@/lib/api';
+import useConsentSummary from '@/hooks/useConsentSummary';
 import ConsentModal from '@/components/consent/ConsentModal';
 
 export default function Sidebar({ onUploadClick }) {
   const { user, logoutUser } = useAuth();
   const pathname = usePathname();
   const [isConsentModalOpen, setConsentModalOpen] = useState(false);
-  const [pendingCount, setPendingCount] = useState(0);
   const [hoveredItem, setHoveredItem] = useState(null);
 
-  // Fetch pending consent count
-  useEffect(() => {
-    const fetchPendingCount = async () => {
-      if (!user) return;
-      try {
-        const res = await api.get('/api/consent-requests/');
-        const pending = res.data.filter(r => r.status === 'PENDING').length;
-        setPendingCount(pending);
-      } catch (error) {
-        console.error('Failed to fetch consent count:', error);
-      }
-    };
-
-    fetchPendingCount();
-    const interval = setInterval(fetchPendingCount, 30000);
-    return () => clearInterval(interval);
-  }, [user]);
+  // Live pending consent count (pushed by the server, see useConsentSummary)
+  const { counts: consentCounts, refresh: refreshConsentCounts } = useConsentSummary(user);
+  const pendingCount = consentCounts.PENDING;
 
   const handleNavItemClick = (item) => {
     if (item.modal === 'consent') {
@@ -179,14 +164,7 @@ export default function Sidebar({ onUploadClick }) {
         onClose={() => {
           setConsentModalOpen(false);
           // Refresh count after closing modal
-          if (user) {
-            api.get('/api/consent-requests/')
-              .then(res => {
-                const pending = res.data.filter(r => r.status === 'PENDING').length;
-                setPendingCount(pending);
-              })
-              .catch(err => console.error('Failed to refresh count:', err));
-          }
+          if (user) refreshConsentCounts();
         }} 
       />
     </>
@@ -0,0 +1,125 @@
+// frontend/src/hooks/useConsentSummary.js
+// Live consent request counts ({ PENDING, APPROVED, DENIED }) for badges.
+//
+// The counts are fetched from the cheap summary endpoint on connect. Then one
+// EventSource per browser tab, shared by every component using the hook,
+// listens on /api/consent-requests/stream/ and receives new counts as they
+// change, instead of each component polling the full request list.
+// EventSource cannot send the Authorization header, so each connection is
+// opened with a single-use ticket from /api/consent-requests/stream/ticket/
+// rather than the access token.
+// The stream needs an ASGI server (under WSGI it answers 501); without it, or
+// without EventSource support, the hook polls the summary endpoint.
+'use client';
+
+import { useState, useEffect } from 'react';
+import api from '@/lib/api';
+
+const EMPTY_COUNTS = { PENDING: 0, APPROVED: 0, DENIED: 0 };
+const FALLBACK_POLL_MS = 60000;
+const STREAM_RETRY_MS = 300000;
+const STREAM_RECONNECT_MS = 5000;
+
+let latestCounts = EMPTY_COUNTS;
+const listeners = new Set();
+let source = null;
+let pollTimer = null;
+let reconnectTimer = null;
+
+function emit(counts) {
+  latestCounts = counts;
+  listeners.forEach((listener) => listener(counts));
+}
+
+export async function refreshConsentSummary() {
+  try {
+    const res = await api.get('/api/consent-requests/summary/');
+    emit(res.data);
+  } catch (error) {
+    console.error('Failed to fetch consent summary:', error);
+  }
+}
+
+function startPolling() {
+  if (!pollTimer) pollTimer = setInterval(refreshConsentSummary, FALLBACK_POLL_MS);
+}
+
+function stopPolling() {
+  clearInterval(pollTimer);
+  pollTimer = null;
+}
+
+async function openStream() {
+  reconnectTimer = null;
+  if (typeof window.EventSource === 'undefined') {
+    startPolling();
+    return;
+  }
+
+  let ticket;
+  try {
+    const res = await api.post('/api/consent-requests/stream/ticket/');
+    ticket = res.data.ticket;
+  } catch (error) {
+    console.error('Failed to get a consent stream ticket:', error);
+    startPolling();
+    reconnectTimer = setTimeout(openStream, STREAM_RETRY_MS);
+    return;
+  }
+  if (listeners.size === 0) return; // Disconnected while the ticket was on its way.
+
+  const baseURL = api.defaults.baseURL || '';
+  let opened = false;
+  source = new EventSource(`${baseURL}/api/consent-requests/stream/?ticket=${encodeURIComponent(ticket)}`);
+  source.onopen = () => {
+    opened = true;
+    stopPolling();
+  };
+  source.addEventListener('summary', (event) => emit(JSON.parse(event.data)));
+  source.onerror = () => {
+    // The ticket is spent, so EventSource must not retry the same URL:
+    // reconnect with a new ticket. A stream that never opened (e.g. a 501
+    // from a WSGI server) falls back to polling until a later attempt.
+    source.close();
+    source = null;
+    if (opened) {
+      reconnectTimer = setTimeout(openStream, STREAM_RECONNECT_MS);
+      return;
+    }
+    startPolling();
+    refreshConsentSummary();
+    reconnectTimer = setTimeout(openStream, STREAM_RETRY_MS);
+  };
+}
+
+function connect() {
+  refreshConsentSummary();
+  openStream();
+}
+
+function disconnect() {
+  if (source) source.close();
+  stopPolling();
+  clearTimeout(reconnectTimer);
+  source = null;
+  reconnectTimer = null;
+  latestCounts = EMPTY_COUNTS;
+}
+
+export default function useConsentSummary(user) {
+  const [counts, setCounts] = useState(latestCounts);
+
+  useEffect(() => {
+    if (!user) return;
+    listeners.add(setCounts);
+    if (listeners.size === 1) connect();
+    setCounts(latestCounts);
+
+    return () => {
+      listeners.delete(setCounts);
+      if (listeners.size === 0) disconnect();
+    };
+  }, [user]);
+
+  return { counts, refresh: refreshConsentSummary };
+}